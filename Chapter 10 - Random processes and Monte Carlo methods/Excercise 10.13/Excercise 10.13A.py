@@ -1,6 +1,8 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
 from numpy.random import randint
+from dla_analytics import ClusterAnalytics
+from dla_lattice import make_lattice
+from dla_render import draw_cluster, save_cluster
 
 
 # Globals
@@ -9,21 +11,27 @@ from numpy.random import randint
 GRID_SIZE = 101
 # Time constant for color
 TIME_CONSTANT = GRID_SIZE * GRID_SIZE // 6
+# Lattice backend of the grids, 'dense' or 'chunked' to allocate memory only where the cluster grows
+BACKEND = 'dense'
 
 # Initial particle position at the center
 INITIAL_POS = GRID_SIZE // 2, GRID_SIZE // 2
 # Grid to track anchored particles
-grid = np.zeros((GRID_SIZE, GRID_SIZE), bool)
+grid = make_lattice(GRID_SIZE, bool, False, BACKEND)
+# Time each particle was added, -1 for empty sites; its color is based on it
+arrival = make_lattice(GRID_SIZE, int, -1, BACKEND)
+# Running statistics of the cluster, fed every new particle
+analytics = ClusterAnalytics(GRID_SIZE // 2, GRID_SIZE // 2)
 
 def add_particle(x, y, time=0):
     """
-    Adds a particle to the grid at position (x, y) and updates the plot.
-    The color of the particle is determined based on the time it was added.
+    Adds a particle to the grid at position (x, y) and records the time it was added.
+    The color of the particle is determined based on that time when the cluster is drawn.
     """
+    if not grid[x, y]:
+        analytics.add(x, y, time)
     grid[x, y] = True
-    color = time / TIME_CONSTANT  #Color based on time
-    color = max(0, min(1, color))  # Ensure color is within [0, 1]
-    ax.plot(x, y, 's', color=str(color), markersize=5)
+    arrival[x, y] = time
 
 def random_walk():
     """
@@ -61,17 +69,21 @@ def random_walk():
                 else:
                     y -= 1
 
-def main():
-    global ax
-    # Initialize the plot
-    fig, ax = plt.subplots()
-    ax.set_xlim(0, GRID_SIZE)
-    ax.set_ylim(0, GRID_SIZE)
-    
+def main(output=None):
     # Run the random walk simulation
     random_walk()
 
-    plt.show()
+    # The cluster grows in from the edges, so it has no mass-radius dimension around the center
+    print(f"{analytics.particles} particles, radius of gyration {analytics.radius_of_gyration:.2f}")
+
+    # Draw the cluster once, or write it to the output file without opening a display
+    if output:
+        save_cluster(output, arrival, TIME_CONSTANT)
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        draw_cluster(ax, arrival, TIME_CONSTANT)
+        plt.show()
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
@@ -1,6 +1,9 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
 from numpy.random import randint
+from dla_analytics import ClusterAnalytics
+from dla_lattice import make_lattice
+from dla_render import draw_cluster, save_cluster
 
 
 #Globals
@@ -9,17 +12,24 @@ from numpy.random import randint
 GRID_SIZE = 201
 # Time constant for color
 TIME_CONSTANT = GRID_SIZE * GRID_SIZE // 6
+# Lattice backend of the grids, 'dense' or 'chunked' to allocate memory only where the cluster grows
+BACKEND = 'dense'
 
 # Grid to track anchored particles
-grid = np.zeros((GRID_SIZE, GRID_SIZE), bool)
+grid = make_lattice(GRID_SIZE, bool, False, BACKEND)
+# Time each particle was added, -1 for empty sites
+arrival = make_lattice(GRID_SIZE, int, -1, BACKEND)
+# Running statistics of the cluster, fed every new particle
+analytics = ClusterAnalytics(GRID_SIZE // 2, GRID_SIZE // 2)
 
 def add_particle(x, y, time=TIME_CONSTANT):
     """
-    Adds a particle to the grid at position (x, y) and updates the plot.
+    Adds a particle to the grid at position (x, y) and records the time it was added.
     """
+    if not grid[x, y]:
+        analytics.add(x, y, time)
     grid[x, y] = True
-    color = time / TIME_CONSTANT  # Fixed color for all particles
-    ax.plot(x, y, 's', color=str(color), markersize=5)
+    arrival[x, y] = time
 
 def generate_random_position(radius=0):
     """
@@ -75,23 +85,27 @@ def random_walk_on_circle():
                 x, y = new_x, new_y
             distance = calculate_distance(x, y)
 
-def main():
+def main(output=None):
     """
-    Main function to set up the plot and run the optimized diffusion-limited aggregation simulation.
+    Main function to run the optimized diffusion-limited aggregation simulation and draw the result.
+    With an output path (.png or .npy) the cluster is written to disk without opening a display.
     """
-    global ax
-    # Initialize the plot
-    fig, ax = plt.subplots()
-    ax.set_xlim(0, GRID_SIZE)
-    ax.set_ylim(0, GRID_SIZE)
-    ax.set_aspect('equal')
-
     # Run the random walk simulation
     random_walk_on_circle()
 
+    print(f"{analytics.particles} particles, radius of gyration {analytics.radius_of_gyration:.2f}, "
+          f"fractal dimension {analytics.dimension():.3f}")
+
     # Show the final result
-    plt.show()
+    if output:
+        save_cluster(output, arrival, TIME_CONSTANT)
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        draw_cluster(ax, arrival, TIME_CONSTANT)
+        ax.set_aspect('equal')
+        plt.show()
 
 # Run the main function
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
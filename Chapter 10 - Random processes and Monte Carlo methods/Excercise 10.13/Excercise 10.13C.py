@@ -1,6 +1,9 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
 from numpy.random import randint
+from dla_analytics import ClusterAnalytics
+from dla_lattice import make_lattice
+from dla_render import draw_cluster, save_cluster
 
 # Globals 
 
@@ -8,17 +11,24 @@ from numpy.random import randint
 GRID_SIZE = 101
 # Time constant for color
 TIME_CONSTANT = GRID_SIZE * GRID_SIZE // 6
+# Lattice backend of the grids, 'dense' or 'chunked' to allocate memory only where the cluster grows
+BACKEND = 'dense'
 
 # Grid to track anchored particles
-grid = np.zeros((GRID_SIZE, GRID_SIZE), bool)
+grid = make_lattice(GRID_SIZE, bool, False, BACKEND)
+# Time each particle was added, -1 for empty sites
+arrival = make_lattice(GRID_SIZE, int, -1, BACKEND)
+# Running statistics of the cluster, fed every new particle
+analytics = ClusterAnalytics(GRID_SIZE // 2, GRID_SIZE // 2)
 
 def add_particle(x, y, time=TIME_CONSTANT):
     """
-    Adds a particle to the grid at position (x, y) and updates the plot.
+    Adds a particle to the grid at position (x, y) and records the time it was added.
     """
+    if not grid[x, y]:
+        analytics.add(x, y, time)
     grid[x, y] = True
-    color = min(max(time / TIME_CONSTANT, 0), 1)  # Ensure color is within [0, 1]
-    ax.plot(x, y, 's', color=str(color), markersize=5)
+    arrival[x, y] = time
 
 def generate_random_position(radius):
     """
@@ -82,16 +92,10 @@ def random_walk_on_circle():
         if max_radius >= GRID_SIZE // 2:
             break
 
-def main():
-    global ax, radius
+def main(output=None):
+    global radius
     radius = 0
 
-    # Initialize the plot
-    fig, ax = plt.subplots()
-    ax.set_xlim(0, GRID_SIZE)
-    ax.set_ylim(0, GRID_SIZE)
-    ax.set_aspect('equal')
-
     # Initial particle position at the center
     initial_position = GRID_SIZE // 2, GRID_SIZE // 2
     add_particle(*initial_position)
@@ -99,7 +103,18 @@ def main():
     # Run the random walk simulation
     random_walk_on_circle()
 
-    plt.show()
+    print(f"{analytics.particles} particles, radius of gyration {analytics.radius_of_gyration:.2f}, "
+          f"fractal dimension {analytics.dimension():.3f}")
+
+    # Draw the cluster once, or write it to the output file (.png or .npy) without opening a display
+    if output:
+        save_cluster(output, arrival, TIME_CONSTANT)
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        draw_cluster(ax, arrival, TIME_CONSTANT)
+        ax.set_aspect('equal')
+        plt.show()
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
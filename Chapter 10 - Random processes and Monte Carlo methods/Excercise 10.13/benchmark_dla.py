@@ -0,0 +1,117 @@
+"""
+Benchmark of the batched DLA engine against the serial loops of Excercise 10.13A/B/C.
+
+For every variant both implementations grow a few complete clusters. The report
+gives the walker-steps per second of each, and the mean number of particles and
+radius of gyration of the finished clusters so their statistics can be compared.
+"""
+import importlib.util
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from dla_analytics import ClusterAnalytics
+from dla_batch import BatchDLA
+from dla_lattice import make_lattice
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = {'A': 'Excercise 10.13A.py', 'B': 'Excercise 10.13B.py', 'C': 'Excercise 10.13C.py'}
+
+
+def load_serial(variant):
+    """
+    Imports one of the serial scripts as a module.
+    """
+    spec = importlib.util.spec_from_file_location(f"excercise_10_13{variant}", os.path.join(HERE, SCRIPTS[variant]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def radius_of_gyration(grid):
+    """
+    Calculates the radius of gyration of the occupied sites of a grid.
+    """
+    x, y = np.nonzero(grid)
+    return np.sqrt(x.var() + y.var())
+
+
+def run_serial(module, variant, grid_size, seed):
+    """
+    Grows one cluster with the serial loop of a script, counting its calls to randint().
+
+    Returns:
+    tuple: The number of walker-steps, the elapsed time and the final grid.
+    """
+    np.random.seed(seed)
+    module.GRID_SIZE = grid_size
+    module.TIME_CONSTANT = grid_size * grid_size // 6
+    module.grid = make_lattice(grid_size, bool, False, module.BACKEND)
+    module.arrival = make_lattice(grid_size, int, -1, module.BACKEND)
+    module.analytics = ClusterAnalytics(grid_size // 2, grid_size // 2)
+
+    steps = [0]
+    # Counts on top of whatever randint the module has, and puts it back afterwards
+    randint = module.randint
+
+    def counting_randint(n):
+        steps[0] += 1
+        return randint(n)
+    module.randint = counting_randint
+
+    start = perf_counter()
+    try:
+        if variant == 'A':
+            module.INITIAL_POS = grid_size // 2, grid_size // 2
+            module.random_walk()
+        elif variant == 'B':
+            module.random_walk_on_circle()
+        else:
+            module.radius = 0
+            module.add_particle(grid_size // 2, grid_size // 2)
+            module.random_walk_on_circle()
+    finally:
+        module.randint = randint
+    return steps[0], perf_counter() - start, module.grid
+
+
+def run_batch(variant, grid_size, seed):
+    """
+    Grows one cluster with the batched engine.
+
+    Returns:
+    tuple: The number of walker-steps, the elapsed time and the final grid.
+    """
+    start = perf_counter()
+    engine = BatchDLA(grid_size, variant, seed=seed).run()
+    return engine.walker_steps, perf_counter() - start, engine.grid
+
+
+def report(name, runs):
+    """
+    Prints the throughput and cluster statistics of a list of (steps, elapsed, grid) runs.
+    """
+    steps = sum(run[0] for run in runs)
+    elapsed = sum(run[1] for run in runs)
+    mass = np.array([run[2].sum() for run in runs])
+    gyration = np.array([radius_of_gyration(run[2]) for run in runs])
+    sem = np.sqrt(len(runs))
+    print(f"  {name:<7} {steps / elapsed:12.3g} walker-steps/s   "
+          f"particles {mass.mean():8.1f} +- {mass.std() / sem:6.1f}   "
+          f"R_g {gyration.mean():6.2f} +- {gyration.std() / sem:5.2f}")
+    return steps / elapsed
+
+
+def main(grid_size=61, repeats=5):
+    for variant in 'ABC':
+        print(f"Excercise 10.13{variant}, {grid_size}x{grid_size} grid, {repeats} clusters")
+        module = load_serial(variant)
+        serial = report('serial', [run_serial(module, variant, grid_size, seed) for seed in range(repeats)])
+        batch = report('batched', [run_batch(variant, grid_size, seed) for seed in range(repeats)])
+        print(f"  speedup {batch / serial:.1f}x")
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,126 @@
+"""
+Streaming analytics of the DLA clusters of Exercise 10.13.
+
+ClusterAnalytics is fed every new particle by add_particle() and keeps running
+sums of the coordinates and squared distances of the particles from the seed,
+which give the center of mass and the radius of gyration, and a histogram of
+the particles by their squared distance from the seed. Squared distances are
+integers on the lattice, so the cumulative histogram is exactly the mass M(r)
+within any radius r, and the fractal dimension is fitted from it the way
+mass_radius_dimension() in dla_jump.py fits it from the whole grid. All of this
+costs O(1) per particle; the fit is only made whenever the cluster has grown by
+a given factor, and the estimates form a time series from which a run can stop
+early once the dimension has converged.
+"""
+import math
+
+import numpy as np
+
+
+# Factor by which the number of particles grows between two estimates of the dimension
+GROWTH = 1.05
+# Number of successive estimates compared to decide convergence
+WINDOW = 10
+# Smallest number of particles for an estimate
+MIN_PARTICLES = 50
+
+
+class ClusterAnalytics:
+    """
+    Running statistics of a cluster grown around the site (x0, y0), see the module docstring.
+    """
+
+    def __init__(self, x0, y0, growth=GROWTH):
+        self.x0 = x0
+        self.y0 = y0
+        self.growth = growth
+        self.particles = 0
+        self.sum_x = 0
+        self.sum_y = 0
+        self.sum_r2 = 0
+        self.max_r2 = 0
+        self.histogram = np.zeros(1024, np.int64)  # particles by squared distance from (x0, y0)
+        self.next_estimate = MIN_PARTICLES
+        self.series = []  # (particles, time, radius of gyration, dimension) at every estimate
+
+    @classmethod
+    def attach(cls, cluster, growth=GROWTH):
+        """
+        Attaches analytics to an engine (see dla_batch.py), feeding them the particles it already holds.
+        Coordinates are those of cluster.grid, without the padding of the engine.
+        """
+        n = cluster.width
+        c = cluster.grid_size // 2
+        analytics = cls(c, c, growth=growth)
+        sites = np.flatnonzero(cluster.occupied)
+        for site in sites[np.argsort(cluster.arrival[sites], kind='stable')]:
+            x, y = divmod(int(site), n)
+            analytics.add(x - 1, y - 1, int(cluster.arrival[site]))
+        cluster.analytics = analytics
+        return analytics
+
+    def add(self, x, y, time=0):
+        """
+        Adds a particle at (x, y) that stuck at the given time.
+        """
+        dx, dy = x - self.x0, y - self.y0
+        r2 = dx * dx + dy * dy
+        self.particles += 1
+        self.sum_x += dx
+        self.sum_y += dy
+        self.sum_r2 += r2
+        if r2 > self.max_r2:
+            self.max_r2 = r2
+            if r2 >= len(self.histogram):
+                self.histogram = np.concatenate([self.histogram, np.zeros(r2 + 1, np.int64)])
+        self.histogram[r2] += 1
+        if self.particles >= self.next_estimate:
+            self.series.append((self.particles, time, self.radius_of_gyration, self.dimension()))
+            self.next_estimate = max(self.particles + 1, math.ceil(self.particles * self.growth))
+
+    @property
+    def center_of_mass(self):
+        """
+        Center of mass of the particles, in the coordinates of the grid.
+        """
+        return self.x0 + self.sum_x / self.particles, self.y0 + self.sum_y / self.particles
+
+    @property
+    def radius_of_gyration(self):
+        """
+        Root mean square distance of the particles from their center of mass.
+        """
+        mx, my = self.sum_x / self.particles, self.sum_y / self.particles
+        return math.sqrt(max(self.sum_r2 / self.particles - mx * mx - my * my, 0.0))
+
+    def mass(self, radii):
+        """
+        Number of particles within each of the given distances from (x0, y0).
+        """
+        cumulative = np.cumsum(self.histogram[:self.max_r2 + 1])
+        return cumulative[np.minimum(np.floor(np.asarray(radii) ** 2).astype(np.int64), self.max_r2)]
+
+    def dimension(self):
+        """
+        Slope of log M(r) against log r for r from 2 to half the radius of the cluster, NaN while it is too small.
+        """
+        radius = math.sqrt(self.max_r2)
+        if radius < 8:
+            return math.nan
+        radii = np.geomspace(2, radius / 2, 12)
+        mass = self.mass(radii)
+        # A cluster that did not grow from (x0, y0), as in 10.13A, has no mass around it
+        if mass[0] == 0:
+            return math.nan
+        return float(np.polyfit(np.log(radii), np.log(mass), 1)[0])
+
+    def converged(self, tolerance, window=WINDOW):
+        """
+        Whether the last window estimates of the dimension all lie within tolerance of each other.
+        """
+        if len(self.series) < window:
+            return False
+        estimates = [estimate[3] for estimate in self.series[-window:]]
+        if any(math.isnan(estimate) for estimate in estimates):
+            return False
+        return max(estimates) - min(estimates) <= tolerance
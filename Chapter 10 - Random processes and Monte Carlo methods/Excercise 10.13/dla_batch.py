@@ -0,0 +1,363 @@
+"""
+Batched multi-walker engine for the diffusion-limited aggregation of Exercise 10.13.
+
+The serial scripts move one walker at a time and draw one direction per step.
+Here a whole round of walkers is advanced together: every block pre-draws the
+directions of all walkers, builds their paths with a cumulative sum and finds
+the first step at which each walker sticks or is discarded with a single lookup
+into an event table built from the grid.
+
+All walkers of a round walk against the same snapshot of the cluster and are
+committed afterwards in launch order. A walker whose path moved onto a site that
+an earlier walker of the round stuck to is cut short at that move, where the
+serial walker would have stuck instead. Sticking conflicts are therefore always
+resolved in launch order, and every committed walker follows exactly the path
+the serial algorithm would give it, so the clusters have the same statistics.
+"""
+import sys
+
+import numpy as np
+
+from dla_render import draw_cluster, save_cluster
+
+
+# Event codes of the lookup table
+FREE, STICK, KILL = 0, 1, 2
+
+# Number of steps drawn per walker in a single block
+BLOCK_STEPS = 256
+# Limits on the number of walkers launched in a single round
+MIN_WALKERS = 4
+MAX_WALKERS = 1024
+
+
+class DLACluster:
+    """
+    State of a diffusion-limited aggregation on a grid_size x grid_size grid, shared by the engines.
+
+    The variant selects the rules of the exercise part:
+    'A' - walkers start at the center and stick to the cluster or to the edge of the grid.
+    'B' - walkers start on the circle of radius r+1 around a seed and are discarded beyond 2r.
+    'C' - as in 'B', but the radius follows the furthest particle and walkers leaving the grid are discarded.
+    """
+    variants = ('A', 'B', 'C')
+    # Attributes saved in a checkpoint (see dla_checkpoint.py), the tables are rebuilt from them
+    state_arrays = ('occupied', 'arrival')
+    state_scalars = ('time', 'radius', 'max_radius', 'particles', 'walker_steps')
+    # Streaming statistics fed every new particle, see ClusterAnalytics.attach() in dla_analytics.py
+    analytics = None
+
+    def __init__(self, grid_size, variant='B', seed=None):
+        if variant not in self.variants:
+            raise ValueError(f"Unknown variant {variant!r}, expected one of {', '.join(self.variants)}")
+        self.grid_size = grid_size
+        self.variant = variant
+        self.rng = np.random.default_rng(seed)
+
+        # The grid is padded by one site on every side so leaving it is a table lookup as well
+        n = grid_size + 2
+        self.width = n
+        self.occupied = np.zeros(n * n, bool)
+        self.arrival = np.full(n * n, -1, np.int64)
+        self.outside = np.ones((n, n), bool)
+        self.outside[1:-1, 1:-1] = False
+        self.outside = self.outside.ravel()
+        c = grid_size // 2 + 1
+        self.center = c * n + c
+        i = np.arange(n) - c
+        self.dist2 = (i[:, None] ** 2 + i[None, :] ** 2).ravel()
+        self.deltas = np.array([n, -n, 1, -1])  # up, down, right, left as in the serial scripts
+
+        self.time = 0
+        self.radius = 1 if variant == 'B' else 0
+        self.max_radius = 0.0
+        self.particles = 0
+        self.walker_steps = 0  # steps of accepted walkers, the work the serial loop would do
+
+        self.init_tables()
+        if variant != 'A':
+            self.add_particle(self.center, time=0)
+
+    def init_tables(self):
+        """
+        Builds the lookup tables from the occupancy of the grid.
+        """
+        self.table = self.event_table()
+
+    @property
+    def grid(self):
+        """
+        Occupancy of the grid, with the same indexing as `grid` in the serial scripts.
+        """
+        return self.occupied.reshape(self.width, self.width)[1:-1, 1:-1]
+
+    @property
+    def arrival_times(self):
+        """
+        Time at which each particle stuck, -1 for empty sites.
+        """
+        return self.arrival.reshape(self.width, self.width)[1:-1, 1:-1]
+
+    @property
+    def done(self):
+        """
+        Whether the stopping condition of the serial loop has been reached.
+        """
+        if self.variant == 'A':
+            return bool(self.occupied[self.center])
+        if self.variant == 'B':
+            return self.radius * 2 >= self.grid_size // 2
+        return self.max_radius >= self.grid_size // 2
+
+    def occupied_event(self, site):
+        """
+        Returns the event triggered by a walker trying to move onto an occupied site.
+        """
+        if self.variant == 'C' and self.dist2[site] > 4 * self.radius ** 2:
+            return KILL
+        return STICK
+
+    def site_event(self, site):
+        """
+        Returns the event triggered by a walker trying to move onto a given site.
+        """
+        if self.occupied[site]:
+            return self.occupied_event(site)
+        if self.variant == 'A':
+            return STICK if self.outside[site] else FREE
+        return KILL if self.outside[site] or self.dist2[site] > 4 * self.radius ** 2 else FREE
+
+    def event_table(self):
+        """
+        Builds the event of every site of the padded grid for the current radius.
+        """
+        table = np.full(self.occupied.size, FREE, np.int8)
+        kill = self.dist2 > 4 * self.radius ** 2
+        if self.variant == 'A':
+            table[self.occupied | self.outside] = STICK
+        elif self.variant == 'B':
+            table[kill | self.outside] = KILL
+            table[self.occupied] = STICK
+        else:
+            table[self.occupied] = STICK
+            table[kill | self.outside] = KILL
+        return table
+
+    def add_particle(self, site, time):
+        """
+        Anchors a particle on a site of the padded grid and updates the event table.
+        A walker launched on top of the cluster can stick where it started, as in the serial
+        scripts, in which case only the arrival time changes.
+        """
+        if not self.occupied[site]:
+            self.particles += 1
+            if self.analytics is not None:
+                x, y = divmod(int(site), self.width)
+                self.analytics.add(x - 1, y - 1, time)
+        self.occupied[site] = True
+        self.arrival[site] = time
+        self.table[site] = self.site_event(site)
+
+    def update_radius(self, site, steps):
+        """
+        Updates the radius after a walker stuck to a site on its given step, as the serial loops do.
+        """
+        distance = np.sqrt(self.dist2[site])
+        if self.variant == 'B' and steps > 1 and self.radius < distance:
+            self.radius = int(distance)
+        elif self.variant == 'C':
+            self.max_radius = max(self.max_radius, distance)
+            self.radius = int(self.max_radius)
+
+    def launch(self, k):
+        """
+        Returns the starting sites of k walkers, following generate_random_position() of the serial scripts.
+        """
+        if self.variant == 'A':
+            return np.full(k, self.center, np.int64)
+        theta = 2 * np.pi * self.rng.random(k)
+        half = self.grid_size // 2
+        x = ((self.radius + 1) * np.cos(theta) + half).astype(np.int64) + 1
+        y = ((self.radius + 1) * np.sin(theta) + half).astype(np.int64) + 1
+        return x * self.width + y
+
+    def run(self, max_particles=None):
+        """
+        Grows the cluster until the stopping condition of the serial loop, or until max_particles.
+        Engines implement run_round(), which adds at least one walker to the count of launches.
+        """
+        while not self.done and (max_particles is None or self.particles < max_particles):
+            self.run_round(max_particles)
+        return self
+
+
+class BatchDLA(DLACluster):
+    """
+    Diffusion-limited aggregation advanced many walkers at a time, see the module docstring.
+    """
+    state_scalars = DLACluster.state_scalars + ('walkers', 'block_steps', 'simulated_steps', 'rounds')
+
+    def __init__(self, grid_size, variant='B', walkers=16, block_steps=BLOCK_STEPS, seed=None):
+        # Within the limits of later rounds; owner marks free sites with MAX_WALKERS, above every walker
+        self.walkers = max(MIN_WALKERS, min(MAX_WALKERS, walkers))
+        self.block_steps = block_steps
+        self.simulated_steps = 0  # all steps drawn, including discarded walkers and cut-short paths
+        self.rounds = 0
+        super().__init__(grid_size, variant, seed)
+
+    def init_tables(self):
+        """
+        Builds the lookup tables from the occupancy of the grid, including the sites walkers can stick from.
+        """
+        super().init_tables()
+        n = self.width
+        occupied = self.occupied.reshape(n, n)
+        # Free sites from which a walker can stick, the only sites a conflict can happen on
+        sticky = np.zeros((n, n), bool)
+        sticky[1:, :] |= occupied[:-1, :]
+        sticky[:-1, :] |= occupied[1:, :]
+        sticky[:, 1:] |= occupied[:, :-1]
+        sticky[:, :-1] |= occupied[:, 1:]
+        if self.variant == 'A':
+            sticky[[1, -2], 1:-1] = True
+            sticky[1:-1, [1, -2]] = True
+        self.sticky = sticky.ravel() & ~self.occupied & ~self.outside
+        # Walker of the current round that stuck to each site, used to detect conflicts
+        self.owner = np.full(n * n, MAX_WALKERS, np.int64)
+
+    def add_particle(self, site, time):
+        """
+        Anchors a particle on a site and marks the free sites around it as sticky.
+        """
+        super().add_particle(site, time)
+        self.sticky[site] = False
+        for neighbour in site + self.deltas:
+            if not self.occupied[neighbour] and not self.outside[neighbour]:
+                self.sticky[neighbour] = True
+
+    def advance_block(self, pos, steps):
+        """
+        Advances the walkers at pos, which have already taken a number of steps, by up to block_steps steps each.
+
+        Returns:
+        tuple:
+            array: Number of steps taken by each walker in the block.
+            array: Event hit by each walker, FREE if it is still walking.
+            array: Site each walker stands on at the end of the block, or stuck to.
+            array: Rows of (walker, step, site, previous site) for every move onto a sticky site.
+        """
+        s = self.block_steps
+        k = len(pos)
+        dirs = self.rng.integers(0, 4, size=(k, s), dtype=np.int8)
+        path = np.empty((k, s + 1), np.int64)
+        path[:, 0] = pos
+        np.cumsum(self.deltas[dirs], axis=1, out=path[:, 1:])
+        path[:, 1:] += pos[:, None]
+        # Positions after an event are never used, clipping only keeps them inside the table
+        np.clip(path, 0, self.table.size - 1, out=path)
+
+        events = self.table[path[:, 1:]]
+        hit = events != FREE
+        ended = hit.any(axis=1)
+        first = np.where(ended, hit.argmax(axis=1), s)
+        rows = np.arange(k)
+        event = np.where(ended, events[rows, np.minimum(first, s - 1)], FREE)
+        site = path[rows, first]
+        taken = np.minimum(first + 1, s)
+
+        moved = self.sticky[path[:, 1:]] & (np.arange(s) < first[:, None])
+        walker, column = np.nonzero(moved)
+        moves = np.stack([walker, steps[walker] + column + 1, path[walker, column + 1], path[walker, column]], axis=1)
+        self.simulated_steps += int(taken.sum())
+        return taken, event, site, moves
+
+    def run_round(self, max_particles=None):
+        """
+        Launches a round of walkers and commits them in launch order, as long as they agree with the serial algorithm.
+
+        A walker that moved onto a site an earlier walker of the round stuck to is cut short
+        there: the serial walker would have stuck next to that site instead. The round stops
+        at a commit that changes the radius or lands outside the sticky sites of the snapshot,
+        because the walkers after it were simulated against a cluster that no longer applies.
+
+        Returns:
+        int: The number of walkers accepted in the round.
+        """
+        k = self.walkers
+        pos = self.launch(k)
+        active = np.arange(k)
+        steps = np.zeros(k, np.int64)
+        outcome = np.full(k, FREE, np.int8)
+        moves = [[] for _ in range(k)]
+
+        accepted = 0
+        committed = []
+        stop = False
+        radius = self.radius
+        while not stop and accepted < k:
+            if len(active):
+                taken, event, site, block_moves = self.advance_block(pos[active], steps[active])
+                if len(block_moves):
+                    splits = np.flatnonzero(np.diff(block_moves[:, 0])) + 1
+                    for chunk in np.split(block_moves, splits):
+                        moves[active[chunk[0, 0]]].append(chunk)
+                ended = event != FREE
+                outcome[active[ended]] = event[ended]
+                steps[active] += taken
+                pos[active] = site
+                active = active[~ended]
+
+            # Commit the finished walkers in launch order
+            while not stop and accepted < k and outcome[accepted] != FREE:
+                j = accepted
+                if moves[j]:
+                    walker_moves = np.concatenate(moves[j])
+                    conflict = np.flatnonzero(self.owner[walker_moves[:, 2]] < j)
+                    if len(conflict):
+                        _, steps[j], target, pos[j] = walker_moves[conflict[0]]
+                        outcome[j] = self.occupied_event(target)
+                accepted += 1
+                self.time += 1
+                self.walker_steps += int(steps[j])
+                if outcome[j] == STICK:
+                    s = pos[j]
+                    self.owner[s] = j
+                    committed.append((s, self.time))
+                    self.update_radius(s, steps[j])
+                    if s == self.center or not self.sticky[s]:
+                        stop = True
+                    if max_particles is not None and self.particles + len(committed) >= max_particles:
+                        stop = True
+                stop = stop or self.radius != radius or self.done
+
+        for s, time in committed:
+            self.owner[s] = MAX_WALKERS
+            self.add_particle(s, time)
+        if self.radius != radius:
+            self.table = self.event_table()
+        self.rounds += 1
+        self.walkers = max(MIN_WALKERS, min(MAX_WALKERS, 2 * accepted))
+        return accepted
+
+def main(output=None):
+    from time import perf_counter
+
+    engine = BatchDLA(201, 'B', seed=0)
+    start = perf_counter()
+    engine.run()
+    elapsed = perf_counter() - start
+    print(f"{engine.particles} particles, {engine.walker_steps} walker-steps in {elapsed:.2f} s "
+          f"({engine.walker_steps / elapsed:.3g} walker-steps per second)")
+
+    time_constant = engine.grid_size ** 2 // 6
+    if output:
+        save_cluster(output, engine.arrival_times, time_constant)
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        draw_cluster(ax, engine.arrival_times, time_constant)
+        ax.set_aspect('equal')
+        plt.show()
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,205 @@
+"""
+Checkpoint and resume for long DLA runs of Exercise 10.13.
+
+A checkpoint directory holds two slots of memory-mapped .npy arrays with the
+occupancy and arrival times of the grid, and a small metadata.json with the
+counters of the engine and the state of its bit generator. Every save writes the
+arrays into the slot that is not current, flushes them, and only then replaces
+metadata.json to point at that slot, so a run killed in the middle of a save
+still leaves the previous checkpoint intact. The lookup tables of the engines
+are rebuilt from the occupancy when a checkpoint is loaded.
+
+Checkpoints are taken between rounds, where the engines hold no other state, so
+a resumed run continues with exactly the same random numbers and grows exactly
+the same cluster as an uninterrupted one.
+"""
+import json
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from dla_batch import BatchDLA
+from dla_jump import JumpDLA
+
+
+ENGINES = {engine.__name__: engine for engine in (BatchDLA, JumpDLA)}
+
+# Seconds of simulation between checkpoints
+CHECKPOINT_INTERVAL = 60.0
+
+
+def to_json(value):
+    """
+    Converts NumPy scalars, which json cannot write, to the equivalent Python ones.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class Checkpointer:
+    """
+    Saves the state of an engine to a checkpoint directory, alternating between two slots.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # The slot of an existing checkpoint stays current, so the first save goes to the other one
+        self.slot = current_slot(directory)
+        self.arrays = {}
+        self.saves = 0
+        self.save_time = 0.0
+
+    def save(self, cluster):
+        """
+        Writes the arrays of the cluster into the next slot, then points metadata.json at it.
+        """
+        start = perf_counter()
+        self.slot = 1 - self.slot
+        for name in cluster.state_arrays:
+            value = getattr(cluster, name)
+            array = self.arrays.get((self.slot, name))
+            if array is None:
+                path = os.path.join(self.directory, f"{name}.{self.slot}.npy")
+                array = self.arrays[self.slot, name] = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=value.dtype, shape=value.shape)
+            array[:] = value
+            array.flush()
+
+        metadata = {
+            'engine': type(cluster).__name__,
+            'grid_size': cluster.grid_size,
+            'variant': cluster.variant,
+            'slot': self.slot,
+            'scalars': {name: to_json(getattr(cluster, name)) for name in cluster.state_scalars},
+            'rng': cluster.rng.bit_generator.state,
+        }
+        path = os.path.join(self.directory, 'metadata.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(metadata, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        self.saves += 1
+        self.save_time += perf_counter() - start
+
+
+def current_slot(directory):
+    """
+    The slot metadata.json points at, 0 if there is no checkpoint yet.
+    """
+    if not has_checkpoint(directory):
+        return 0
+    with open(os.path.join(directory, 'metadata.json')) as file:
+        return json.load(file)['slot']
+
+
+def has_checkpoint(directory):
+    """
+    Whether a checkpoint directory holds a complete checkpoint.
+    """
+    return os.path.exists(os.path.join(directory, 'metadata.json'))
+
+
+def load(directory):
+    """
+    Restores an engine from the last complete checkpoint in a directory.
+    """
+    with open(os.path.join(directory, 'metadata.json')) as file:
+        metadata = json.load(file)
+    cluster = ENGINES[metadata['engine']](metadata['grid_size'], metadata['variant'])
+    for name in cluster.state_arrays:
+        path = os.path.join(directory, f"{name}.{metadata['slot']}.npy")
+        getattr(cluster, name)[:] = np.load(path, mmap_mode='r')
+    for name, value in metadata['scalars'].items():
+        setattr(cluster, name, value)
+    cluster.rng.bit_generator.state = metadata['rng']
+    cluster.init_tables()
+    return cluster
+
+
+def run_with_checkpoints(cluster, directory, interval=CHECKPOINT_INTERVAL, max_particles=None):
+    """
+    Grows a cluster like its run() method, saving a checkpoint every interval seconds and at the end.
+
+    Returns:
+    Checkpointer: The checkpointer, with the number of saves and the time spent on them.
+    """
+    checkpointer = Checkpointer(directory)
+    last = perf_counter()
+    while not cluster.done and (max_particles is None or cluster.particles < max_particles):
+        cluster.run_round(max_particles)
+        if perf_counter() - last >= interval:
+            checkpointer.save(cluster)
+            last = perf_counter()
+    checkpointer.save(cluster)
+    return checkpointer
+
+
+def check_resume(grid_size=201, variant='B', engine='BatchDLA', seed=0):
+    """
+    Checks that a run interrupted twice and resumed from its checkpoints grows the same cluster.
+
+    After the second resume, a save is killed halfway: the slot it was writing is filled
+    with garbage, and the run must still resume from the checkpoint before it.
+
+    Returns:
+    bool: Whether the grid and the arrival times are identical.
+    """
+    uninterrupted = ENGINES[engine](grid_size, variant, seed=seed).run()
+    third = uninterrupted.particles // 3
+    with tempfile.TemporaryDirectory() as directory:
+        # Save, then keep growing a little as a killed run would have before dying
+        interrupted = ENGINES[engine](grid_size, variant, seed=seed)
+        while interrupted.particles < third:
+            interrupted.run_round()
+        Checkpointer(directory).save(interrupted)
+        interrupted.run(max_particles=third + 10)
+
+        resumed = load(directory)
+        while resumed.particles < 2 * third:
+            resumed.run_round()
+        Checkpointer(directory).save(resumed)
+        saved = {name: getattr(resumed, name).copy() for name in resumed.state_arrays}
+        resumed.run(max_particles=2 * third + 10)
+
+        # A save killed while writing its arrays leaves the slot it was writing broken
+        checkpointer = Checkpointer(directory)
+        for name in resumed.state_arrays:
+            value = getattr(resumed, name)
+            np.save(os.path.join(directory, f"{name}.{1 - checkpointer.slot}.npy"), np.ones_like(value))
+        resumed = load(directory)
+        intact = all(np.array_equal(getattr(resumed, name), value) for name, value in saved.items())
+        if intact:
+            resumed.run()
+    same = (intact and np.array_equal(resumed.occupied, uninterrupted.occupied)
+            and np.array_equal(resumed.arrival, uninterrupted.arrival))
+    print(f"{engine} {variant}: resumed after {third} and {2 * third} of {uninterrupted.particles} "
+          f"particles, {'identical' if same else 'DIFFERENT'} cluster")
+    return same
+
+
+def main(directory, grid_size=1001, variant='B', engine='JumpDLA', interval=CHECKPOINT_INTERVAL):
+    """
+    Grows a cluster with checkpoints in directory, resuming from the last one if there is any.
+    """
+    if has_checkpoint(directory):
+        cluster = load(directory)
+        print(f"Resuming from {directory} with {cluster.particles} particles")
+    else:
+        cluster = ENGINES[engine](int(grid_size), variant, seed=0)
+    start = perf_counter()
+    checkpointer = run_with_checkpoints(cluster, directory, float(interval))
+    elapsed = perf_counter() - start
+    print(f"{cluster.particles} particles in {elapsed:.1f} s, {checkpointer.saves} checkpoints taking "
+          f"{100 * checkpointer.save_time / elapsed:.2f}% of the time")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        checks = [check_resume(101, variant, engine) for engine, variant in
+                  (('BatchDLA', 'A'), ('BatchDLA', 'B'), ('BatchDLA', 'C'), ('JumpDLA', 'B'), ('JumpDLA', 'C'))]
+        sys.exit(0 if all(checks) else 1)
+    else:
+        main(*sys.argv[1:])
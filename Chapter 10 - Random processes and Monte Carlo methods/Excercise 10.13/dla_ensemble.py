@@ -0,0 +1,130 @@
+"""
+Parallel ensemble of independent DLA clusters for Exercise 10.13.
+
+The scripts keep the cluster in module globals and draw from the global
+numpy.random state, so clusters cannot be grown side by side. Here every
+realization is grown by its own engine (see dla_batch.py and dla_jump.py) with
+its own random stream, spawned from a single SeedSequence: realization i always
+gets the i-th child of the master seed, whichever worker process grows it and in
+whatever order, so an ensemble is reproducible bit for bit for a given master
+seed regardless of the number of workers. The final occupancy and arrival times
+of all realizations are collected into one compressed .npz archive.
+
+Every realization also keeps streaming analytics (see dla_analytics.py), so its
+fractal dimension is known without rescanning the grid, and given a tolerance it
+stops growing as soon as its estimate of the dimension has converged instead of
+always growing until the stopping condition of the exercise.
+
+Run with --check to grow a small ensemble in this process and on two workers and
+check that the two agree bit for bit.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from dla_analytics import ClusterAnalytics
+from dla_batch import BatchDLA
+from dla_jump import JumpDLA
+
+
+ENGINES = {'batch': BatchDLA, 'jump': JumpDLA}
+
+
+def grow(grid_size, variant, engine, seed, tolerance=None):
+    """
+    Grows a single realization.
+
+    Arguments:
+    grid_size (int): Number of sites along each side of the grid.
+    variant (str): Exercise part, 'A', 'B' or 'C'.
+    engine (str): 'batch' for the exact batched walk, 'jump' for distance-map jumps (B and C only).
+    seed (SeedSequence): Seed of the random stream of the realization.
+    tolerance (float): Stop once the estimates of the fractal dimension agree within it, if given.
+
+    Returns:
+    tuple:
+        array: Occupancy of the grid.
+        array: Arrival time of each particle, -1 for empty sites.
+        float: Final estimate of the fractal dimension.
+    """
+    cluster = ENGINES[engine](grid_size, variant, seed=seed)
+    analytics = ClusterAnalytics.attach(cluster)
+    while not cluster.done and not (tolerance and analytics.converged(tolerance)):
+        cluster.run_round()
+    return cluster.grid.copy(), cluster.arrival_times.astype(np.int32), analytics.dimension()
+
+
+def run_ensemble(realizations, grid_size=201, variant='B', engine='batch', master_seed=0, workers=None,
+                 output=None, tolerance=None):
+    """
+    Grows independent realizations across a pool of worker processes.
+
+    Arguments:
+    realizations (int): Number of clusters to grow.
+    master_seed (int): Seed from which the stream of every realization is spawned.
+    workers (int): Number of worker processes, all cores by default; 1 grows them in this process.
+    output (str): Path of the compressed archive to write, if any.
+    tolerance (float): Convergence tolerance of the fractal dimension for stopping early, see grow().
+
+    Returns:
+    tuple:
+        array: Occupancy of the realizations, of shape (realizations, grid_size, grid_size).
+        array: Arrival times of the realizations, of the same shape.
+        array: Fractal dimension of each realization.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+    seeds = np.random.SeedSequence(master_seed).spawn(realizations)
+    args = ([grid_size] * realizations, [variant] * realizations, [engine] * realizations, seeds,
+            [tolerance] * realizations)
+    if workers == 1:
+        results = list(map(grow, *args))
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(grow, *args, chunksize=max(1, realizations // (4 * workers))))
+    grids = np.stack([grid for grid, _, _ in results])
+    arrival = np.stack([times for _, times, _ in results])
+    dimensions = np.array([dimension for _, _, dimension in results])
+
+    if output:
+        np.savez_compressed(output, grids=grids, arrival=arrival, dimensions=dimensions, master_seed=master_seed,
+                            grid_size=grid_size, variant=variant, engine=engine)
+    return grids, arrival, dimensions
+
+
+def check_reproducible(realizations=6, grid_size=41, variant='B', engine='batch', master_seed=0):
+    """
+    Grows the same small ensemble in this process and on two workers and checks that they agree bit for bit.
+    """
+    serial = run_ensemble(realizations, grid_size, variant, engine, master_seed, workers=1)
+    parallel = run_ensemble(realizations, grid_size, variant, engine, master_seed, workers=2)
+    # A dimension is NaN where a cluster is too small to fit one
+    same = all(np.array_equal(a, b, equal_nan=a.dtype.kind == 'f') for a, b in zip(serial, parallel))
+    print(f"{realizations} clusters on 1 and 2 workers: {'identical' if same else 'DIFFERENT'}")
+    assert same, f"Ensembles of master seed {master_seed} differ between 1 and 2 workers"
+
+
+def main(output='ensemble.npz', realizations=32, grid_size=201, variant='B', engine='batch', workers=None,
+         tolerance=None):
+    """
+    Grows an ensemble, writes it to output and prints the fractal dimension with its error bar.
+    """
+    start = perf_counter()
+    grids, arrival, dimensions = run_ensemble(int(realizations), int(grid_size), variant, engine,
+                                              workers=workers and int(workers), output=output,
+                                              tolerance=tolerance and float(tolerance))
+    elapsed = perf_counter() - start
+    particles = grids.sum(axis=(1, 2))
+    print(f"{len(grids)} clusters of {particles.mean():.0f} particles on average in {elapsed:.1f} s, "
+          f"written to {output}")
+    print(f"Fractal dimension D = {dimensions.mean():.3f} +- {dimensions.std() / np.sqrt(len(grids)):.3f}")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        check_reproducible()
+    else:
+        main(*sys.argv[1:])
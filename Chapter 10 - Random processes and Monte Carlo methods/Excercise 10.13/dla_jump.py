@@ -0,0 +1,196 @@
+"""
+Distance-map accelerated walkers for the circle-launch DLA of Exercise 10.13B/C.
+
+Far from the cluster a lattice walker spends almost all of its steps in empty
+space. JumpDLA keeps a map of the distance from every site to the nearest
+particle, updated around each new particle. A walker whose nearest particle is d
+sites away jumps in one move to a random point on a circle of radius d-2 around
+itself, which is where a walk that cannot touch the cluster before leaving that
+circle would end up, instead of taking the ~d^2 single steps to get there. Jumps
+never reach past the circle beyond which walkers are discarded, so single steps
+are only taken next to the cluster and next to that circle.
+
+The jumps replace the lattice walk by its continuum limit, so the clusters only
+agree statistically with the step-by-step walk: compare_dimensions() checks that
+the mass-radius fractal dimension of the two is the same.
+"""
+import math
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from dla_batch import DLACluster, BatchDLA, FREE, STICK
+from dla_render import draw_cluster, save_cluster
+
+
+# Distances to the cluster are tracked up to this many sites
+MAX_DISTANCE = 32
+# Smallest jump radius, below it the walker takes single steps
+MIN_JUMP = 2
+# Number of random numbers drawn from the generator at once
+BUFFER_SIZE = 4096
+# Standard errors by which the dimensions of the two walks may differ in compare_dimensions()
+SIGNIFICANCE = 3
+
+
+class JumpDLA(DLACluster):
+    """
+    Diffusion-limited aggregation of variants 'B' and 'C' with distance-map jumps, see the module docstring.
+    """
+    variants = ('B', 'C')
+    state_scalars = DLACluster.state_scalars + ('max_distance', 'jumps', 'buffer')
+
+    def __init__(self, grid_size, variant='B', max_distance=MAX_DISTANCE, seed=None):
+        self.max_distance = max_distance
+        self.jumps = 0
+        self.buffer = []
+        super().__init__(grid_size, variant, seed)
+
+    def init_tables(self):
+        """
+        Builds the lookup tables from the occupancy of the grid, including the distance map.
+        """
+        super().init_tables()
+        r = self.max_distance
+        self.distance = np.full(self.width * self.width, float(r))
+        i = np.arange(-r, r + 1)
+        self.kernel = np.minimum(np.sqrt(i[:, None] ** 2 + i[None, :] ** 2), r)
+        self.extent = 0.0  # distance of the furthest particle from the center
+        for site in np.flatnonzero(self.occupied):
+            self.lower_distance(site)
+
+    def add_particle(self, site, time):
+        """
+        Anchors a particle on a site and updates the distance map around it.
+        """
+        super().add_particle(site, time)
+        self.lower_distance(site)
+
+    def lower_distance(self, site):
+        """
+        Lowers the distance map within max_distance of a new particle.
+        """
+        n, r = self.width, self.max_distance
+        x, y = divmod(int(site), n)
+        x0, x1 = max(x - r, 0), min(x + r + 1, n)
+        y0, y1 = max(y - r, 0), min(y + r + 1, n)
+        window = self.distance.reshape(n, n)[x0:x1, y0:y1]
+        np.minimum(window, self.kernel[x0 - x + r:x1 - x + r, y0 - y + r:y1 - y + r], out=window)
+        self.extent = max(self.extent, math.sqrt(self.dist2[site]))
+
+    def uniform(self):
+        """
+        Returns a random number in [0, 1), drawn from the generator in blocks of BUFFER_SIZE.
+        """
+        if not self.buffer:
+            self.buffer = self.rng.random(BUFFER_SIZE).tolist()
+        return self.buffer.pop()
+
+    def run_round(self, max_particles=None):
+        """
+        Launches a single walker and follows it until it sticks or is discarded.
+        """
+        n = self.width
+        table, distance, dist2, deltas = self.table, self.distance, self.dist2, self.deltas.tolist()
+        kill = 2 * self.radius
+        site = int(self.launch(1)[0])
+        steps = 0
+        while True:
+            steps += 1
+            x, y = divmod(site, n)
+            center_distance = math.sqrt(dist2[site])
+            # Every particle is within extent of the center, which bounds the distance beyond the map
+            clearance = max(distance[site], center_distance - self.extent)
+            jump = min(clearance - 2, kill - center_distance - 1, x - 2, y - 2, n - 3 - x, n - 3 - y)
+            if jump >= MIN_JUMP:
+                theta = 2 * math.pi * self.uniform()
+                x = math.floor(x + jump * math.cos(theta) + 0.5)
+                y = math.floor(y + jump * math.sin(theta) + 0.5)
+                site = x * n + y
+                self.jumps += 1
+                continue
+
+            new_site = site + deltas[int(4 * self.uniform())]
+            event = table[new_site]
+            if event == FREE:
+                site = new_site
+                continue
+            self.time += 1
+            self.walker_steps += steps
+            if event == STICK:
+                self.add_particle(site, self.time)
+                self.update_radius(site, steps)
+                if self.radius * 2 != kill:
+                    self.table = self.event_table()
+            return
+
+
+def mass_radius_dimension(grid):
+    """
+    Estimates the fractal dimension of a cluster grown from the center of the grid.
+
+    Arguments:
+    grid (array): Occupancy of the grid.
+
+    Returns:
+    float: The slope of log M(r) against log r, where M(r) is the number of particles within r
+    of the center, fitted for r from 2 to half the radius of the cluster.
+    """
+    x, y = np.nonzero(grid)
+    c = grid.shape[0] // 2
+    r = np.sort(np.hypot(x - c, y - c))
+    radii = np.geomspace(2, r[-1] / 2, 12)
+    mass = np.searchsorted(r, radii, side='right')
+    return np.polyfit(np.log(radii), np.log(mass), 1)[0]
+
+
+def compare_dimensions(grid_size=201, variant='B', clusters=20):
+    """
+    Grows clusters with the step-by-step walk and with jumps and compares their fractal dimensions.
+    Raises AssertionError if they differ by more than SIGNIFICANCE standard errors.
+
+    Returns:
+    float: The difference of the mean dimensions in units of its standard error.
+    """
+    dimensions = {}
+    for name, engine in (('steps', BatchDLA), ('jumps', JumpDLA)):
+        start = perf_counter()
+        values = np.array([mass_radius_dimension(engine(grid_size, variant, seed=seed).run().grid)
+                           for seed in range(clusters)])
+        dimensions[name] = values
+        print(f"{name}: D = {values.mean():.3f} +- {values.std() / np.sqrt(clusters):.3f} "
+              f"({perf_counter() - start:.1f} s for {clusters} clusters)")
+    steps, jumps = dimensions['steps'], dimensions['jumps']
+    z = (jumps.mean() - steps.mean()) / np.sqrt((steps.var() + jumps.var()) / clusters)
+    print(f"Difference: {z:.2f} standard errors, {'consistent' if abs(z) < SIGNIFICANCE else 'NOT consistent'}")
+    assert abs(z) < SIGNIFICANCE, f"The fractal dimensions differ by {z:.2f} standard errors"
+    return z
+
+
+def main(output=None, grid_size=1001, variant='B'):
+    """
+    Grows a large cluster with jumps and draws it, or writes it to the output file (.png or .npy).
+    """
+    engine = JumpDLA(int(grid_size), variant, seed=0)
+    start = perf_counter()
+    engine.run()
+    elapsed = perf_counter() - start
+    print(f"{engine.particles} particles on a {grid_size}x{grid_size} grid in {elapsed:.1f} s, "
+          f"{engine.walker_steps} moves of which {engine.jumps} jumps")
+
+    time_constant = engine.grid_size ** 2 // 6
+    if output:
+        save_cluster(output, engine.arrival_times, time_constant)
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        draw_cluster(ax, engine.arrival_times, time_constant)
+        ax.set_aspect('equal')
+        plt.show()
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        compare_dimensions(*map(int, sys.argv[2:3]))
+    else:
+        main(*sys.argv[1:])
@@ -0,0 +1,217 @@
+"""
+Lattice backends for the grids of Exercise 10.13.
+
+The scripts keep the cluster in `grid` and the arrival times in `arrival`, and
+only ever index them as grid[x, y]. make_lattice() returns either a dense NumPy
+array, as the scripts always used, or a ChunkedLattice: an unbounded lattice
+stored as square tiles that are allocated the first time one of their sites is
+written. Its memory grows with the area the cluster covers rather than with the
+square of GRID_SIZE, and coordinates may be arbitrarily large or negative, so a
+cluster that is not held in by the edge of the grid (10.13B) can keep growing.
+The walk functions run unchanged on either backend.
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+
+# Side of a tile, a power of two so tile and offset are a shift and a mask
+TILE_SIZE = 64
+# Types of scalar coordinates, checked before anything else as the walks index one site at a time
+SCALARS = (int, np.integer)
+
+
+def make_lattice(size, dtype=bool, fill=False, backend='dense'):
+    """
+    Creates a size x size lattice of the given type, filled with fill.
+
+    Arguments:
+    size (int): Number of sites along each side; the chunked backend has no fixed size.
+    dtype (type): Type of the values stored on the sites.
+    fill: Value of the sites that were never written.
+    backend (str): 'dense' for a NumPy array, 'chunked' for a ChunkedLattice.
+
+    Returns:
+    The lattice.
+    """
+    if backend == 'dense':
+        return np.full((size, size), fill, dtype)
+    if backend == 'chunked':
+        return ChunkedLattice(dtype, fill)
+    raise ValueError(f"Unknown lattice backend {backend!r}, expected 'dense' or 'chunked'")
+
+
+class ChunkedLattice:
+    """
+    Unbounded 2-D lattice stored as TILE_SIZE x TILE_SIZE tiles allocated on first write.
+
+    Sites are read and written as lattice[x, y], with integer or array coordinates.
+    Reading a site of a tile that was never allocated returns the fill value.
+    """
+
+    def __init__(self, dtype=bool, fill=False, tile_size=TILE_SIZE):
+        if tile_size & (tile_size - 1):
+            raise ValueError(f"The tile size must be a power of two, got {tile_size}")
+        self.dtype = np.dtype(dtype)
+        self.fill = self.dtype.type(fill)
+        self.tile_size = tile_size
+        self.shift = tile_size.bit_length() - 1
+        self.mask = tile_size - 1
+        self.tiles = {}
+
+    def tile(self, key):
+        """
+        Returns the tile with the given key, allocating it if needed.
+        """
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = np.full((self.tile_size, self.tile_size), self.fill, self.dtype)
+        return tile
+
+    def group(self, x, y):
+        """
+        Splits array coordinates by tile.
+
+        Returns:
+        list: (key, selection, x offsets, y offsets) for every tile touched by the coordinates.
+        """
+        kx, ky = x >> self.shift, y >> self.shift
+        keys, inverse = np.unique(np.stack([kx.ravel(), ky.ravel()]), axis=1, return_inverse=True)
+        inverse = inverse.reshape(x.shape)
+        groups = []
+        for i, key in enumerate(zip(*keys.tolist())):
+            selection = inverse == i
+            groups.append((key, selection, x[selection] & self.mask, y[selection] & self.mask))
+        return groups
+
+    def __getitem__(self, index):
+        x, y = index
+        if isinstance(x, SCALARS) and isinstance(y, SCALARS):
+            tile = self.tiles.get((x >> self.shift, y >> self.shift))
+            return self.fill if tile is None else tile[x & self.mask, y & self.mask]
+        x, y = np.broadcast_arrays(np.asarray(x, np.int64), np.asarray(y, np.int64))
+        values = np.full(x.shape, self.fill, self.dtype)
+        for key, selection, dx, dy in self.group(x, y):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                values[selection] = tile[dx, dy]
+        return values
+
+    def __setitem__(self, index, value):
+        x, y = index
+        if isinstance(x, SCALARS) and isinstance(y, SCALARS):
+            self.tile((x >> self.shift, y >> self.shift))[x & self.mask, y & self.mask] = value
+            return
+        x, y = np.broadcast_arrays(np.asarray(x, np.int64), np.asarray(y, np.int64))
+        value = np.broadcast_to(np.asarray(value, self.dtype), x.shape)
+        for key, selection, dx, dy in self.group(x, y):
+            self.tile(key)[dx, dy] = value[selection]
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the tiles and the table of tiles, in bytes.
+        """
+        keys = sum(sys.getsizeof(key) for key in self.tiles)
+        return sum(tile.nbytes for tile in self.tiles.values()) + sys.getsizeof(self.tiles) + keys
+
+    def sum(self):
+        """
+        Sum of all sites when the fill value is zero, the number of particles for a lattice of bools.
+        """
+        return sum(tile.sum() for tile in self.tiles.values())
+
+    def nonzero(self):
+        """
+        Coordinates of the sites that are not zero, like numpy.nonzero().
+        """
+        xs, ys = [np.empty(0, np.int64)], [np.empty(0, np.int64)]
+        for (kx, ky), tile in self.tiles.items():
+            dx, dy = np.nonzero(tile)
+            xs.append(dx + (kx << self.shift))
+            ys.append(dy + (ky << self.shift))
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def to_array(self):
+        """
+        Copies the allocated part of the lattice into a dense array.
+
+        Returns:
+        tuple:
+            array: The sites of the bounding box of all allocated tiles.
+            tuple: Coordinates (x, y) of the first site of the array.
+        """
+        if not self.tiles:
+            return np.full((0, 0), self.fill, self.dtype), (0, 0)
+        keys = np.array(list(self.tiles))
+        (x0, y0), (x1, y1) = keys.min(axis=0), keys.max(axis=0) + 1
+        t = self.tile_size
+        array = np.full(((x1 - x0) * t, (y1 - y0) * t), self.fill, self.dtype)
+        for (kx, ky), tile in self.tiles.items():
+            array[(kx - x0) * t:(kx - x0 + 1) * t, (ky - y0) * t:(ky - y0 + 1) * t] = tile
+        return array, (int(x0) * t, int(y0) * t)
+
+
+def synthetic_cluster(particles, dimension=1.71, seed=0):
+    """
+    Scatters particles around the origin with the mass-radius scaling of a DLA cluster.
+
+    The radial density falls off as r^(dimension - 2), so the number of particles within
+    r grows as r^dimension and the cluster covers the same tiles a grown one would.
+
+    Returns:
+    tuple: The x and y coordinates of the particles, without repetitions.
+    """
+    rng = np.random.default_rng(seed)
+    radius = 0.75 * particles ** (1 / dimension)
+    sites = np.empty((0, 2), np.int64)
+    while len(sites) < particles:
+        k = 2 * (particles - len(sites))
+        r = radius * rng.random(k) ** (1 / dimension)
+        theta = 2 * np.pi * rng.random(k)
+        new = np.round(np.stack([r * np.cos(theta), r * np.sin(theta)], axis=1)).astype(np.int64)
+        sites = np.unique(np.concatenate([sites, new]), axis=0)
+    sites = sites[rng.permutation(len(sites))[:particles]]
+    return sites[:, 0], sites[:, 1]
+
+
+def compare_backends(sizes=(10**4, 10**5, 10**6), lookups=200000):
+    """
+    Compares the memory use and the scalar lookup and insert rates of both backends.
+
+    The dense grid has to cover the whole cluster with a margin for the walkers, like
+    the grids of the scripts, while the chunked lattice only allocates touched tiles.
+    """
+    print(f"{'particles':>10} {'backend':>8} {'memory (MB)':>12} {'inserts/s':>11} {'lookups/s':>11}")
+    rng = np.random.default_rng(1)
+    for particles in sizes:
+        x, y = synthetic_cluster(particles)
+        half = int(max(np.abs(x).max(), np.abs(y).max())) * 2
+        size = 2 * half + 1
+        # Lookups at random sites of the disc walkers move in, twice the radius of the cluster
+        r = half * np.sqrt(rng.random(lookups))
+        theta = 2 * np.pi * rng.random(lookups)
+        lx = np.round(r * np.cos(theta)).astype(np.int64).tolist()
+        ly = np.round(r * np.sin(theta)).astype(np.int64).tolist()
+
+        for backend in ('dense', 'chunked'):
+            # The dense grid is indexed from its corner, the chunked one from the seed
+            offset = half if backend == 'dense' else 0
+            start = perf_counter()
+            grid = make_lattice(size, bool, False, backend)
+            for i, j in zip((x + offset).tolist(), (y + offset).tolist()):
+                grid[i, j] = True
+            insert = perf_counter() - start
+
+            start = perf_counter()
+            for i, j in zip(lx, ly):
+                grid[i + offset, j + offset]
+            lookup = perf_counter() - start
+            assert grid.sum() == particles
+            print(f"{particles:>10} {backend:>8} {grid.nbytes / 2**20:>12.2f} "
+                  f"{particles / insert:>11.3g} {lookups / lookup:>11.3g}")
+
+
+if __name__ == "__main__":
+    compare_backends()
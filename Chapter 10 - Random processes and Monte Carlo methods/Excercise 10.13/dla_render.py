@@ -0,0 +1,64 @@
+"""
+Artist-free rendering of the DLA clusters of Exercise 10.13.
+
+Instead of one ax.plot() call per particle, the simulations record the time at
+which each particle stuck in an integer array the size of the grid (-1 for empty
+sites), and the whole cluster is drawn once at the end with a single image call.
+Files are written without pyplot, so batch runs never load an interactive backend.
+"""
+import numpy as np
+
+
+def cluster_image(arrival, time_constant):
+    """
+    Converts arrival times to the gray levels add_particle() used to plot with, masking empty sites.
+
+    Arguments:
+    arrival (array): Time at which each particle stuck, -1 for empty sites.
+    time_constant (float): The time at which the color of a particle reaches white.
+
+    Returns:
+    masked array: Gray level of every site in [0, 1], masked where there is no particle.
+    """
+    color = np.clip(arrival / time_constant, 0, 1)
+    return np.ma.masked_where(arrival < 0, color)
+
+
+def as_array(arrival):
+    """
+    Returns the arrival times as a dense array and the coordinates of its first site.
+    Chunked lattices (see dla_lattice.py) are copied over the bounding box of their tiles.
+    """
+    if hasattr(arrival, 'to_array'):
+        return arrival.to_array()
+    return np.asarray(arrival), (0, 0)
+
+
+def draw_cluster(ax, arrival, time_constant):
+    """
+    Draws the cluster on the given axes with a single image, site (x, y) centered on the point (x, y).
+    """
+    arrival, (x0, y0) = as_array(arrival)
+    nx, ny = arrival.shape
+    ax.imshow(cluster_image(arrival, time_constant).T, origin='lower', cmap='gray', vmin=0, vmax=1,
+              extent=(x0 - 0.5, x0 + nx - 0.5, y0 - 0.5, y0 + ny - 0.5), interpolation='nearest')
+    ax.set_xlim(x0, x0 + nx)
+    ax.set_ylim(y0, y0 + ny)
+
+
+def save_cluster(path, arrival, time_constant):
+    """
+    Writes the cluster to disk: the raw arrival times for a .npy path, an image for anything else (e.g. .png).
+    """
+    if str(path).endswith('.npy'):
+        np.save(path, as_array(arrival)[0])
+        return
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    draw_cluster(ax, arrival, time_constant)
+    ax.set_aspect('equal')
+    fig.savefig(path)
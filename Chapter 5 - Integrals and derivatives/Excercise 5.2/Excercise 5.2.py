@@ -1,3 +1,5 @@
+from quadrature import romberg
+
 def f(x):
     """
     Evaluates f(x) for any given value of x.
@@ -77,6 +79,11 @@ def main():
     print(f"C. The approximate integral from {a} to {b} of f(x) using Simpson's rule with {N_100} subintervals is {res_100}.\nThe fractional error is: {error_100}.")
     print(f"The approximate integral from {a} to {b} of f(x) using Simpson's rule with {N_1000} subintervals is {res_1000}.\nThe fractional error is: {error_1000}.")
 
+    # Section D
+    # Romberg integration refines until it converges, reusing the values of f of the coarser levels (see quadrature.py)
+    report = romberg(f, a, b, tol=1e-10)
+    print(f"D. Romberg integration gives {report['integral']} with {report['evaluations']} evaluations of f.\nThe fractional error is: {fractional_error_calc(report['integral'])}.")
+
     
 if __name__=='__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Batched integration of a family of integrands over many intervals for Exercise 5.2.
+
+simpsons_rule() in the script integrates the module-level f over one interval
+per call, so thousands of intervals or parameter values are thousands of Python
+calls. Here f is any vectorized integrand f(x, *args), and the limits a and b
+and every parameter in args are arrays of length M, one integral each; scalars
+are shared by all of them. The nodes of all the integrals are formed in one
+array of shape (M, nodes) and evaluated in one call, with the parameters as
+columns of shape (M, 1) that broadcast against it.
+
+batch_simpson() applies the composite Simpson rule with the same n to every
+integral. batch_romberg() applies romberg() (see quadrature.py) to every
+integral at once: each level evaluates the new midpoints of all the integrals
+that have not converged yet, and the integrals drop out of the batch as they
+converge.
+
+The nodes are evaluated in blocks of at most max_nodes points, and only the
+weighted sums of every block are kept, so the memory stays bounded however
+large the batch.
+"""
+import math
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from quadrature import MAX_LEVELS, romberg, simpson_weights
+
+
+# Largest number of nodes evaluated in one call of the integrand; blocks of 2^14 to 2^16 nodes stay in the
+# CPU caches and run fastest, 2^10 and 2^20 both take twice as long
+MAX_NODES = 2**15
+
+
+def weighted_sums(f, a, h, offsets, weights, args=(), max_nodes=MAX_NODES):
+    """
+    Sums the integrand at the nodes a + h * offsets of every integral with each row of weights.
+
+    Arguments:
+    f (function): The integrand f(x, *args), evaluated on arrays of points.
+    a, h (array): Start and spacing of the nodes of every integral, of length M.
+    offsets (array): Positions of the nodes in units of h.
+    weights (array): Weights of the nodes, of shape (K, len(offsets)).
+    args (tuple): Parameters of the integrand, arrays of length M.
+    max_nodes (int): Largest number of nodes evaluated in one call.
+
+    Returns:
+    array: The weighted sums of shape (M, K).
+    """
+    m, count = len(a), len(offsets)
+    sums = np.zeros((m, len(weights)))
+    columns = min(count, max_nodes)
+    rows = max(1, max_nodes // columns)
+    for first in range(0, m, rows):
+        block = slice(first, first + rows)
+        parameters = [p[block, None] for p in args]
+        for start in range(0, count, columns):
+            part = slice(start, start + columns)
+            x = a[block, None] + h[block, None] * offsets[part]
+            sums[block] += f(x, *parameters) @ weights[:, part].T
+    return sums
+
+
+def prepare(a, b, args):
+    """
+    Broadcasts the limits and the parameters to arrays of a common length M.
+    """
+    arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(p, float)) for p in (a, b) + tuple(args)))
+    return arrays[0], arrays[1], tuple(arrays[2:])
+
+
+def batch_simpson(f, a, b, n, args=(), max_nodes=MAX_NODES):
+    """
+    Composite Simpson's rule over n subintervals for every interval and set of parameters at once.
+
+    Arguments:
+    f (function): The integrand f(x, *args), evaluated on arrays of points.
+    a, b (float or array): The lower and upper limits of every integral.
+    n (int): The number of subintervals of every integral.
+    args (tuple): Parameters of the integrand, floats or arrays of length M.
+    max_nodes (int): Largest number of nodes evaluated in one call.
+
+    Returns:
+    dict:
+        'integral' (array): The approximate integrals.
+        'error' (array): Estimated errors, from the rule over n / 2 subintervals; NaN unless n is a multiple of 4.
+        'evaluations' (int): Number of evaluations of f for every integral.
+    """
+    a, b, args = prepare(a, b, args)
+    h = (b - a) / n
+    weights = [simpson_weights(n)]
+    if n % 4 == 0:
+        coarse = np.zeros(n + 1)
+        coarse[::2] = 2 * simpson_weights(n // 2)
+        weights.append(coarse)
+    sums = weighted_sums(f, a, h, np.arange(n + 1.0), np.array(weights), args, max_nodes)
+    integral = h / 3 * sums[:, 0]
+    error = np.abs(integral - h / 3 * sums[:, 1]) / 15 if n % 4 == 0 else np.full(len(a), np.nan)
+    return {'integral': integral, 'error': error, 'evaluations': n + 1}
+
+
+def batch_romberg(f, a, b, args=(), tol=1e-10, max_levels=MAX_LEVELS, max_nodes=MAX_NODES):
+    """
+    Romberg integration of every interval and set of parameters at once, see romberg() in quadrature.py.
+
+    Arguments:
+    f (function): The integrand f(x, *args), evaluated on arrays of points.
+    a, b (float or array): The lower and upper limits of every integral.
+    args (tuple): Parameters of the integrand, floats or arrays of length M.
+    tol (float): The absolute error aimed at for every integral.
+    max_levels (int): Largest number of doublings, at least 1.
+    max_nodes (int): Largest number of nodes evaluated in one call.
+
+    Returns:
+    dict:
+        'integral' (array): The most extrapolated estimates of the last level of every integral.
+        'error' (array): Difference between the most extrapolated estimates of its last two levels.
+        'evaluations' (array): Number of evaluations of f for every integral.
+        'converged' (array): Whether the error of every integral is within tol.
+    """
+    if max_levels < 1:
+        raise ValueError(f"max_levels must be at least 1, got {max_levels}")
+    a, b, args = prepare(a, b, args)
+    m = len(a)
+    results = {'integral': np.empty(m), 'error': np.full(m, np.inf), 'evaluations': np.full(m, 2),
+               'converged': np.zeros(m, bool)}
+    h = b - a
+    ends = weighted_sums(f, a, h, np.array([0.0, 1.0]), np.ones((1, 2)), args, max_nodes)[:, 0]
+    rows = [[0.5 * h * ends]]
+    active = np.arange(m)
+    for level in range(1, max_levels + 1):
+        count = 2 ** (level - 1)
+        h = h / 2
+        midpoints = weighted_sums(f, a[active], h, 2 * np.arange(count) + 1.0, np.ones((1, count)),
+                                  tuple(p[active] for p in args), max_nodes)[:, 0]
+        results['evaluations'][active] += count
+        row = [0.5 * rows[-1][0] + h * midpoints]
+        for j in range(1, level + 1):
+            row.append(row[j - 1] + (row[j - 1] - rows[-1][j - 1]) / (4 ** j - 1))
+        error = np.abs(row[-1] - rows[-1][-1])
+        rows.append(row)
+        results['integral'][active] = row[-1]
+        results['error'][active] = error
+        if level < 2:
+            continue
+        # The integrals that have converged drop out with their rows of the table
+        done = error <= tol
+        results['converged'][active[done]] = True
+        keep = ~done
+        if not keep.any():
+            break
+        active, h = active[keep], h[keep]
+        rows = [[estimate[keep] for estimate in row] for row in rows]
+    return results
+
+
+def compare(m=10000, tol=1e-10):
+    """
+    Integrates exp(-c x^2) over m random intervals and widths c, in a batch and one by one with romberg().
+    """
+    def gaussian(x, c):
+        return np.exp(-c * x**2)
+
+    rng = np.random.default_rng(0)
+    a = rng.uniform(-2, 1, m)
+    b = a + rng.uniform(0.1, 3, m)
+    c = rng.uniform(0.5, 5, m)
+    exact = np.array([0.5 * math.sqrt(math.pi / c_i) * (math.erf(math.sqrt(c_i) * b_i) - math.erf(math.sqrt(c_i) * a_i))
+                      for a_i, b_i, c_i in zip(a, b, c)])
+
+    start = perf_counter()
+    serial = [romberg(lambda x, c_i=c_i: gaussian(x, c_i), a_i, b_i, tol) for a_i, b_i, c_i in zip(a, b, c)]
+    one_by_one = perf_counter() - start
+    start = perf_counter()
+    batch = batch_romberg(gaussian, a, b, (c,), tol)
+    batched = perf_counter() - start
+    difference = np.abs(batch['integral'] - [report['integral'] for report in serial]).max()
+    print(f"Romberg, {m} integrals: one by one {one_by_one:.2f} s, batched {batched:.3f} s "
+          f"({one_by_one / batched:.0f}x); largest error {np.abs(batch['integral'] - exact).max():.3g}, "
+          f"differs from romberg() by {difference:.3g}, {batch['evaluations'].mean():.0f} evaluations on average, "
+          f"{np.count_nonzero(~batch['converged'])} not converged")
+
+    for max_nodes in (MAX_NODES, 2**20):
+        start = perf_counter()
+        batch = batch_simpson(gaussian, a, b, 1000, (c,), max_nodes)
+        elapsed = perf_counter() - start
+        print(f"Simpson, N = 1000, blocks of {max_nodes} nodes: {elapsed:.3f} s, "
+              f"largest error {np.abs(batch['integral'] - exact).max():.3g}, "
+              f"largest estimated error {batch['error'].max():.3g}")
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:2]))
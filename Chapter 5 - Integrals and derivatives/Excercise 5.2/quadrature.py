@@ -0,0 +1,236 @@
+"""
+Vectorized and adaptive quadrature around simpsons_rule() of Exercise 5.2.
+
+simpsons_rule() in the script evaluates f once per node in a Python loop, with a
+number of subintervals the caller has to guess, and main() starts from scratch
+for N = 10, 100 and 1000. This module offers three rules that return the same
+report, a dict with the integral, an estimate of its error and the number of
+evaluations of f:
+
+- simpson() is the composite Simpson rule of the script with the weights in an
+  array and f evaluated on all the nodes in one call. When n is a multiple of 4
+  the rule over n / 2 subintervals uses every other node, so the error is
+  estimated from the difference of the two at no extra cost.
+- romberg() doubles the number of trapezoids until the Richardson table
+  converges. Every level only evaluates f at the midpoints of the previous
+  level, and the second column of the table is the Simpson rule, so the
+  estimates of all earlier levels are reused rather than recomputed.
+- adaptive_simpson() splits only the subintervals that have not converged. It
+  keeps the values of f at the ends and the middle of every subinterval, so a
+  split costs the two quarter points, and all the subintervals of a pass are
+  evaluated in a single call.
+
+f must accept an array of points, as the script's f does.
+"""
+import importlib.util
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Number of times an interval may be halved before romberg() and adaptive_simpson() give up
+MAX_LEVELS = 25
+MAX_DEPTH = 50
+
+
+def load_script():
+    """
+    Imports Excercise 5.2.py as a module, once.
+
+    The module is registered in sys.modules under the name computational_physics.load() gives it,
+    so the helpers and the package share a single copy of the script.
+    """
+    if "excercise_5_2" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("excercise_5_2", os.path.join(HERE, "Excercise 5.2.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["excercise_5_2"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["excercise_5_2"]
+            raise
+    return sys.modules["excercise_5_2"]
+
+
+def simpson_weights(n):
+    """
+    Weights 1, 4, 2, 4, ..., 1 of the n + 1 nodes, given to the nodes as simpsons_rule() gives them.
+    """
+    weights = np.ones(n + 1)
+    weights[1:-1:2] = 4
+    weights[2:-1:2] = 2
+    return weights
+
+
+def simpson(f, a, b, n):
+    """
+    Composite Simpson's rule over n subintervals with f evaluated on all the nodes at once.
+
+    Arguments:
+    f (function): The integrand, evaluated on an array of points.
+    a (float): The lower limit of the interval.
+    b (float): The upper limit of the interval.
+    n (int): The number of subintervals.
+
+    Returns:
+    dict:
+        'integral' (float): The approximate integral from a to b of f.
+        'error' (float): Estimated error, from the rule over n / 2 subintervals; NaN unless n is a multiple of 4.
+        'evaluations' (int): Number of evaluations of f.
+    """
+    h = (b - a) / n
+    values = f(a + h * np.arange(n + 1))
+    integral = h / 3 * np.dot(simpson_weights(n), values)
+    error = np.nan
+    if n % 4 == 0:
+        coarse = 2 * h / 3 * np.dot(simpson_weights(n // 2), values[::2])
+        error = abs(integral - coarse) / 15
+    return {'integral': integral, 'error': error, 'evaluations': n + 1}
+
+
+def romberg(f, a, b, tol=1e-10, max_levels=MAX_LEVELS):
+    """
+    Romberg integration, doubling the number of trapezoids until the estimated error is within tol.
+
+    Arguments:
+    f (function): The integrand, evaluated on an array of points.
+    a (float): The lower limit of the interval.
+    b (float): The upper limit of the interval.
+    tol (float): The absolute error aimed at.
+    max_levels (int): Largest number of doublings, at least 1.
+
+    Returns:
+    dict:
+        'integral' (float): The most extrapolated estimate of the last level.
+        'error' (float): Difference between the most extrapolated estimates of the last two levels.
+        'simpson' (float): The Simpson rule over the nodes of the last level.
+        'evaluations' (int): Number of evaluations of f.
+        'levels' (int): Number of doublings done.
+        'converged' (bool): Whether the error is within tol.
+    """
+    if max_levels < 1:
+        raise ValueError(f"max_levels must be at least 1, got {max_levels}")
+    h = b - a
+    trapezoid = 0.5 * h * np.sum(f(np.array([a, b], float)))
+    rows = [[trapezoid]]
+    evaluations = 2
+    error = np.inf
+    for level in range(1, max_levels + 1):
+        # Only the midpoints of the previous level are new
+        count = 2 ** (level - 1)
+        h /= 2
+        trapezoid = 0.5 * trapezoid + h * np.sum(f(a + h * (2 * np.arange(count) + 1)))
+        evaluations += count
+        row = [trapezoid]
+        for m in range(1, level + 1):
+            row.append(row[m - 1] + (row[m - 1] - rows[-1][m - 1]) / (4 ** m - 1))
+        error = abs(row[-1] - rows[-1][-1])
+        rows.append(row)
+        # Two levels at least, so that a coarse coincidence cannot pass for convergence
+        if level >= 2 and error <= tol:
+            break
+    return {'integral': rows[-1][-1], 'error': error, 'simpson': rows[-1][1], 'evaluations': evaluations,
+            'levels': len(rows) - 1, 'converged': error <= tol}
+
+
+def adaptive_simpson(f, a, b, tol=1e-10, max_depth=MAX_DEPTH):
+    """
+    Adaptive Simpson integration, splitting the subintervals whose two halves disagree by more than their share of tol.
+
+    Arguments:
+    f (function): The integrand, evaluated on an array of points.
+    a (float): The lower limit of the interval.
+    b (float): The upper limit of the interval.
+    tol (float): The absolute error aimed at; every subinterval gets a share in proportion to its width.
+    max_depth (int): Largest number of times a subinterval is halved; deeper ones are accepted as they are.
+
+    Returns:
+    dict:
+        'integral' (float): The sum of the extrapolated estimates of the accepted subintervals.
+        'error' (float): The sum of their estimated errors.
+        'evaluations' (int): Number of evaluations of f.
+        'intervals' (int): Number of accepted subintervals.
+        'converged' (bool): Whether every subinterval met its tolerance before max_depth.
+    """
+    if max_depth < 0:
+        raise ValueError(f"max_depth must not be negative, got {max_depth}")
+    left, right = np.array([a], float), np.array([b], float)
+    values = f(np.array([a, (a + b) / 2, b], float))
+    f_left, f_middle, f_right = values[:1], values[1:2], values[2:]
+    whole = (right - left) / 6 * (f_left + 4 * f_middle + f_right)
+    share = np.array([tol])
+    report = {'integral': 0.0, 'error': 0.0, 'evaluations': 3, 'intervals': 0, 'converged': True}
+    for depth in range(max_depth + 1):
+        middle = 0.5 * (left + right)
+        quarters = f(np.concatenate([0.5 * (left + middle), 0.5 * (middle + right)]))
+        report['evaluations'] += len(quarters)
+        f_first, f_third = np.split(quarters, 2)
+        first = (middle - left) / 6 * (f_left + 4 * f_first + f_middle)
+        second = (right - middle) / 6 * (f_middle + 4 * f_third + f_right)
+        difference = first + second - whole
+        done = np.abs(difference) <= 15 * share
+        if depth == max_depth:
+            report['converged'] = bool(done.all())
+            done[:] = True
+        # Richardson extrapolation of the accepted subintervals
+        report['integral'] += np.sum(first[done] + second[done] + difference[done] / 15)
+        report['error'] += np.sum(np.abs(difference[done])) / 15
+        report['intervals'] += int(done.sum())
+        split = ~done
+        if not split.any():
+            break
+        # The halves of the subintervals that are split, with the values of f they already have
+        left = np.concatenate([left[split], middle[split]])
+        right = np.concatenate([middle[split], right[split]])
+        f_left, f_right = np.concatenate([f_left[split], f_middle[split]]), np.concatenate([f_middle[split], f_right[split]])
+        f_middle = np.concatenate([f_first[split], f_third[split]])
+        whole = np.concatenate([first[split], second[split]])
+        share = np.tile(share[split] / 2, 2)
+    return report
+
+
+def compare(tol=1e-10):
+    """
+    Checks simpson() against simpsons_rule() of the script and compares the evaluations each rule needs.
+    """
+    script = load_script()
+    a, b, true_value = 0.0, 2.0, 4.4
+
+    print("Fixed N, as in main() of the script:")
+    total = 0
+    for n in (10, 100, 1000):
+        report = simpson(script.f, a, b, n)
+        total += report['evaluations']
+        difference = abs(report['integral'] - script.simpsons_rule(a, b, n))
+        print(f"  N = {n}: error {abs(report['integral'] - true_value):.3g}, estimated {report['error']:.3g}, "
+              f"{report['evaluations']} evaluations; differs from simpsons_rule() by {difference:.3g}")
+    print(f"  {total} evaluations in all")
+
+    n = 10**6
+    start = perf_counter()
+    script.simpsons_rule(a, b, n)
+    loop = perf_counter() - start
+    start = perf_counter()
+    simpson(script.f, a, b, n)
+    vectorized = perf_counter() - start
+    print(f"N = {n}: simpsons_rule() {loop:.2f} s, simpson() {vectorized * 1e3:.1f} ms ({loop / vectorized:.0f}x)")
+
+    # A polynomial is too easy for Romberg, sqrt(x) has an unbounded derivative at 0
+    for name, f, a, b, true_value in (("x^4 - 2x + 1 on [0, 2]", script.f, 0.0, 2.0, 4.4),
+                                      ("exp(-x^2) on [0, 3]", lambda x: np.exp(-x**2), 0.0, 3.0,
+                                       0.8862073482595211),
+                                      ("sqrt(x) on [0, 1]", np.sqrt, 0.0, 1.0, 2 / 3)):
+        print(f"{name}, tolerance {tol:.0e}:")
+        for rule in (romberg, adaptive_simpson):
+            report = rule(f, a, b, tol)
+            print(f"  {rule.__name__}: error {abs(report['integral'] - true_value):.3g}, "
+                  f"estimated {report['error']:.3g}, {report['evaluations']} evaluations"
+                  f"{'' if report['converged'] else ', not converged'}")
+
+
+if __name__ == "__main__":
+    compare(*map(float, sys.argv[1:]))
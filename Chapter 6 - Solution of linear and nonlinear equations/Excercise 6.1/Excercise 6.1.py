@@ -1,5 +1,5 @@
 # imports
-from numpy import array, empty
+from numpy import array, empty, outer
 import math
 
 def gaussian_elimination(A, v):
@@ -22,18 +22,15 @@ def gaussian_elimination(A, v):
         A[m, :] /= div
         v[m] /= div
 
-        # Subtract from the lower rows
-        for i in range(m+1, N):
-            mult = A[i, m]
-            A[i, :] -= mult * A[m, :]
-            v[i] -= mult * v[m]
+        # Subtract from all the lower rows at once, a rank-1 update; the columns left of m are already zero
+        mult = A[m+1:, m].copy()
+        A[m+1:, m:] -= outer(mult, A[m, m:])
+        v[m+1:] -= mult * v[m]
 
-    # Backsubstitution to solve for the voltages' equations
+    # Backsubstitution to solve for the voltages' equations, a row at a time
     x = empty(N, float)
     for m in range(N-1, -1, -1):
-        x[m] = v[m]
-        for i in range(m+1, N):
-            x[m] -= A[m, i] * x[i]
+        x[m] = v[m] - A[m, m+1:] @ x[m+1:]
 
     return x 
     
@@ -0,0 +1,104 @@
+"""
+Benchmark of the dense solvers of Exercise 6.1.
+
+Times the solution of a random, diagonally dominant system of N equations by:
+- rows: the elimination the script used to do, one row of the lower matrix
+  and one element of the back substitution at a time (kept here as
+  row_elimination() for the comparison);
+- rank-1: gaussian_elimination() of the script, which updates the whole lower
+  submatrix at once;
+- LU: LUFactorization with rank-1 updates of the whole remaining matrix;
+- blocked LU: LUFactorization with panels of BLOCK columns;
+- numpy: numpy.linalg.solve, the LAPACK routine.
+
+The rate is the (2/3 N^3 + 2 N^2) floating-point operations of the elimination
+and the substitutions divided by the time. A solver is skipped for the larger
+N once its previous time, scaled by N^3, would exceed the time limit.
+
+Run as python benchmark_elimination.py [N ...].
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from lu_factorization import BLOCK, LUFactorization, load_script
+
+
+SIZES = (100, 200, 500, 1000, 2000, 5000)
+# Longest a single solve may be expected to take, in seconds
+TIME_LIMIT = 60.0
+
+
+def row_elimination(A, v):
+    """
+    gaussian_elimination() as the script first wrote it, with the row operations in Python loops.
+    """
+    N = len(v)
+    for m in range(N):
+        div = A[m, m]
+        A[m, :] /= div
+        v[m] /= div
+        for i in range(m + 1, N):
+            mult = A[i, m]
+            A[i, :] -= mult * A[m, :]
+            v[i] -= mult * v[m]
+    x = np.empty(N, float)
+    for m in range(N - 1, -1, -1):
+        x[m] = v[m]
+        for i in range(m + 1, N):
+            x[m] -= A[m, i] * x[i]
+    return x
+
+
+def solvers():
+    """
+    Returns the solvers to compare by name, each taking A and v and leaving them unchanged.
+    """
+    script = load_script()
+    return {
+        'rows': lambda A, v: row_elimination(A.copy(), v.copy()),
+        'rank-1': lambda A, v: script.gaussian_elimination(A.copy(), v.copy()),
+        'LU': lambda A, v: LUFactorization(A, block=None).solve(v),
+        'blocked LU': lambda A, v: LUFactorization(A, BLOCK).solve(v),
+        'numpy': np.linalg.solve,
+    }
+
+
+def benchmark(sizes=SIZES, time_limit=TIME_LIMIT):
+    """
+    Times every solver for every size, printing the time, the rate in GFLOP/s and the largest error.
+
+    Returns:
+    dict: The times in seconds by solver name and size, None where the solver was skipped.
+    """
+    rng = np.random.default_rng(0)
+    # Built once, so that no timed size pays for loading the script
+    candidates = solvers()
+    times = {name: {} for name in candidates}
+    previous = {}
+    print(f"{'N':>6} " + "".join(f"{name:>24}" for name in times))
+    for n in sizes:
+        A = rng.standard_normal((n, n)) + n * np.eye(n)
+        x = rng.standard_normal(n)
+        v = A @ x
+        flops = 2 / 3 * n**3 + 2 * n**2
+        cells = []
+        for name, solve in candidates.items():
+            if name in previous and previous[name][1] * (n / previous[name][0])**3 > time_limit:
+                times[name][n] = None
+                cells.append(f"{'skipped':>24}")
+                continue
+            start = perf_counter()
+            solution = solve(A, v)
+            elapsed = perf_counter() - start
+            times[name][n] = elapsed
+            previous[name] = (n, elapsed)
+            error = np.abs(solution - x).max()
+            cells.append(f"{elapsed:9.3f} s {flops / elapsed / 1e9:6.2f} GF {error:5.0e}")
+        print(f"{n:>6} " + "".join(cells))
+    return times
+
+
+if __name__ == "__main__":
+    benchmark(tuple(map(int, sys.argv[1:])) or SIZES)
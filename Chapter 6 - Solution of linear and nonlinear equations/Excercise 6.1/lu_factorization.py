@@ -0,0 +1,224 @@
+"""
+LU factorization with partial pivoting for the resistor network of Exercise 6.1.
+
+gaussian_elimination() in the script reduces A and v together in place, so
+every new source vector needs a fresh copy of A and another O(N^3) elimination,
+and a zero on the diagonal stops it. LUFactorization eliminates A once, with
+partial pivoting, and keeps the multipliers: PA = LU, with the unit lower
+triangle L and the upper triangle U stored together in one array and the row
+permutation P as an array of indices. solve() then costs a forward and a back
+substitution, O(N^2) for every right-hand side, and takes a whole (N, K) block
+of them at once.
+
+Every elimination step is a rank-1 update of the whole remaining submatrix. With
+block (BLOCK columns by default), the columns are eliminated a panel at a time:
+the rank-1 updates stay within the panel, which fits in the CPU caches, and the
+rest of the matrix gets a single matrix product per panel, which numpy hands
+to BLAS. See benchmark_elimination.py for the rates of both.
+
+FactorizationCache keeps the factorizations of the last few matrices it has
+seen, keyed by a hash of their contents, so solving again against the same
+network skips the factorization altogether. solve() goes through a shared
+cache of CACHE_SIZE matrices.
+"""
+import hashlib
+import importlib.util
+import os
+import sys
+from collections import OrderedDict
+from time import perf_counter
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Number of factorizations the shared cache keeps
+CACHE_SIZE = 16
+# Number of columns of the panels of the blocked factorization
+BLOCK = 64
+
+
+def load_script():
+    """
+    Imports Excercise 6.1.py as a module, once.
+
+    The module is registered in sys.modules under the name computational_physics.load() gives it,
+    so the helpers and the package share a single copy of the script.
+    """
+    if "excercise_6_1" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("excercise_6_1", os.path.join(HERE, "Excercise 6.1.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["excercise_6_1"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["excercise_6_1"]
+            raise
+    return sys.modules["excercise_6_1"]
+
+
+class LUFactorization:
+    """
+    The factorization PA = LU of a square matrix A, computed once with partial pivoting.
+
+    Arguments:
+    A (array): The coefficients of the system, of shape (N, N); it is not modified.
+    block (int): Number of columns of the panels, or None for rank-1 updates of the whole remaining matrix.
+    """
+
+    def __init__(self, A, block=BLOCK):
+        lu = np.array(A, float)
+        n = len(lu)
+        if lu.shape != (n, n):
+            raise ValueError(f"Expected a square matrix, got the shape {lu.shape}")
+        self.lu = lu
+        self.permutation = np.arange(n)
+        block = block or n
+        for first in range(0, n, block):
+            end = min(first + block, n)
+            self.factor_panel(first, end)
+            if end < n:
+                # The rows of U right of the panel, then a single matrix product updates the rest
+                for m in range(first + 1, end):
+                    lu[m, end:] -= lu[m, first:m] @ lu[first:m, end:]
+                lu[end:, end:] -= lu[end:, first:end] @ lu[first:end, end:]
+
+    def factor_panel(self, first, end):
+        """
+        Eliminates the columns first to end - 1 below the diagonal, updating only the columns of the panel.
+        """
+        lu, permutation = self.lu, self.permutation
+        for m in range(first, end):
+            # The largest element of the column below the diagonal becomes the pivot
+            pivot = m + np.argmax(np.abs(lu[m:, m]))
+            if lu[pivot, m] == 0:
+                raise ValueError(f"The matrix is singular, column {m} has no nonzero pivot")
+            if pivot != m:
+                lu[[m, pivot]] = lu[[pivot, m]]
+                permutation[[m, pivot]] = permutation[[pivot, m]]
+            # The multipliers go below the diagonal, and the lower rows get the rank-1 update
+            lu[m + 1:, m] /= lu[m, m]
+            lu[m + 1:, m + 1:end] -= np.outer(lu[m + 1:, m], lu[m, m + 1:end])
+
+    def solve(self, v):
+        """
+        Solves Ax = v by forward and back substitution.
+
+        Arguments:
+        v (array): One right-hand side of shape (N,), or K of them as the columns of an (N, K) array.
+
+        Returns:
+        array: The solutions x, of the same shape as v.
+        """
+        lu = self.lu
+        x = np.array(v, float)[self.permutation]
+        n = len(lu)
+        for m in range(1, n):
+            x[m] -= lu[m, :m] @ x[:m]
+        for m in range(n - 1, -1, -1):
+            x[m] -= lu[m, m + 1:] @ x[m + 1:]
+            x[m] /= lu[m, m]
+        return x
+
+
+class FactorizationCache:
+    """
+    The factorizations of the last maxsize matrices, keyed by their contents.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.factorizations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(A):
+        """
+        Identifies a matrix by its shape and a hash of its elements.
+        """
+        A = np.ascontiguousarray(A, float)
+        return A.shape, hashlib.blake2b(A.tobytes(), digest_size=16).digest()
+
+    def factorization(self, A):
+        """
+        Returns the factorization of A, computing it only if A is not in the cache.
+        """
+        key = self.key(A)
+        if key in self.factorizations:
+            self.hits += 1
+            self.factorizations.move_to_end(key)
+            return self.factorizations[key]
+        self.misses += 1
+        factorization = LUFactorization(A)
+        self.factorizations[key] = factorization
+        if len(self.factorizations) > self.maxsize:
+            # The least recently used factorization makes room
+            self.factorizations.popitem(last=False)
+        return factorization
+
+    def solve(self, A, v):
+        """
+        Solves Ax = v for one right-hand side of shape (N,) or K of them as the columns of an (N, K) array.
+        """
+        return self.factorization(A).solve(v)
+
+    def clear(self):
+        """
+        Drops every factorization and resets the counters.
+        """
+        self.factorizations.clear()
+        self.hits = self.misses = 0
+
+
+cache = FactorizationCache()
+
+
+def solve(A, v):
+    """
+    Solves Ax = v through the shared cache of factorizations, leaving A and v unchanged.
+    """
+    return cache.solve(A, v)
+
+
+def compare(n=200, sources=20):
+    """
+    Checks the factorization against gaussian_elimination() and times many sources against the same network.
+    """
+    script = load_script()
+    A = np.array([[4, -1, -1, -1],
+                  [-1, 4, -1, -1],
+                  [-1, -1, 4, -1],
+                  [-1, -1, -1, 4]], float)
+    v = np.array([5, 0, 0, 0], float)
+    print(f"Network of the script: {solve(A, v)}, gaussian_elimination() gives "
+          f"{script.gaussian_elimination(A.copy(), v.copy())}")
+
+    # A zero on the diagonal stops gaussian_elimination(), pivoting goes around it
+    swapped = A[[1, 0, 2, 3]]
+    swapped[0, 0] = 0
+    x = LUFactorization(swapped).solve(v)
+    print(f"With a zero pivot: {x}, residual {np.abs(swapped @ x - v).max():.3g}")
+
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((n, n)) + n * np.eye(n)
+    V = rng.standard_normal((n, sources))
+    start = perf_counter()
+    eliminated = np.column_stack([script.gaussian_elimination(A.copy(), V[:, k].copy()) for k in range(sources)])
+    repeated = perf_counter() - start
+    cache.clear()
+    start = perf_counter()
+    one_by_one = np.column_stack([solve(A, V[:, k]) for k in range(sources)])
+    cached = perf_counter() - start
+    start = perf_counter()
+    block = solve(A, V)
+    blocked = perf_counter() - start
+    difference = max(np.abs(one_by_one - eliminated).max(), np.abs(block - eliminated).max())
+    print(f"N = {n}, {sources} sources: gaussian_elimination() {repeated:.2f} s, cached factorization "
+          f"{cached:.3f} s ({repeated / cached:.0f}x), all as one block {blocked * 1e3:.1f} ms; "
+          f"{cache.misses} factorization, {cache.hits} cache hits, largest difference {difference:.3g}")
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:]))
@@ -0,0 +1,449 @@
+"""
+Sparse assembly and solution of large resistor networks, built on the model of Exercise 6.1.
+
+The script writes the junction equations of its network by hand into a dense
+array and solves them by dense elimination, which needs N^2 numbers of memory
+and N^3 operations: a ladder or a mesh of 10^5 to 10^6 junctions cannot even be
+allocated, although every junction is only connected to a few others.
+
+A Network is a list of resistors between nodes, some of which are held at a
+fixed voltage (the V+ and the ground of the script). assemble() writes
+Kirchhoff's current law at every free junction,
+
+    sum over the neighbours j of (V_i - V_j) / R_ij = 0,
+
+straight into a CSRMatrix, the terms of the fixed neighbours going to the
+right-hand side. The matrix is symmetric and, as soon as every part of the
+network is connected to a fixed node, positive definite, so it can be solved
+by:
+- BandedSolver, a direct solver for networks numbered so that neighbours are
+  close, like a ladder, which solves the band as a block tridiagonal system by
+  cyclic reduction;
+- conjugate_gradient(), the conjugate gradient method with the diagonal as
+  preconditioner, which only needs products of the matrix with vectors and
+  suits meshes, whose band fills in.
+
+The factors of BandedSolver take about 40 N p bytes for N junctions and a band
+of width p, and their time grows as N p^2: a ladder of 10^6 junctions (p = 2)
+takes a second and 76 MB, but a square mesh has p = sqrt(N), and one of 10^5
+junctions already takes 13 s and 1.2 GB. solve_sparse() therefore factors only
+bands of at most BANDED_LIMIT numbers, which covers ladders up to 10^6
+junctions and meshes up to about 2 x 10^4, where conjugate gradients overtake
+it, and hands larger meshes to conjugate_gradient().
+
+ladder() and mesh() build the networks we model, and compare() reports the
+memory and the time of every path against the dense gaussian_elimination().
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from lu_factorization import load_script
+
+
+# Largest band, N p numbers for N unknowns and a width p, that solve_sparse() factors with BandedSolver
+BANDED_LIMIT = 4 * 10**6
+METHODS = ('banded', 'cg')
+
+class CSRMatrix:
+    """
+    A square sparse matrix in compressed sparse row format.
+
+    Arguments:
+    data (array): The nonzero elements, row by row.
+    indices (array): The column of every element.
+    indptr (array): Where the elements of every row start in data, followed by their number.
+    """
+
+    def __init__(self, data, indices, indptr):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.n = len(indptr) - 1
+        # The row of every element
+        self.rows = np.repeat(np.arange(self.n), np.diff(indptr))
+
+    @classmethod
+    def from_triplets(cls, rows, columns, values, n):
+        """
+        Builds an n x n matrix from its elements in any order, adding up the duplicates.
+        """
+        keys, inverse = np.unique(np.asarray(rows, np.int64) * n + columns, return_inverse=True)
+        data = np.bincount(inverse, weights=values, minlength=len(keys))
+        indptr = np.searchsorted(keys, np.arange(n + 1) * n)
+        return cls(data, keys % n, indptr)
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the matrix in bytes.
+        """
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes + self.rows.nbytes
+
+    def dot(self, x):
+        """
+        Returns the product of the matrix with the vector x; every row must have an element, as every junction
+        has its diagonal.
+        """
+        return np.add.reduceat(self.data * x[self.indices], self.indptr[:-1])
+
+    def diagonal(self):
+        """
+        Returns the diagonal of the matrix.
+        """
+        on_diagonal = self.rows == self.indices
+        diagonal = np.zeros(self.n)
+        diagonal[self.rows[on_diagonal]] = self.data[on_diagonal]
+        return diagonal
+
+    def bandwidth(self):
+        """
+        Returns the largest distance of an element from the diagonal.
+        """
+        return int(np.abs(self.rows - self.indices).max(initial=0))
+
+    def blocks(self, p):
+        """
+        Cuts a matrix of bandwidth at most p into p x p blocks, padded with the identity to whole blocks.
+
+        Returns:
+        array: The blocks of shape (M, 3, p, p): left of, on and right of the diagonal of every block row.
+        """
+        m = -(-self.n // p)
+        blocks = np.zeros((m, 3, p, p))
+        row, column = self.rows // p, self.indices // p
+        blocks[row, column - row + 1, self.rows % p, self.indices % p] = self.data
+        padding = np.arange(self.n, m * p)
+        blocks[padding // p, 1, padding % p, padding % p] = 1
+        return blocks
+
+    def to_dense(self):
+        """
+        Returns the matrix as a dense array.
+        """
+        dense = np.zeros((self.n, self.n))
+        dense[self.rows, self.indices] = self.data
+        return dense
+
+
+class Network:
+    """
+    A resistor network with n nodes, some of them held at fixed voltages.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.first, self.second, self.resistance = [], [], []
+        self.fixed = {}
+
+    def add_resistors(self, first, second, resistance):
+        """
+        Connects every node of first to the node of second at the same position, through resistance (ohm).
+        """
+        first, second, resistance = np.broadcast_arrays(np.asarray(first), np.asarray(second),
+                                                        np.asarray(resistance, float))
+        self.first.append(first.ravel())
+        self.second.append(second.ravel())
+        self.resistance.append(resistance.ravel())
+
+    def fix(self, node, voltage):
+        """
+        Holds a node at a voltage, as a terminal of a source.
+        """
+        self.fixed[node] = voltage
+
+    def assemble(self):
+        """
+        Writes the current law of every free junction.
+
+        Returns:
+        tuple: The CSRMatrix of conductances of the free junctions, the right-hand side, and the free nodes
+        in the order of the equations.
+        """
+        first, second = np.concatenate(self.first), np.concatenate(self.second)
+        conductance = 1 / np.concatenate(self.resistance)
+        voltage = np.full(self.n, np.nan)
+        voltage[list(self.fixed)] = list(self.fixed.values())
+        free = np.flatnonzero(np.isnan(voltage))
+        equation = np.full(self.n, -1)
+        equation[free] = np.arange(len(free))
+
+        rows, columns, values = [], [], []
+        rhs = np.zeros(len(free))
+        for here, there in ((first, second), (second, first)):
+            at = equation[here] >= 0
+            # Every resistor adds its conductance to the diagonal of its free ends
+            rows.append(equation[here[at]])
+            columns.append(equation[here[at]])
+            values.append(conductance[at])
+            # and couples them to the other end, or moves the fixed voltage of the other end to the right-hand side
+            both = at & (equation[there] >= 0)
+            rows.append(equation[here[both]])
+            columns.append(equation[there[both]])
+            values.append(-conductance[both])
+            to_fixed = at & (equation[there] < 0)
+            rhs += np.bincount(equation[here[to_fixed]], weights=conductance[to_fixed] * voltage[there[to_fixed]],
+                               minlength=len(free))
+        matrix = CSRMatrix.from_triplets(np.concatenate(rows), np.concatenate(columns), np.concatenate(values),
+                                         len(free))
+        return matrix, rhs, free
+
+    def voltages(self, solution, free):
+        """
+        Returns the voltages of all nodes from the solution for the free ones.
+        """
+        voltage = np.empty(self.n)
+        voltage[list(self.fixed)] = list(self.fixed.values())
+        voltage[free] = solution
+        return voltage
+
+
+def ladder(rungs, resistance=1.0, source=5.0):
+    """
+    A ladder of resistors with the given number of rungs, driven at one end and grounded at the other.
+
+    The nodes of the two rails alternate, 2k on the top rail and 2k + 1 below it, so neighbours are at most
+    two apart and the matrix is a band of width 2.
+    """
+    network = Network(2 * rungs)
+    top, bottom = np.arange(0, 2 * rungs, 2), np.arange(1, 2 * rungs, 2)
+    network.add_resistors(top[:-1], top[1:], resistance)
+    network.add_resistors(bottom[:-1], bottom[1:], resistance)
+    network.add_resistors(top, bottom, resistance)
+    network.fix(0, source)
+    network.fix(2 * rungs - 1, 0.0)
+    return network
+
+
+def mesh(rows, columns, resistance=1.0, source=5.0):
+    """
+    A square mesh of resistors, driven at one corner and grounded at the opposite one.
+
+    The nodes are numbered row by row, so the matrix is a band of width columns.
+    """
+    network = Network(rows * columns)
+    node = np.arange(rows * columns).reshape(rows, columns)
+    network.add_resistors(node[:, :-1], node[:, 1:], resistance)
+    network.add_resistors(node[:-1], node[1:], resistance)
+    network.fix(0, source)
+    network.fix(rows * columns - 1, 0.0)
+    return network
+
+
+class BandedSolver:
+    """
+    Direct solution of a system whose matrix is a band, by block cyclic reduction.
+
+    A band of width p is block tridiagonal with p x p blocks: block row i reads
+    A_i x_(i-1) + D_i x_i + C_i x_(i+1) = b_i. Solving the odd block rows for their
+    x and substituting them into the even ones leaves a block tridiagonal system
+    of half the size, and so on until a single block remains. Every level is a
+    handful of batched operations on all its blocks at once, so the Python loop
+    runs log2(N / p) times instead of N. The last one or two block rows are solved
+    as one dense system. The matrix needs to keep its diagonal
+    blocks invertible all the way down, which a symmetric positive-definite
+    matrix does. The reduction keeps about 5 N p numbers, so wide bands are
+    better left to conjugate_gradient(), see solve_sparse().
+
+    Arguments:
+    matrix (CSRMatrix): The matrix of the system.
+    """
+
+    def __init__(self, matrix):
+        self.n = matrix.n
+        self.p = max(matrix.bandwidth(), 1)
+        blocks = matrix.blocks(self.p)
+        lower, diagonal, upper = blocks[:, 0], blocks[:, 1], blocks[:, 2]
+        # For every level: the inverses of the odd diagonal blocks, their couplings solved through them,
+        # and the couplings of the even block rows to the odd ones
+        self.levels = []
+        while len(diagonal) > 2:
+            if len(diagonal) % 2 == 0:
+                # An uncoupled identity block row, so that the first and the last block rows are even
+                identity = np.eye(self.p)[None]
+                zero = np.zeros((1, self.p, self.p))
+                lower, diagonal, upper = (np.concatenate([lower, zero]), np.concatenate([diagonal, identity]),
+                                          np.concatenate([upper, zero]))
+            inverse = np.linalg.inv(diagonal[1::2])
+            alpha, gamma = inverse @ lower[1::2], inverse @ upper[1::2]
+            left, right = lower[0::2], upper[0::2]
+            self.levels.append((inverse, alpha, gamma, left[1:], right[:-1]))
+            new_diagonal = diagonal[0::2].copy()
+            new_diagonal[1:] -= left[1:] @ gamma
+            new_diagonal[:-1] -= right[:-1] @ alpha
+            new_lower = np.zeros_like(new_diagonal)
+            new_upper = np.zeros_like(new_diagonal)
+            new_lower[1:] = -left[1:] @ alpha
+            new_upper[:-1] = -right[:-1] @ gamma
+            lower, diagonal, upper = new_lower, new_diagonal, new_upper
+        # The one or two block rows left are solved together
+        size = len(diagonal) * self.p
+        last = np.zeros((size, size))
+        for i in range(len(diagonal)):
+            rows = slice(i * self.p, (i + 1) * self.p)
+            last[rows, rows] = diagonal[i]
+            if i:
+                last[rows, :self.p] = lower[i]
+                last[:self.p, rows] = upper[0]
+        self.last = np.linalg.inv(last)
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the reduction in bytes.
+        """
+        return self.last.nbytes + sum(array.nbytes for level in self.levels for array in level)
+
+    def solve(self, v):
+        """
+        Solves Ax = v for one right-hand side of shape (N,).
+        """
+        p = self.p
+        b = np.zeros(-(-self.n // p) * p)
+        b[:self.n] = v
+        b = b.reshape(-1, p, 1)
+        betas = []
+        for inverse, alpha, gamma, left, right in self.levels:
+            if len(b) % 2 == 0:
+                b = np.concatenate([b, np.zeros((1, p, 1))])
+            beta = inverse @ b[1::2]
+            betas.append(beta)
+            b = b[0::2].copy()
+            b[1:] -= left @ beta
+            b[:-1] -= right @ beta
+        x = (self.last @ b.reshape(-1, 1)).reshape(-1, p, 1)
+        for (inverse, alpha, gamma, left, right), beta in zip(reversed(self.levels), reversed(betas)):
+            # The odd block rows from their even neighbours, leaving out the padding of the level above
+            x = x[:len(beta) + 1]
+            odd = beta - alpha @ x[:-1] - gamma @ x[1:]
+            full = np.empty((len(x) + len(odd), p, 1))
+            full[0::2], full[1::2] = x, odd
+            x = full
+        return x.ravel()[:self.n]
+
+
+def conjugate_gradient(matrix, v, tol=1e-10, max_iterations=None):
+    """
+    Solves Ax = v for a symmetric positive-definite A by conjugate gradients, preconditioned by the diagonal.
+
+    Arguments:
+    matrix (CSRMatrix): The matrix A, or any object with dot() and diagonal().
+    v (array): The right-hand side.
+    tol (float): The residual at which to stop, relative to the norm of v.
+    max_iterations (int): Largest number of iterations, 10 N by default.
+
+    Returns:
+    tuple: The solution and the number of iterations.
+    """
+    inverse_diagonal = 1 / matrix.diagonal()
+    x = np.zeros(len(v))
+    residual = np.array(v, float)
+    z = inverse_diagonal * residual
+    direction = z.copy()
+    rz = residual @ z
+    target = tol * np.linalg.norm(v)
+    max_iterations = max_iterations or 10 * len(v)
+    for iteration in range(1, max_iterations + 1):
+        product = matrix.dot(direction)
+        step = rz / (direction @ product)
+        x += step * direction
+        residual -= step * product
+        if np.linalg.norm(residual) <= target:
+            return x, iteration
+        z = inverse_diagonal * residual
+        rz, previous = residual @ z, rz
+        direction *= rz / previous
+        direction += z
+    raise RuntimeError(f"Conjugate gradients did not converge in {max_iterations} iterations")
+
+
+def solve_sparse(matrix, v, method=None):
+    """
+    Solves Ax = v by BandedSolver or by conjugate_gradient(), whichever suits the band of A.
+
+    Arguments:
+    matrix (CSRMatrix): The matrix A, symmetric positive-definite.
+    v (array): The right-hand side.
+    method (str): 'banded' or 'cg'; by default 'banded' if the band of A holds at most BANDED_LIMIT
+        numbers, 'cg' otherwise.
+
+    Returns:
+    array: The solution.
+    """
+    if method is None:
+        method = 'banded' if matrix.n * matrix.bandwidth() <= BANDED_LIMIT else 'cg'
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {', '.join(METHODS)}")
+    if method == 'banded':
+        return BandedSolver(matrix).solve(v)
+    return conjugate_gradient(matrix, v)[0]
+
+
+def megabytes(nbytes):
+    """
+    Formats a number of bytes in MB.
+    """
+    return f"{nbytes / 2**20:.3g} MB"
+
+
+def script_network(source=5.0):
+    """
+    The network of the script: four junctions all connected to each other, the first to V+ (node 4)
+    and the others to the ground (node 5), every resistor of the same resistance.
+    """
+    network = Network(6)
+    network.add_resistors([0, 0, 0, 1, 1, 2, 0, 1, 2, 3], [1, 2, 3, 2, 3, 3, 4, 5, 5, 5], 1.0)
+    network.fix(4, source)
+    network.fix(5, 0.0)
+    return network
+
+
+def compare(largest=10**5, dense_limit=2000, banded_limit=BANDED_LIMIT, cg_limit=10**4):
+    """
+    Solves the network of the script, then ladders and meshes of growing size by every path that fits.
+
+    Arguments:
+    largest (int): Number of junctions of the largest ladder and mesh; a mesh of 10^6 takes minutes.
+    dense_limit (int): Largest number of junctions solved by gaussian_elimination().
+    banded_limit (int): Largest band, in numbers, solved by BandedSolver.
+    cg_limit (int): Largest number of junctions of a ladder solved by conjugate gradients.
+    """
+    script = load_script()
+    matrix, rhs, free = script_network().assemble()
+    dense = script.gaussian_elimination(matrix.to_dense(), rhs.copy())
+    print(f"Network of the script: banded {solve_sparse(matrix, rhs, 'banded')}, "
+          f"conjugate gradients {solve_sparse(matrix, rhs, 'cg')}, gaussian_elimination() {dense}")
+
+    sizes = [n for n in (10**3, 10**4, 10**5, 10**6) if n <= largest]
+    for kind, build in (('Ladder', lambda n: ladder(n // 2)), ('Mesh', lambda n: mesh(int(n**0.5), int(n**0.5)))):
+        for n in sizes:
+            network = build(n)
+            start = perf_counter()
+            matrix, rhs, free = network.assemble()
+            assembly = perf_counter() - start
+            print(f"{kind} of {network.n} nodes: CSR {megabytes(matrix.nbytes)} assembled in {assembly:.2f} s, "
+                  f"a dense matrix would take {megabytes(8 * matrix.n**2)}, bandwidth {matrix.bandwidth()}")
+            solutions = {}
+            if matrix.n <= dense_limit:
+                start = perf_counter()
+                solutions['dense'] = script.gaussian_elimination(matrix.to_dense(), rhs.copy())
+                print(f"  gaussian_elimination(): {perf_counter() - start:.2f} s")
+            if matrix.n * matrix.bandwidth() <= banded_limit:
+                start = perf_counter()
+                solver = BandedSolver(matrix)
+                solutions['banded'] = solver.solve(rhs)
+                print(f"  banded: {perf_counter() - start:.2f} s, {megabytes(solver.nbytes)}")
+            if kind == 'Mesh' or matrix.n <= cg_limit:
+                # The condition number of a ladder grows as N^2, so its iterations grow as N
+                start = perf_counter()
+                solutions['cg'], iterations = conjugate_gradient(matrix, rhs)
+                print(f"  conjugate gradients: {perf_counter() - start:.2f} s, {iterations} iterations")
+            residual = max(np.abs(matrix.dot(x) - rhs).max() for x in solutions.values())
+            reference = next(iter(solutions.values()))
+            spread = max(np.abs(x - reference).max() for x in solutions.values())
+            print(f"  largest residual {residual:.3g}, solutions differ by {spread:.3g} V")
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:]))
@@ -52,10 +52,12 @@ def inverse_matrix_2x2(arr):
 
 def main():
     x1 = array([3, 2.4], float) # Initial guess for V1 and V2
-    delta_x = dot(inverse_matrix_2x2(grad_f(x1)),f(x1)) # Delta x according to equation (6.108) is the inverse of the Jacobian matrix multipied by f(x)
-    while abs(delta_x[0]) > target or abs(delta_x[1]) > target: # Iterating over the values of V1 and V2 untill they are within the range of the defined target value.
-        delta_x = dot(inverse_matrix_2x2(grad_f(x1)), f(x1)) # Calculate the change in the voltages using Newton's method.
+    while True: # Iterating over the values of V1 and V2 untill they are within the range of the defined target value.
+        delta_x = dot(inverse_matrix_2x2(grad_f(x1)), f(x1)) # Delta x according to equation (6.108) is the inverse of the Jacobian matrix multipied by f(x)
         x1 -= delta_x
+        if abs(delta_x[0]) <= target and abs(delta_x[1]) <= target:
+            break
+    # Sweeps over V_p, the resistors and I0 are solved together by solve_batch() in batch_newton.py
     
     print('V1 = ', x1[0])
     print('V2 = ', x1[1])
@@ -0,0 +1,174 @@
+"""
+Batched Newton solver for the diode circuit of Exercise 6.17 across parameter sweeps.
+
+main() in the script solves one circuit at a time with the parameters as module
+constants, and every iteration calls f(), grad_f() and inverse_matrix_2x2()
+separately, which compute the same exp((V1 - V2) / V_T) five times. Here M
+circuits, each with its own V_p, resistors, I0 and V_T, are solved together:
+residual_and_jacobian() computes the diode current once per circuit and builds
+the residuals and the Jacobians of all the circuits from it, and the 2x2
+systems are solved in closed form by Cramer's rule. The voltages are held as a
+(2, M) array, V1 and V2 each a contiguous row, and taken and returned as (M, 2).
+Every circuit stops as soon as its own Newton step is within the target, and
+only the circuits still iterating are evaluated.
+"""
+import importlib.util
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARAMETERS = ('V_p', 'R1', 'R2', 'R3', 'R4', 'I0', 'V_T')
+# Newton iterations after which a circuit is given up
+MAX_ITERATIONS = 100
+
+
+def load_script():
+    """
+    Imports Excercise 6.17.py as a module, once.
+
+    The module is registered in sys.modules under the name computational_physics.load() gives it,
+    so the helpers and the package share a single copy of the script.
+    """
+    if "excercise_6_17" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("excercise_6_17", os.path.join(HERE, "Excercise 6.17.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["excercise_6_17"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["excercise_6_17"]
+            raise
+    return sys.modules["excercise_6_17"]
+
+
+def residual_and_jacobian(V, V_p, R1, R2, R3, R4, I0, V_T):
+    """
+    Evaluates the equations of f() and their Jacobian of grad_f() for voltages V of shape (2, M).
+
+    Returns:
+    tuple: The residuals (f1, f2) and the elements (a, b, c, d) of the Jacobians [[a, b], [c, d]], arrays of length M.
+    """
+    exponential = np.exp((V[0] - V[1]) / V_T)
+    diode = I0 * (exponential - 1)
+    slope = I0 / V_T * exponential
+    f1 = (V[0] - V_p) / R1 + V[0] / R2 + diode
+    f2 = (V_p - V[1]) / R3 - V[1] / R4 + diode
+    return (f1, f2), (1 / R1 + 1 / R2 + slope, -slope, slope, -1 / R3 - 1 / R4 - slope)
+
+
+def newton_step(V, parameters):
+    """
+    Returns the Newton step of shape (2, M), the Jacobian systems solved by Cramer's rule.
+    """
+    (f1, f2), (a, b, c, d) = residual_and_jacobian(V, *parameters)
+    inverse_determinant = 1 / (a * d - b * c)
+    return np.array([(d * f1 - b * f2) * inverse_determinant, (a * f2 - c * f1) * inverse_determinant])
+
+
+def solve_batch(guess=(3, 2.4), target=None, max_iterations=MAX_ITERATIONS, max_step=None, **parameters):
+    """
+    Solves the circuit for every set of parameters by Newton's method, all of them at once.
+
+    Arguments:
+    guess (array): Initial V1 and V2, of shape (2,) for all the circuits or (M, 2).
+    target (float): Accuracy of V1 and V2 in volts, the script's target by default.
+    max_iterations (int): Iterations after which the circuits that have not converged are given up.
+    max_step (float): Largest change of V1 or V2 in one iteration, in volts; far from the solution the
+        exponential of the diode makes full Newton steps overshoot and overflow. No limit by default, as in main().
+    **parameters: Arrays of length M of any of V_p, R1, R2, R3, R4, I0 and V_T; the others keep
+        the values of the script.
+
+    Returns:
+    dict:
+        'V' (array): V1 and V2 of every circuit, of shape (M, 2).
+        'iterations' (array): Newton iterations of every circuit.
+        'converged' (array): Whether the last step of every circuit was within the target.
+    """
+    script = load_script()
+    unknown = set(parameters) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters {', '.join(sorted(unknown))}")
+    target = script.target if target is None else target
+    values = np.broadcast_arrays(*(np.asarray(parameters.get(name, getattr(script, name)), float)
+                                   for name in PARAMETERS), np.asarray(guess, float)[..., 0])
+    m = values[0].size
+    columns = [value.ravel() for value in values[:-1]]
+    V = np.array(np.broadcast_to(np.asarray(guess, float), (m, 2)).T)
+
+    results = {'iterations': np.zeros(m, int), 'converged': np.zeros(m, bool)}
+    active = np.arange(m)
+    for _ in range(max_iterations):
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            step = newton_step(V[:, active], [column[active] for column in columns])
+            if max_step:
+                # A zero step gives an infinite ratio and is left as it is, a NaN step stays NaN
+                step *= np.minimum(1, max_step / np.abs(step).max(axis=0))
+        V[:, active] -= step
+        results['iterations'][active] += 1
+        done = (np.abs(step) <= target).all(axis=0)
+        results['converged'][active[done]] = True
+        # Circuits that overflowed drop out unconverged
+        active = active[~done & np.isfinite(step).all(axis=0)]
+        if not len(active):
+            break
+    results['V'] = V.T
+    return results
+
+
+def solve_serial(script, V_p, I0, max_iterations=MAX_ITERATIONS):
+    """
+    Solves one circuit with the functions of the script, its V_p and I0 set as main() would see them
+    and put back afterwards. Returns NaN if the iteration does not converge.
+    """
+    original = script.V_p, script.I0
+    script.V_p, script.I0 = V_p, I0
+    x = np.array([3, 2.4], float)
+    try:
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            for _ in range(max_iterations):
+                delta_x = np.dot(script.inverse_matrix_2x2(script.grad_f(x)), script.f(x))
+                x -= delta_x
+                if abs(delta_x[0]) <= script.target and abs(delta_x[1]) <= script.target:
+                    return x
+        return np.full(2, np.nan)
+    finally:
+        script.V_p, script.I0 = original
+
+
+def compare(m=20000, serial=1000, max_step=0.5):
+    """
+    Checks the batch against the functions of the script and times a sweep of V_p and I0, with full
+    Newton steps as in main() and with steps limited to max_step.
+    """
+    script = load_script()
+    single = solve_batch()
+    print(f"Circuit of the script: V1 = {single['V'][0, 0]}, V2 = {single['V'][0, 1]} "
+          f"in {single['iterations'][0]} iterations")
+
+    rng = np.random.default_rng(0)
+    V_p = rng.uniform(1, 10, m)
+    I0 = 10**rng.uniform(-12, -6, m)
+    start = perf_counter()
+    one_by_one = np.array([solve_serial(script, V_p[i], I0[i]) for i in range(serial)])
+    elapsed = (perf_counter() - start) / serial
+    for limit in (None, max_step):
+        start = perf_counter()
+        batch = solve_batch(V_p=V_p, I0=I0, max_step=limit)
+        batched = perf_counter() - start
+        # Both converge to the same root wherever main() does, within the target
+        both = batch['converged'][:serial] & np.isfinite(one_by_one[:, 0])
+        difference = np.abs(batch['V'][:serial][both] - one_by_one[both]).max()
+        print(f"{'Full steps' if limit is None else f'Steps of at most {limit} V'}: {m} operating points in "
+              f"{batched:.3f} s, one at a time with the script {elapsed * 1e3:.2f} ms each "
+              f"({m * elapsed / batched:.0f}x the throughput); iterations {batch['iterations'].min()} to "
+              f"{batch['iterations'].max()}, {np.count_nonzero(~batch['converged'])} not converged, "
+              f"largest difference from the script {difference:.3g} V")
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:3]), *map(float, sys.argv[3:4]))
@@ -0,0 +1,353 @@
+"""
+General nonlinear nodal solver for networks of resistors and diodes, after Exercise 6.17.
+
+The script writes the two equations of its circuit by hand and inverts their
+2x2 Jacobian with inverse_matrix_2x2() at every Newton step. A DiodeNetwork
+instead holds any number of junctions, resistors, diodes and fixed voltages
+(the V+ and the ground), and writes Kirchhoff's current law at every free
+junction, the diode currents I0 (exp(V / V_T) - 1) included. The resistors give
+a constant part of the Jacobian, assembled once, and every diode adds its
+conductance at the present voltages.
+
+NodalSolver factors the Jacobian with LUFactorization of Exercise 6.1 (see
+lu_factorization.py there) and reuses the factorization according to its method:
+- 'newton' factors the Jacobian at every iteration;
+- 'chord' keeps the last factorization as long as every step is at most
+  `contraction` times the previous one, and factors again where it is not;
+- 'broyden' corrects the inverse of the last factorization by a rank-1 update
+  after every step, in the form of Kelley's algorithm (C. T. Kelley, Iterative
+  Methods for Linear and Nonlinear Equations, 1995), which only needs solves
+  with the factorization and the steps taken, and starts again from a new
+  factorization when the updates stop contracting.
+
+sweep() moves a source through a list of values by continuation: every
+operating point starts from the solution of the previous one, keeps the
+factorization of the previous one, and if it does not converge, the source is
+stepped up to it in smaller increments. The solver counts the iterations, the
+evaluations of the equations and the factorizations.
+"""
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from batch_newton import load_script
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+METHODS = ('newton', 'chord', 'broyden')
+MAX_ITERATIONS = 100
+# Ratio of successive steps above which chord and Broyden factor the Jacobian again
+CONTRACTION = 0.5
+# Number of times the increment of the source is halved before sweep() gives up
+MAX_HALVINGS = 10
+
+
+def load_lu_factorization():
+    """
+    Imports lu_factorization.py of Exercise 6.1 through computational_physics.load(), so the factorizations
+    here are those of the package, and of its instrumentation.
+    """
+    root = os.path.dirname(os.path.dirname(HERE))
+    if root not in sys.path:
+        sys.path.append(root)
+    from computational_physics import load
+    return load('6.1', 'lu_factorization')
+
+
+LUFactorization = load_lu_factorization().LUFactorization
+
+
+class DiodeNetwork:
+    """
+    A network of n nodes connected by resistors and diodes, some of the nodes held at fixed voltages.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.resistors = ([], [], [])
+        self.diodes = ([], [], [], [])
+        self.fixed = {}
+        self.assembled = False
+
+    def add_resistors(self, first, second, resistance):
+        """
+        Connects every node of first to the node of second at the same position, through resistance (ohm).
+        """
+        for values, new in zip(self.resistors, np.broadcast_arrays(first, second, np.asarray(resistance, float))):
+            values.append(np.ravel(new))
+        self.assembled = False
+
+    def add_diodes(self, anode, cathode, I0, V_T):
+        """
+        Connects diodes from every node of anode to the node of cathode at the same position, with saturation
+        current I0 (A) and thermal voltage V_T (V).
+        """
+        arrays = np.broadcast_arrays(anode, cathode, np.asarray(I0, float), np.asarray(V_T, float))
+        for values, new in zip(self.diodes, arrays):
+            values.append(np.ravel(new))
+        self.assembled = False
+
+    def fix(self, node, voltage):
+        """
+        Holds a node at a voltage, as a terminal of a source; the voltage of a fixed node may change freely.
+        """
+        if node not in self.fixed:
+            self.assembled = False
+        self.fixed[node] = voltage
+
+    def assemble(self):
+        """
+        Numbers the free junctions and assembles the constant, resistive part of the Jacobian.
+        """
+        first, second, resistance = (np.concatenate(values) for values in self.resistors)
+        anode, cathode, self.I0, self.V_T = (np.concatenate(values) for values in self.diodes)
+        self.free = np.setdiff1d(np.arange(self.n), list(self.fixed))
+        self.equation = np.full(self.n, -1)
+        self.equation[self.free] = np.arange(len(self.free))
+        self.first, self.second, self.conductance = first, second, 1 / resistance
+        self.anode, self.cathode = anode, cathode
+
+        size = len(self.free)
+        self.resistive = np.zeros((size, size))
+        for here, there in ((first, second), (second, first)):
+            row, column = self.equation[here], self.equation[there]
+            np.add.at(self.resistive, (row[row >= 0], row[row >= 0]), self.conductance[row >= 0])
+            both = (row >= 0) & (column >= 0)
+            np.add.at(self.resistive, (row[both], column[both]), -self.conductance[both])
+        self.assembled = True
+
+    def voltages(self, V):
+        """
+        Returns the voltages of all the nodes from those of the free junctions.
+        """
+        full = np.empty(self.n)
+        full[list(self.fixed)] = list(self.fixed.values())
+        full[self.free] = V
+        return full
+
+    def evaluate(self, V, jacobian=True):
+        """
+        Evaluates the currents leaving every free junction and, with jacobian, their derivatives.
+
+        Returns:
+        tuple: The residual of length N and the Jacobian of shape (N, N), or None without jacobian.
+        """
+        if not self.assembled:
+            self.assemble()
+        full = self.voltages(V)
+        exponential = np.exp((full[self.anode] - full[self.cathode]) / self.V_T)
+        diode = self.I0 * (exponential - 1)
+        resistor = self.conductance * (full[self.first] - full[self.second])
+        # The current of every element leaves its first node and enters its second
+        currents = (np.bincount(self.first, resistor, self.n) - np.bincount(self.second, resistor, self.n)
+                    + np.bincount(self.anode, diode, self.n) - np.bincount(self.cathode, diode, self.n))
+        residual = currents[self.free]
+        if not jacobian:
+            return residual, None
+        matrix = self.resistive.copy()
+        slope = self.I0 / self.V_T * exponential
+        for here, there in ((self.anode, self.cathode), (self.cathode, self.anode)):
+            row, column = self.equation[here], self.equation[there]
+            np.add.at(matrix, (row[row >= 0], row[row >= 0]), slope[row >= 0])
+            both = (row >= 0) & (column >= 0)
+            np.add.at(matrix, (row[both], column[both]), -slope[both])
+        return residual, matrix
+
+
+class NodalSolver:
+    """
+    Solves a DiodeNetwork, keeping its factorized Jacobian from one solve to the next.
+
+    Arguments:
+    network (DiodeNetwork): The network.
+    method (str): 'newton', 'chord' or 'broyden', see the module docstring.
+    target (float): Accuracy of the voltages in volts; the iteration stops after a step within it.
+    max_step (float): Largest change of a voltage in one iteration, in volts, or None for full steps.
+    max_iterations (int): Iterations after which a solve is given up.
+    contraction (float): Ratio of successive steps above which chord and Broyden factor again.
+    """
+
+    def __init__(self, network, method='chord', target=1e-8, max_step=None, max_iterations=MAX_ITERATIONS,
+                 contraction=CONTRACTION):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {', '.join(METHODS)}")
+        self.network = network
+        self.method = method
+        self.target = target
+        self.max_step = max_step
+        self.max_iterations = max_iterations
+        self.contraction = contraction
+        self.factorization = None
+        self.iterations = 0
+        self.evaluations = 0
+        self.factorizations = 0
+
+    def factor(self, V):
+        """
+        Factors the Jacobian at V and returns the residual there.
+        """
+        residual, jacobian = self.network.evaluate(V)
+        self.evaluations += 1
+        self.factorization = LUFactorization(jacobian)
+        self.factorizations += 1
+        return residual
+
+    def residual(self, V):
+        """
+        Evaluates the residual at V alone.
+        """
+        self.evaluations += 1
+        return self.network.evaluate(V, jacobian=False)[0]
+
+    def limit(self, step):
+        """
+        Scales a step down to max_step; returns the step and whether it was scaled.
+        """
+        largest = np.abs(step).max()
+        if self.max_step and largest > self.max_step:
+            return step * (self.max_step / largest), True
+        return step, False
+
+    def solve(self, guess):
+        """
+        Solves the network from the voltages guess of the free junctions.
+
+        Returns:
+        tuple: The voltages of the free junctions and whether the iteration converged.
+        """
+        V = np.array(guess, float)
+        if self.factorization is None or self.method == 'newton':
+            residual = self.factor(V)
+        else:
+            residual = self.residual(V)
+        # Broyden's steps since the last factorization, and their squared norms
+        steps, norms = [], []
+        previous = np.inf
+        for _ in range(self.max_iterations):
+            self.iterations += 1
+            step = -self.factorization.solve(residual)
+            if self.method == 'broyden':
+                for j in range(len(steps) - 1):
+                    step += steps[j + 1] * (steps[j] @ step) / norms[j]
+                if steps:
+                    step /= 1 - (steps[-1] @ step) / norms[-1]
+            step, limited = self.limit(step)
+            size = np.abs(step).max()
+            if not np.isfinite(size):
+                return V, False
+            V += step
+            if size <= self.target:
+                return V, True
+            stalled = size > self.contraction * previous
+            previous = size
+            if self.method == 'newton' or (stalled and self.method == 'chord'):
+                residual = self.factor(V)
+            elif self.method == 'broyden' and (stalled or limited):
+                # The secant updates only hold for full steps, so start again from a new factorization
+                residual = self.factor(V)
+                steps, norms = [], []
+            else:
+                residual = self.residual(V)
+                if self.method == 'broyden':
+                    steps.append(step)
+                    norms.append(step @ step)
+        return V, False
+
+    def sweep(self, node, values, guess):
+        """
+        Solves the network for every voltage in values of the fixed node, by continuation.
+
+        Returns:
+        array: The voltages of the free junctions at every value, of shape (len(values), N).
+        """
+        network = self.network
+        current = network.fixed[node]
+        V = np.array(guess, float)
+        solutions = []
+        for value in values:
+            if value == current:
+                # No step of the source is needed, but the guess still has to be solved at this value
+                solution, converged = self.solve(V)
+                if not converged:
+                    raise RuntimeError(f"No convergence with node {node} at {value} V")
+                V = solution
+            increment = value - current
+            halvings = 0
+            while current != value:
+                network.fix(node, min(current + increment, value) if increment > 0 else max(current + increment, value))
+                solution, converged = self.solve(V)
+                if converged:
+                    current, V = network.fixed[node], solution
+                    continue
+                halvings += 1
+                if halvings > MAX_HALVINGS:
+                    raise RuntimeError(f"No convergence stepping node {node} from {current} towards {value} V")
+                # Step the source up in smaller increments, from the last solution and a fresh Jacobian
+                increment /= 2
+                self.factor(V)
+            solutions.append(V.copy())
+        return np.array(solutions)
+
+
+def script_network():
+    """
+    The circuit of the script: V1 and V2 are nodes 0 and 1, V+ node 2 and the ground node 3.
+    """
+    script = load_script()
+    network = DiodeNetwork(4)
+    network.add_resistors([2, 0, 1, 1], [0, 3, 2, 3], [script.R1, script.R2, script.R3, script.R4])
+    network.add_diodes(0, 1, script.I0, script.V_T)
+    network.fix(2, script.V_p)
+    network.fix(3, 0.0)
+    return network
+
+
+def diode_chain(n, V_p=5.0, resistance=1e3, I0=3e-9, V_T=0.05, seed=0):
+    """
+    A chain of n junctions fed by V+ (node n) through a resistor, every junction connected to the next by a
+    resistor and a diode, and to the ground (node n + 1) by a resistor and, for every third, a diode.
+    """
+    rng = np.random.default_rng(seed)
+    network = DiodeNetwork(n + 2)
+    nodes = np.arange(n)
+    network.add_resistors(n, 0, resistance)
+    network.add_resistors(nodes[:-1], nodes[1:], resistance * rng.uniform(0.5, 2, n - 1))
+    network.add_resistors(nodes, n + 1, 10 * resistance * rng.uniform(0.5, 2, n))
+    network.add_diodes(nodes[:-1], nodes[1:], I0 * rng.uniform(0.5, 2, n - 1), V_T)
+    network.add_diodes(nodes[::3], n + 1, I0, V_T)
+    network.fix(n, V_p)
+    network.fix(n + 1, 0.0)
+    return network
+
+
+def compare(n=300, points=101):
+    """
+    Solves the circuit of the script with every method, then sweeps V+ of a chain of n junctions.
+    """
+    script = load_script()
+    for method in METHODS:
+        solver = NodalSolver(script_network(), method, target=script.target)
+        V, converged = solver.solve([3, 2.4])
+        print(f"Circuit of the script, {method}: V1 = {V[0]}, V2 = {V[1]}, {solver.iterations} iterations, "
+              f"{solver.factorizations} factorizations")
+
+    values = np.linspace(0, 20, points)
+    solutions = {}
+    for method in METHODS:
+        network = diode_chain(n, V_p=0.0)
+        solver = NodalSolver(network, method, max_step=0.5)
+        start = perf_counter()
+        solutions[method] = solver.sweep(n, values, np.zeros(n))
+        elapsed = perf_counter() - start
+        print(f"Chain of {n} junctions, V+ from 0 to {values[-1]:.0f} V in {points} points, {method}: "
+              f"{solver.iterations} iterations, {solver.evaluations} evaluations, "
+              f"{solver.factorizations} factorizations in {elapsed:.2f} s")
+    difference = max(np.abs(solutions[method] - solutions['newton']).max() for method in METHODS)
+    print(f"Largest difference between the methods {difference:.3g} V")
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:]))
@@ -1,7 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
-
-plt.close('all')
+from bulirsch_stoer import BulirschStoer
 
 
 # Constants
@@ -94,9 +92,18 @@ def solution(t_0, t_f):
     return tpoints, xpoints, ypoints
 
 def main():
-    t, x, y = solution(t_0, t_f)
-    plt.plot(t, x, 'b', label='x')
-    plt.plot(t, y, 'g', label='y')
+    # Only the plot needs pyplot; importing the solvers leaves matplotlib unloaded
+    import matplotlib.pyplot as plt
+    plt.close('all')
+
+    # The iterative driver gives the same points as solution() without recursing, see bulirsch_stoer.py
+    t, r, dense = BulirschStoer(f, delta).solve([x_0, y_0], t_0, t_f, dense=True)
+    x, y = r.T
+    # The curves between the points come from the dense output of the steps
+    grid = np.linspace(t_0, t_f, 2001)
+    x_grid, y_grid = dense(grid).T
+    plt.plot(grid, x_grid, 'b', label='x')
+    plt.plot(grid, y_grid, 'g', label='y')
     plt.plot(t, x, 'bo')
     plt.plot(t, y, 'go')
     plt.xlabel('t')
@@ -0,0 +1,334 @@
+"""
+Iterative Bulirsch-Stoer driver for the Brusselator of Exercise 8.17.
+
+Bulirsch_Stoer_step() and calculate_row_n() in the script call each other
+recursively, one level per row of the Richardson table and two more whenever an
+interval is halved, and rebuild the table from Python lists at every level.
+BulirschStoer keeps the table in an array allocated once and replaces the
+recursion by an explicit stack of the intervals still to be integrated, so its
+memory stays bounded however tight delta or however long the integration.
+
+solve() has two modes:
+- adaptive=False halves an interval whenever 8 rows do not converge, exactly as
+  the recursion does, and gives the same points as solution() in the script.
+- adaptive=True carries the step size forward: it starts every step from the
+  last successful H, grows it when few rows were needed, shrinks it when the
+  last row was needed, and halves it and retries when the table does not
+  converge.
+
+The driver counts evaluations of the right-hand side, accepted steps and
+rejected steps, and the deepest the stack of intervals got.
+
+With dense=True, solve() also returns a DenseOutput that evaluates the solution
+at any times. The modified midpoint steps with an even number of substeps pass
+through the middle of the interval, and those values have an error expansion in
+even powers of the substep, so they are extrapolated like the endpoints. Every
+step then gets the quintic Hermite interpolant through its start, middle and
+end and the derivatives there. The derivative at the start is the first
+evaluation of the step anyway; only the derivatives at the middle and the end
+cost one evaluation each.
+
+brusselator() returns a right-hand side that evaluates a whole batch of
+Brusselators with their own a and b, with states of shape (2, M), so the
+driver integrates the batch at once with a common step that satisfies the
+accuracy of every instance. scan() uses it for the onset of the oscillations
+as b crosses the Hopf bifurcation.
+"""
+import importlib.util
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Largest number of rows of the Richardson table before a step is rejected
+MAX_ROWS = 8
+# Rows below which the adaptive step grows, and the factor it grows by
+FEW_ROWS = 7
+GROWTH = 1.5
+# Factor the adaptive step shrinks by when it only converged on the last row
+SHRINK = 0.8
+# Smallest adaptive step relative to the length of the integration
+MIN_STEP = 1e-12
+
+
+class BulirschStoer:
+    """
+    Bulirsch-Stoer integration of dr/dt = f(r) with a target accuracy of delta per unit time.
+    """
+
+    def __init__(self, f, delta, shape=2, max_rows=MAX_ROWS):
+        self.f = f
+        self.delta = delta
+        self.max_rows = max_rows
+        shape = np.atleast_1d(shape).tolist()
+        # table[n - 1, m - 1] holds the estimate R_n,m, middle[j] the middle of the step from row 2j + 2
+        self.table = np.empty([max_rows, max_rows] + shape)
+        self.middle = np.empty([max_rows // 2, max_rows // 2] + shape)
+        self.start_derivative = np.empty(shape)
+        self.evaluations = 0
+        self.steps = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    def modified_midpoint(self, r, H, n):
+        """
+        Performs the modified midpoint step over H with n substeps, as modified_midpoint_step() does.
+        For even n the state after n / 2 substeps goes to the row n / 2 - 1 of the middle table.
+        """
+        f = self.f
+        r = np.copy(r)
+        h = H / n
+        self.start_derivative[...] = f(r)
+        k = r + 0.5 * h * self.start_derivative
+        r += h * f(k)
+        if n == 2:
+            self.middle[0, 0] = r
+        for i in range(n - 1):
+            k += h * f(r)
+            r += h * f(k)
+            if 2 * (i + 2) == n:
+                self.middle[n // 2 - 1, 0] = r
+        self.evaluations += 2 * n + 1
+        return 0.5 * (r + k + 0.5 * h * f(r))
+
+    def step(self, r, H):
+        """
+        Extrapolates a step of length H from r, adding rows to the table until it converges.
+
+        Returns:
+        tuple: The state after the step and the number of rows used, or (None, max_rows) if it did not converge.
+        """
+        table = self.table
+        table[0, 0] = self.modified_midpoint(r, H, 1)
+        for n in range(2, self.max_rows + 1):
+            table[n - 1, 0] = self.modified_midpoint(r, H, n)
+            for m in range(2, n + 1):
+                table[n - 1, m - 1] = (table[n - 1, m - 2] + (table[n - 1, m - 2] - table[n - 2, m - 2])
+                                       / ((n / (n - 1)) ** (2 * (m - 1)) - 1))
+            error_vector = (table[n - 1, n - 2] - table[n - 2, n - 2]) / ((n / (n - 1)) ** (2 * (n - 1)) - 1)
+            if np.max(np.sqrt(np.sum(error_vector ** 2, axis=0))) < H * self.delta:
+                return table[n - 1, n - 1].copy(), n
+        return None, self.max_rows
+
+    def middle_state(self, rows):
+        """
+        Extrapolates the state in the middle of the last step from its rows with an even number of substeps.
+        """
+        middle = self.middle
+        count = rows // 2
+        for j in range(1, count):
+            for m in range(1, j + 1):
+                ratio = ((2 * j + 2) / (2 * j + 2 - 2 * m)) ** 2
+                middle[j, m] = middle[j, m - 1] + (middle[j, m - 1] - middle[j - 1, m - 1]) / (ratio - 1)
+        return middle[count - 1, count - 1].copy()
+
+    def solve(self, r, t_0, t_f, adaptive=False, H=None, dense=False):
+        """
+        Integrates from t_0 to t_f, starting with a step of H, the whole interval by default; without adaptive,
+        the interval is cut into steps of H, the last one shorter, and each of them is halved as needed.
+
+        Returns:
+        tuple: Arrays of the times and of the states at the end of every accepted step, starting with t_0,
+        and with dense, a DenseOutput of the solution over [t_0, t_f].
+        """
+        r = np.array(r, float)
+        times, states = [t_0], [r]
+        steps = [] if dense else None
+        if adaptive:
+            t, H = t_0, H or t_f - t_0
+            while t < t_f:
+                # Split what is left in two rather than leave a sliver whose error is below the rounding
+                last = H >= t_f - t
+                H = t_f - t if last else min(H, (t_f - t) / 2) if 2 * H > t_f - t else H
+                result, rows = self.step(r, H)
+                if result is None:
+                    self.rejected += 1
+                    H /= 2
+                    if H < MIN_STEP * (t_f - t_0):
+                        raise RuntimeError(f"The step size fell below {H:.3g} at t = {t}, delta is too small")
+                    continue
+                self.steps += 1
+                if dense:
+                    steps.append(self.interpolation_data(r, result, H, rows))
+                # The last step lands exactly on t_f, whatever the rounding of t + H
+                t, r = t_f if last else t + H, result
+                times.append(t)
+                states.append(r)
+                if rows < FEW_ROWS:
+                    H *= GROWTH
+                elif rows == self.max_rows:
+                    H *= SHRINK
+        else:
+            # Intervals still to be integrated, the next one on top: [t_0, t_f] in steps of H, the last one shorter
+            count = 1 if H is None else max(1, int(np.ceil((t_f - t_0) / H * (1 - 1e-12))))
+            starts = t_0 + (t_f - t_0 if H is None else H) * np.arange(count)
+            stack = [(start, end - start) for start, end in zip(starts, np.append(starts[1:], t_f))][::-1]
+            while stack:
+                self.max_depth = max(self.max_depth, len(stack))
+                t, H = stack.pop()
+                result, rows = self.step(r, H)
+                if result is None:
+                    self.rejected += 1
+                    stack.append((t + H / 2, H / 2))
+                    stack.append((t, H / 2))
+                    continue
+                self.steps += 1
+                if dense:
+                    steps.append(self.interpolation_data(r, result, H, rows))
+                r = result
+                times.append(t + H)
+                states.append(r)
+        times, states = np.array(times), np.array(states)
+        if dense:
+            return times, states, DenseOutput(times, steps)
+        return times, states
+
+    def interpolation_data(self, start, end, H, rows):
+        """
+        Collects the states and derivatives at the start, middle and end of an accepted step of length H.
+        """
+        middle = self.middle_state(rows)
+        self.evaluations += 2
+        return (start, H * self.start_derivative, middle, H * self.f(middle), end, H * self.f(end))
+
+
+class DenseOutput:
+    """
+    Piecewise quintic Hermite interpolant of a solution, through the start, middle and end of every step.
+    """
+    # Values and derivatives of 1, s, ..., s^5 at s = 0, 1/2 and 1, in the order interpolation_data() gives them
+    NODES = np.array([[s**i for i in range(6)] if d == 0 else [i * s**(i - 1) if i else 0 for i in range(6)]
+                      for s in (0, 0.5, 1) for d in (0, 1)], float)
+
+    def __init__(self, times, steps):
+        self.times = times
+        data = np.array(steps)  # (steps, 6, *shape), derivatives already scaled by the step
+        self.coefficients = np.tensordot(np.linalg.inv(self.NODES), data, axes=([1], [1])).swapaxes(0, 1)
+
+    def __call__(self, t):
+        """
+        Evaluates the solution at the times t, which must lie within the integration interval.
+
+        Returns:
+        array: The states, of shape (len(t), *shape).
+        """
+        t = np.atleast_1d(np.asarray(t, float))
+        step = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.coefficients) - 1)
+        s = (t - self.times[step]) / (self.times[step + 1] - self.times[step])
+        s = s.reshape(s.shape + (1,) * (self.coefficients.ndim - 2))
+        coefficients = self.coefficients[step]
+        value = coefficients[:, 5]
+        for i in range(4, -1, -1):
+            value = value * s + coefficients[:, i]
+        return value
+
+
+def brusselator(a, b, max_val):
+    """
+    Returns the right-hand side of Brusselators with parameters a and b, scalars or arrays of length M.
+
+    The states have shape (2,) or (2, M); both coordinates are clipped to max_val with a single call,
+    and the terms are computed as fx() and fy() in the script do.
+    """
+    def f(r):
+        x, y = np.clip(r, -max_val, max_val)
+        growth = a * x ** 2 * y
+        out = np.empty_like(r)
+        out[0] = 1 - (b + 1) * x + growth
+        out[1] = b * x - growth
+        return out
+    return f
+
+
+def load_script():
+    """
+    Imports Excercise 8.17.py as a module, once.
+
+    The module is registered in sys.modules under the name computational_physics.load() gives it,
+    so the helpers and the package share a single copy of the script.
+    """
+    if "excercise_8_17" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("excercise_8_17", os.path.join(HERE, "Excercise 8.17.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["excercise_8_17"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["excercise_8_17"]
+            raise
+    return sys.modules["excercise_8_17"]
+
+
+def compare(t_f=None, H=1.0):
+    """
+    Checks the halving mode against the recursive solver of the script and compares it with the adaptive mode.
+    Raises AssertionError if the halving mode does not give exactly the points of the recursion, or if, starting
+    from steps of H, it does not reach t_f with the final state of the recursion within delta per unit time.
+    """
+    script = load_script()
+    t_f = script.t_f if t_f is None else t_f
+    start = perf_counter()
+    t_ref, x_ref, y_ref = script.solution(script.t_0, t_f)
+    recursive = perf_counter() - start
+    print(f"Recursive: {len(t_ref) - 1} steps in {recursive:.2f} s")
+
+    r_0 = [script.x_0, script.y_0]
+    for adaptive in (False, True):
+        driver = BulirschStoer(script.f, script.delta)
+        start = perf_counter()
+        t, r = driver.solve(r_0, script.t_0, t_f, adaptive)
+        elapsed = perf_counter() - start
+        end = np.abs(r[-1] - [x_ref[-1], y_ref[-1]]).max()
+        print(f"{'Adaptive' if adaptive else 'Halving'}: {driver.steps} steps, {driver.rejected} rejected, "
+              f"{driver.evaluations} evaluations, stack depth {driver.max_depth} in {elapsed:.2f} s; "
+              f"final state differs by {end:.3g}")
+        if not adaptive:
+            same = len(t) == len(t_ref) and np.array_equal(t, t_ref) and np.array_equal(r, np.c_[x_ref, y_ref])
+            print(f"  {'identical to' if same else 'DIFFERENT from'} the recursive points")
+            assert same, "The halving mode differs from the recursive solver of the script"
+
+    # With an explicit H the halving mode starts from steps of H that cover the whole interval
+    driver = BulirschStoer(script.f, script.delta)
+    t, r = driver.solve(r_0, script.t_0, t_f, H=H)
+    end = np.abs(r[-1] - [x_ref[-1], y_ref[-1]]).max()
+    print(f"Halving from steps of {H}: {driver.steps} steps, {driver.rejected} rejected, ends at t = {t[-1]}; "
+          f"final state differs by {end:.3g}")
+    assert t[-1] == t_f, f"The halving mode from steps of {H} stops at t = {t[-1]} instead of {t_f}"
+    assert end <= script.delta * (t_f - script.t_0), f"The final state from steps of {H} is off by {end:.3g}"
+
+
+def scan(m=64, t_f=100.0, a=1.0, delta=1e-8):
+    """
+    Integrates m Brusselators with b from 1.5 to 3 as one batch, and reads the amplitude of x over the last
+    40% of the run from the dense output; the oscillations set in at the Hopf bifurcation b = 1 + a^2.
+    """
+    script = load_script()
+    b = np.linspace(1.5, 3, m)
+    r_0 = np.array([np.full(m, a + 0.1), b / a])  # next to the fixed point (a, b / a)
+    driver = BulirschStoer(brusselator(a, b, script.max_val), delta, shape=(2, m))
+    start = perf_counter()
+    t, r, dense = driver.solve(r_0, 0, t_f, adaptive=True, dense=True)
+    batch = perf_counter() - start
+    late = dense(np.linspace(0.6 * t_f, t_f, 2001))[:, 0]
+    amplitude = late.max(axis=0) - late.min(axis=0)
+
+    single = BulirschStoer(brusselator(a, b[-1], script.max_val), delta)
+    start = perf_counter()
+    single.solve(r_0[:, -1], 0, t_f, adaptive=True)
+    one = perf_counter() - start
+    print(f"{m} Brusselators in {batch:.2f} s ({driver.steps} common steps), one alone in {one:.2f} s "
+          f"({m * one / batch:.1f}x the throughput)")
+    print(f"Oscillations above an amplitude of 0.1 from b = {b[np.argmax(amplitude > 0.1)]:.3f}, "
+          f"Hopf bifurcation at b = {1 + a ** 2:.3f}")
+    return b, amplitude
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['scan']:
+        scan(*map(int, sys.argv[2:3]))
+    else:
+        compare(*map(float, sys.argv[1:]))
@@ -1,5 +1,5 @@
 from numpy import array, arange, pi, sin, cos, sqrt, linspace
-from matplotlib import pyplot as plt
+from adaptive_rk import flights
 
 # Constants
 g = 9.81  # gravitational acceleration (m/s^2)
@@ -77,6 +77,9 @@ def trajectory(m):
     return array(xpoints), array(ypoints)
 
 def main():
+    # Imported here, so that trajectory() can be used without loading matplotlib
+    from matplotlib import pyplot as plt
+
     #Secion B.
     # Plot the trajectory of the cannonball
     x_points, y_points = trajectory(m)
@@ -88,13 +91,9 @@ def main():
     plt.show()
 
     #Section C.
-    # Different masses
+    # Different masses, integrated together until each one hits the ground (see adaptive_rk.py)
     masses = linspace(0.5, 2, 10)  # From 0.5 to 2 kg
-    distances = []
-    
-    for mass in masses:
-        x, y = trajectory(mass)
-        distances.append(x[-1])
+    distances = flights(masses, theta_0, v_0, C, R, rho, g)['range']
     
     # Plot distance traveled as a function of mass of the cannonball
     plt.figure(figsize=(10, 6))
@@ -0,0 +1,172 @@
+"""
+Adaptive Runge-Kutta integration of the cannonball of Exercise 8.7, stopped at impact.
+
+trajectory() in the script takes 10,000 fixed steps up to t_f = 7 s whether the
+ball is still flying or has long since landed, and main() reads the range as
+the final x. flights() instead integrates with the embedded Dormand-Prince 5(4)
+pair: every step gives a fifth-order solution and a fourth-order one, their
+difference estimates the error, and the step grows or shrinks to keep that
+error within the tolerances. When y changes sign from positive to non-positive
+within an accepted step, the impact is located inside the step by bisection on
+the continuous extension of the method, which is accurate to the order of the
+method, and the trajectory stops there with its interpolated range and flight
+time.
+
+Like EnsembleRK4 (see ensemble_rk4.py), flights() integrates a batch of
+configurations at once as a (4, M) state, each configuration with its own step
+size; the configurations that have landed drop out of the batch.
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from ensemble_rk4 import EnsembleRK4, load_script
+
+
+# Dormand-Prince 5(4) tableau; the equations do not depend on time, so the nodes are not needed
+A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+# Weights of the fifth-order solution are the last row of A, the seventh stage is the derivative at its end
+ERROR = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+# Coefficients of the continuous extension (Hairer, Norsett and Wanner)
+DENSE = np.array([-12715105075/11282082432, 0, 87487479700/32700410799, -10690763975/1880347072,
+                  701980252875/199316789632, -1453857185/822651844, 69997945/29380423])
+
+# Limits on the factor by which a step may change
+MIN_FACTOR, MAX_FACTOR, SAFETY = 0.2, 5.0, 0.9
+# Number of bisections of the step containing the impact
+BISECTIONS = 60
+# Relative accuracy of the landing point of the fixed-step RK4, interpolated linearly between its steps
+REFERENCE_ERROR = 1e-8
+
+
+def derivatives(r, drag, g):
+    """
+    Derivatives [dx/dt, dvx/dt, dy/dt, dvy/dt] of states r of shape (4, M), as equations_of_motion() computes them.
+    """
+    vx, vy = r[1], r[3]
+    v = np.sqrt(vx**2 + vy**2)
+    return np.array([vx, -drag * vx * v, vy, -g - drag * vy * v])
+
+
+def flights(mass, angle, speed, drag, radius, density, g, rtol=1e-8, atol=1e-8, t_max=100.0):
+    """
+    Integrates every configuration until it hits the ground, with adaptive Dormand-Prince steps.
+
+    Arguments:
+    mass, angle, speed, drag (float or array): As for EnsembleRK4.
+    radius, density, g (float): Radius of the cannonball (m), air density (kg/m^3) and gravity (m/s^2).
+    rtol, atol (float): Relative and absolute tolerances on the error of every step.
+    t_max (float): Time after which configurations that have not landed are abandoned.
+
+    Returns:
+    dict:
+        'range' (array): x at impact, NaN for configurations still flying at t_max.
+        'time' (array): Time of flight.
+        'steps', 'rejected', 'evaluations' (array): Accepted and rejected steps and evaluations of the derivatives.
+    """
+    batch = EnsembleRK4(mass, angle, speed, drag, radius, density, g)
+    r, factor_drag = batch.initial.copy(), batch.drag
+    m = r.shape[1]
+    t = np.zeros(m)
+    h = np.full(m, 1e-2)
+    results = {'range': np.full(m, np.nan), 'time': np.full(m, np.nan),
+               'steps': np.zeros(m, int), 'rejected': np.zeros(m, int), 'evaluations': np.ones(m, int)}
+    first = derivatives(r, factor_drag, g)  # derivative at the start of the next step of every configuration
+
+    active = np.arange(m)
+    while len(active):
+        y0, step, drag_active = r[:, active], h[active], factor_drag[active]
+        k = [first[:, active]]
+        for row in A[1:]:
+            stage = y0 + step * sum(a * k_j for a, k_j in zip(row, k) if a)
+            k.append(derivatives(stage, drag_active, g))
+        y1 = stage  # the last stage is taken at the fifth-order solution, its derivative starts the next step
+        error = step * sum(e * k_j for e, k_j in zip(ERROR, k) if e)
+        scale = atol + rtol * np.maximum(np.abs(y0), np.abs(y1))
+        norm = np.sqrt(np.mean((error / scale)**2, axis=0))
+        accepted = norm <= 1
+        results['evaluations'][active] += 6
+        results['steps'][active[accepted]] += 1
+        results['rejected'][active[~accepted]] += 1
+
+        # Impacts within accepted steps, located on the continuous extension
+        landed = accepted & (y0[2] > 0) & (y1[2] <= 0)
+        if landed.any():
+            hl = step[landed]
+            difference = y1[:, landed] - y0[:, landed]
+            r3 = hl * k[0][:, landed] - difference
+            r4 = difference - hl * k[6][:, landed] - r3
+            r5 = hl * sum(d * k_j[:, landed] for d, k_j in zip(DENSE, k) if d)
+
+            def dense(theta):
+                return y0[:, landed] + theta * (difference + (1 - theta) * (r3 + theta * (r4 + (1 - theta) * r5)))
+            low, high = np.zeros(len(hl)), np.ones(len(hl))
+            for _ in range(BISECTIONS):
+                middle = 0.5 * (low + high)
+                above = dense(middle)[2] > 0
+                low = np.where(above, middle, low)
+                high = np.where(above, high, middle)
+            hits = active[landed]
+            results['range'][hits] = dense(high)[0]
+            results['time'][hits] = t[hits] + high * hl
+
+        moved = active[accepted]
+        r[:, moved] = y1[:, accepted]
+        first[:, moved] = k[6][:, accepted]
+        t[moved] += step[accepted]
+        with np.errstate(divide='ignore'):
+            factor = np.clip(SAFETY * norm**-0.2, MIN_FACTOR, MAX_FACTOR)
+        h[active] = step * factor
+        active = active[~landed & (t[active] < t_max)]
+    return results
+
+
+def compare(configurations=10**4):
+    """
+    Compares the range and flight time of the script's cannonball with the fixed-step RK4, and times a sweep.
+    Raises AssertionError if a range differs from the landing point of RK4 by more than the tolerance
+    (or REFERENCE_ERROR, whichever is larger), or if a configuration of the sweep never lands.
+    """
+    script = load_script()
+    fixed = EnsembleRK4(script.m, script.theta_0, script.v_0, script.C, script.R, script.rho, script.g)
+    start = perf_counter()
+    landing = fixed.run(script.t_0, script.t_f, script.N)
+    elapsed = perf_counter() - start
+    print(f"Fixed RK4: x(t_f) = {landing['final'][0]:.6f} m, landing at x = {landing['landing'][0]:.6f} m, "
+          f"{4 * script.N} evaluations in {elapsed * 1e3:.0f} ms")
+    for tolerance in (1e-6, 1e-8, 1e-10):
+        start = perf_counter()
+        result = flights(script.m, script.theta_0, script.v_0, script.C, script.R, script.rho, script.g,
+                         rtol=tolerance, atol=tolerance)
+        elapsed = perf_counter() - start
+        print(f"Adaptive, tolerance {tolerance:.0e}: range {result['range'][0]:.6f} m, "
+              f"flight time {result['time'][0]:.6f} s, {result['steps'][0]} steps, "
+              f"{result['rejected'][0]} rejected, {result['evaluations'][0]} evaluations in {elapsed * 1e3:.1f} ms")
+        difference = abs(result['range'][0] / landing['landing'][0] - 1)
+        assert difference <= max(tolerance, REFERENCE_ERROR), \
+            f"The range at tolerance {tolerance:.0e} differs from RK4 by {difference:.3g} relative"
+
+    rng = np.random.default_rng(0)
+    mass = rng.uniform(0.5, 2, configurations)
+    angle = rng.uniform(10, 80, configurations) * np.pi / 180
+    speed = rng.uniform(50, 150, configurations)
+    drag = rng.uniform(0.1, 1, configurations)
+    start = perf_counter()
+    result = flights(mass, angle, speed, drag, script.R, script.rho, script.g)
+    elapsed = perf_counter() - start
+    print(f"{configurations} configurations in {elapsed:.2f} s, flight times {result['time'].min():.2f} to "
+          f"{result['time'].max():.2f} s, {result['evaluations'].mean():.0f} evaluations each on average")
+    assert not np.isnan(result['range']).any(), "Some configurations did not land"
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:]))
@@ -1,6 +1,7 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from ftcs_kernel import FTCSKernel
+from wave_integrators import make_integrator
 
 # Constants
 h = 1e-6  # Time step
@@ -13,9 +14,10 @@ N = 500  # Number of grid points
 a = L / N  # Spacing between grid points
 
 # Initial velocity profile function
-def phi0(x):
+def phi0(x, d=d, sigma=sigma, C=C):
     """
     Calculate the initial velocity profile of the string.
+    The parameters default to the constants above and may be arrays that broadcast against x.
     """
     return C * x * (L - x) / L**2 * np.exp(- (x - d)**2 / (2 * sigma**2))
 
@@ -23,34 +25,53 @@ def phi0(x):
 fi = np.zeros(N+1, float)
 x = np.linspace(0, L, N+1)
 phi = phi0(x)
+# Fused kernel advancing fi and phi in place without temporaries
+kernel = FTCSKernel(N, h, v, a)
 
 # Function to iterate the FTCS method
-def iterate(fi, phi, dt=50e-3):
+def iterate(fi, phi, dt=50e-3, kernel=None):
     """
     Perform iterations using the FTCS method to update displacement and velocity.
+    With a kernel (see ftcs_kernel.py) the steps are advanced in place without temporary arrays,
+    and any integrator of wave_integrators.py can be used instead, with its own time step.
     """
+    if kernel is not None:
+        return kernel.advance(fi, phi, int(dt / kernel.h))
     iterations = int(dt / h)
     for i in range(iterations):
         fi[1:N] += h * phi[1:N]
         phi[1:N] += h * v**2 / a**2 * (fi[2:N+1] + fi[0:N-1] - 2 * fi[1:N])
     return fi, phi
 
-# Set up the plot
-fig, ax = plt.subplots()
-line, = ax.plot(x, fi * 2e3)
-ax.set_ylim(-0.5, 0.5)  # Set the y-axis limits
-
-# Animation update function
-def update(frame):
+def main(integrator='ftcs', step=h):
     """
-    Update the plot for each frame of the animation.
+    Animates the string, advanced by the named integrator ('ftcs', 'leapfrog' or 'crank-nicolson') with the given step.
     """
-    global fi, phi
-    fi, phi = iterate(fi, phi, dt=50e-3/100)
-    line.set_ydata(fi * 2e3)
-    return line,
+    # pyplot is only needed to animate, so importing the module for iterate() stays light
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    stepper = make_integrator(integrator, N, float(step), v, a)
+
+    # Set up the plot
+    fig, ax = plt.subplots()
+    line, = ax.plot(x, fi * 2e3)
+    ax.set_ylim(-0.5, 0.5)  # Set the y-axis limits
+
+    # Animation update function
+    def update(frame):
+        """
+        Update the plot for each frame of the animation.
+        """
+        global fi, phi
+        fi, phi = iterate(fi, phi, dt=50e-3/100, kernel=stepper)
+        line.set_ydata(fi * 2e3)
+        return line,
+
+    # Animation
+    ani = FuncAnimation(fig, update, frames=np.arange(0, 200), blit=True, interval=50)
 
-# Animation
-ani = FuncAnimation(fig, update, frames=np.arange(0, 200), blit=True, interval=50)
+    plt.show()
 
-plt.show()
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,119 @@
+"""
+Fused FTCS kernel for the wave equation of Exercise 9.5.
+
+Every step of iterate() in the script builds several temporary arrays for
+h * phi, the neighbour sums and 2 * fi, and recomputes h * v**2 / a**2.
+FTCSKernel computes that coefficient once, keeps two scratch buffers the size of
+the interior of the string and advances any number of steps per call with
+ufuncs writing into them, so no array is allocated inside the loop.
+The operations are the same as the loop's and happen in the same order, so the
+kernel reproduces the displacement and velocity of the loop bit for bit.
+
+Given an array of M wave speeds instead of a single one, the kernel advances M
+strings at once, stored as the columns of (n + 1, M) arrays (see wave_sweep.py).
+With the strings along the last axis the interior of all of them is a single
+contiguous block, so every ufunc makes one pass over memory.
+"""
+import importlib.util
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Largest difference check_kernel() accepts, relative to the largest displacement or velocity
+TOLERANCE = 1e-12
+
+
+class FTCSKernel:
+    """
+    Advances the displacement fi and velocity phi of a string of n + 1 points in place.
+    With an array of wave speeds v, advances one string per speed, each a column of fi and phi.
+    """
+
+    def __init__(self, n, h, v, a):
+        self.n = n
+        self.h = h
+        self.coefficient = h * np.asarray(v, float)**2 / a**2
+        shape = (n - 1,) + np.shape(v)
+        self.laplacian = np.empty(shape)
+        self.scratch = np.empty(shape)
+
+    def advance(self, fi, phi, steps):
+        """
+        Performs the given number of FTCS steps, updating fi and phi in place.
+
+        Arguments:
+        fi (array): Displacement of the n + 1 points, the ends are held fixed; (n + 1, M) for a batch.
+        phi (array): Velocity of the n + 1 points, of the same shape.
+        steps (int): Number of time steps of length h.
+
+        Returns:
+        tuple: fi and phi.
+        """
+        h, coefficient = self.h, self.coefficient
+        laplacian, scratch = self.laplacian, self.scratch
+        multiply, add, subtract = np.multiply, np.add, np.subtract
+        # Views of the interior and of its neighbours, created once for the whole call
+        fi_inner, fi_right, fi_left = fi[1:-1], fi[2:], fi[:-2]
+        phi_inner = phi[1:-1]
+        # The last argument of every ufunc is its output buffer
+        for _ in range(steps):
+            multiply(phi_inner, h, scratch)
+            add(fi_inner, scratch, fi_inner)
+            add(fi_right, fi_left, laplacian)
+            multiply(fi_inner, 2, scratch)
+            subtract(laplacian, scratch, laplacian)
+            multiply(laplacian, coefficient, laplacian)
+            add(phi_inner, laplacian, phi_inner)
+        return fi, phi
+
+
+def load_script():
+    """
+    Imports Excercise 9.5.py as a module, once.
+
+    The module is registered in sys.modules under the name computational_physics.load() gives it,
+    so the helpers and the package share a single copy of the script.
+    """
+    if "excercise_9_5" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("excercise_9_5", os.path.join(HERE, "Excercise 9.5.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["excercise_9_5"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["excercise_9_5"]
+            raise
+    return sys.modules["excercise_9_5"]
+
+
+def check_kernel(dt=50e-3):
+    """
+    Runs the loop of the script and the kernel over dt from the same initial state and compares them.
+    Raises AssertionError if they differ by more than round-off.
+
+    Returns:
+    float: The largest difference between the two in displacement or velocity.
+    """
+    script = load_script()
+    results = {}
+    for mode in ('loop', 'kernel'):
+        fi, phi = np.zeros(script.N + 1), script.phi0(script.x)
+        start = perf_counter()
+        script.iterate(fi, phi, dt, kernel=None if mode == 'loop' else script.kernel)
+        results[mode] = fi, phi, perf_counter() - start
+
+    (fi_loop, phi_loop, loop), (fi_kernel, phi_kernel, kernel) = results['loop'], results['kernel']
+    difference = max(np.abs(fi_kernel - fi_loop).max(), np.abs(phi_kernel - phi_loop).max())
+    scale = max(np.abs(fi_loop).max(), np.abs(phi_loop).max())
+    print(f"{int(dt / script.h)} steps: loop {loop:.2f} s, kernel {kernel:.2f} s ({loop / kernel:.1f}x), "
+          f"largest difference {difference:.3g}")
+    assert difference <= TOLERANCE * scale, f"The kernel differs from the loop by {difference:.3g}"
+    return difference
+
+
+if __name__ == "__main__":
+    check_kernel(*map(float, sys.argv[1:]))
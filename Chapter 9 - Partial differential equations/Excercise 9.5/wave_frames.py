@@ -0,0 +1,147 @@
+"""
+Headless recording and replay of the piano string of Exercise 9.5.
+
+The animation of the script advances the string inside update(), so the
+simulation runs at the pace of the display and nothing is kept. record() runs
+the simulation without any display and writes a snapshot of the displacement
+every `stride` time steps into a memory-mapped .npy file preallocated for the
+whole run, next to a small .json file with the grid, the time between
+snapshots and how many of them have been written so far. The .json file is
+written before the first snapshot and replaced atomically after every flush, so
+a run that is still going, or was killed, can always be replayed up to its last
+flush. Only one snapshot is held in memory at a time, so runs longer than
+the RAM can be recorded on compute nodes, and the file can be analysed
+afterwards with np.load(path, mmap_mode='r') without reading it all.
+
+replay() draws the recorded snapshots as an animation, or encodes them to a
+video file, without recomputing anything.
+"""
+import json
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from ftcs_kernel import load_script
+from wave_integrators import make_integrator
+
+
+# Number of snapshots between two flushes of the file to disk
+FLUSH_EVERY = 100
+
+
+def write_metadata(path, metadata):
+    """
+    Writes the metadata of a recording next to it, atomically, so a reader never sees a partial file.
+    """
+    with open(path + '.json.tmp', 'w') as file:
+        json.dump(metadata, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.json.tmp', path + '.json')
+
+
+def record(path, duration=0.1, stride=500, integrator='ftcs', step=None, dtype=np.float32):
+    """
+    Simulates the string of the script and streams its displacement to a memory-mapped file.
+
+    Arguments:
+    path (str): The .npy file to write, of shape (snapshots, N + 1); the metadata goes to path + '.json'.
+    duration (float): Simulated time in seconds.
+    stride (int): Number of time steps between two snapshots.
+    integrator (str): 'ftcs', 'leapfrog' or 'crank-nicolson', see wave_integrators.py.
+    step (float): Time step, the script's h by default.
+    dtype (type): Type the snapshots are stored as.
+
+    Returns:
+    int: The number of snapshots written.
+    """
+    script = load_script()
+    step = script.h if step is None else step
+    stepper = make_integrator(integrator, script.N, step, script.v, script.a)
+    fi, phi = np.zeros(script.N + 1), script.phi0(script.x)
+
+    snapshots = int(duration / step) // stride + 1
+    frames = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(snapshots, script.N + 1))
+    metadata = {'L': script.L, 'N': script.N, 'interval': stride * step, 'integrator': integrator,
+                'step': step, 'snapshots': snapshots, 'written': 0}
+    write_metadata(path, metadata)
+    frames[0] = fi
+    for i in range(1, snapshots):
+        stepper.advance(fi, phi, stride)
+        frames[i] = fi
+        if i % FLUSH_EVERY == 0:
+            frames.flush()
+            metadata['written'] = i + 1
+            write_metadata(path, metadata)
+    frames.flush()
+    metadata['written'] = snapshots
+    write_metadata(path, metadata)
+    return snapshots
+
+
+def replay(path, output=None, interval=50, scale=2e3):
+    """
+    Animates a recording, or encodes it to output (e.g. .gif, or .mp4 with ffmpeg) without a display.
+
+    Arguments:
+    path (str): The .npy file written by record().
+    output (str): Video file to write, if any.
+    interval (int): Time between frames of the animation in milliseconds.
+    scale (float): Factor applied to the displacement for display, as in the script.
+    """
+    from matplotlib.animation import FuncAnimation
+
+    with open(path + '.json') as file:
+        metadata = json.load(file)
+    if not metadata['written']:
+        raise ValueError(f"No snapshots of {path} have been written yet")
+    frames = np.load(path, mmap_mode='r')[:metadata['written']]
+    x = np.linspace(0, metadata['L'], metadata['N'] + 1)
+
+    if output:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+    line, = ax.plot(x, frames[0] * scale)
+    ax.set_ylim(-0.5, 0.5)
+    label = ax.set_title('')
+
+    def update(frame):
+        """
+        Draws one recorded snapshot.
+        """
+        line.set_ydata(frames[frame] * scale)
+        label.set_text(f"t = {frame * metadata['interval'] * 1e3:.1f} ms")
+        return line, label
+
+    ani = FuncAnimation(fig, update, frames=len(frames), blit=not output, interval=interval)
+    if output:
+        ani.save(output, fps=1000 / interval)
+    else:
+        plt.show()
+    return ani
+
+
+def main(command='record', path='string.npy', *args):
+    """
+    record path [duration] [stride] [integrator] [step], or replay path [output].
+    """
+    if command == 'record':
+        types = (float, int, str, float)
+        start = perf_counter()
+        snapshots = record(path, *(kind(arg) for kind, arg in zip(types, args)))
+        print(f"{snapshots} snapshots written to {path} in {perf_counter() - start:.1f} s")
+    elif command == 'replay':
+        replay(path, *args)
+    else:
+        raise ValueError(f"Unknown command {command!r}, expected 'record' or 'replay'")
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
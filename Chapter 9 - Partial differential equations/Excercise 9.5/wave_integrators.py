@@ -0,0 +1,204 @@
+"""
+Selectable time integrators for the piano string of Exercise 9.5.
+
+All integrators share the interface of FTCSKernel (see ftcs_kernel.py): they are
+built from the number of intervals n, the time step h, the wave speed v and the
+spacing a, and advance(fi, phi, steps) updates the displacement and velocity of
+the script in place, so iterate() can run any of them.
+
+- 'ftcs' is the scheme of the script, which updates fi first and then phi from
+  the new fi.
+- 'leapfrog' is the kick-drift-kick (velocity Verlet) scheme. It is second order
+  and stable as long as v * h / a <= 1 (the CFL condition), which it checks.
+- 'crank-nicolson' averages the right-hand sides at both ends of the step, which
+  leads to a tridiagonal system for the new displacement. The system is the same
+  at every step and is diagonal in the sine modes of the string, so the steps are
+  taken on the modes, a few array operations each. The scheme is stable for any
+  step and conserves the discrete energy up to round-off.
+
+energy_drift() grows the string over a long time with every integrator and
+reports how far the energy strays from its initial value, and how far the
+displacement strays from that of the script's scheme with its own tiny step.
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from ftcs_kernel import FTCSKernel, load_script
+
+
+class Leapfrog:
+    """
+    Advances the displacement fi and velocity phi of a string of n + 1 points with kick-drift-kick steps.
+    """
+
+    def __init__(self, n, h, v, a):
+        if v * h / a > 1:
+            raise ValueError(f"Time step {h} violates the CFL condition, it must not exceed a / v = {a / v}")
+        self.n = n
+        self.h = h
+        self.half_coefficient = h / 2 * v**2 / a**2
+        self.laplacian = np.empty(n - 1)
+        self.scratch = np.empty(n - 1)
+        self.product = np.empty(n - 1)
+
+    def kick(self, fi, phi, coefficient):
+        """
+        Adds coefficient times the discrete Laplacian of fi to the velocity of the interior points.
+        """
+        laplacian, scratch = self.laplacian, self.scratch
+        np.add(fi[2:], fi[:-2], laplacian)
+        np.multiply(fi[1:-1], 2, scratch)
+        np.subtract(laplacian, scratch, laplacian)
+        np.multiply(laplacian, coefficient, laplacian)
+        np.add(phi[1:-1], laplacian, phi[1:-1])
+
+    def advance(self, fi, phi, steps):
+        """
+        Performs the given number of leapfrog steps, updating fi and phi in place.
+        The closing half kick of a step and the opening one of the next are merged into a full kick.
+        """
+        if steps == 0:
+            return fi, phi
+        h, half = self.h, self.half_coefficient
+        fi_inner, phi_inner, scratch = fi[1:-1], phi[1:-1], self.scratch
+        self.kick(fi, phi, half)
+        for step in range(steps):
+            np.multiply(phi_inner, h, scratch)
+            np.add(fi_inner, scratch, fi_inner)
+            self.kick(fi, phi, half if step == steps - 1 else 2 * half)
+        return fi, phi
+
+
+def sine_transform(x):
+    """
+    The discrete sine transform S x, with S[j, k] = sin(pi j k / n), of the n - 1 interior points x, along the first axis.
+    S is symmetric and S S = n / 2, so the same transform inverts itself up to that factor.
+    """
+    m = len(x)
+    # The odd extension [0, x, 0, -x reversed], whose Fourier transform is -2i S x
+    extended = np.zeros((2 * m + 2,) + x.shape[1:])
+    extended[1:m + 1] = x
+    extended[m + 2:] = -x[::-1]
+    return -0.5 * np.fft.rfft(extended, axis=0)[1:m + 1].imag
+
+
+class CrankNicolson:
+    """
+    Advances the displacement fi and velocity phi of a string of n + 1 points with Crank-Nicolson steps.
+
+    With r = (v * h / 2a)^2 and D the second difference, every step solves
+    (1 - r D) fi' = fi + h phi + r D fi, then sets phi' = phi + (h v^2 / 2a^2)(D fi + D fi').
+
+    The matrix 1 - r D is the same at every step, and the sine modes of the string are
+    its eigenvectors: D multiplies the k-th mode by -4 sin^2(pi k / 2n). advance()
+    therefore transforms fi and phi to modes once, takes every step as a 2x2 update of
+    each mode, which is the exact solution of the system, and transforms back.
+    """
+
+    def __init__(self, n, h, v, a):
+        self.n = n
+        self.h = h
+        r = (v * h / (2 * a))**2
+        self.r = r
+        half = h / 2 * v**2 / a**2
+        self.eigenvalues = -4 * np.sin(np.pi * np.arange(1, n) / (2 * n))**2
+        implicit = 1 - r * self.eigenvalues
+        # fi' = fi_fi fi + fi_phi phi and phi' = phi_fi fi + phi_phi phi, mode by mode
+        self.fi_fi = (1 + r * self.eigenvalues) / implicit
+        self.fi_phi = h / implicit
+        self.phi_fi = half * self.eigenvalues * (1 + self.fi_fi)
+        self.phi_phi = 1 + half * self.eigenvalues * self.fi_phi
+        self.implicit = implicit
+        self.scratch = np.empty(n - 1)
+        self.product = np.empty(n - 1)
+
+    def solve(self, rhs):
+        """
+        Solves (1 - r D) x = rhs for the interior points, an array of length n - 1.
+        """
+        return sine_transform(sine_transform(np.asarray(rhs, float)) / self.implicit) * (2 / self.n)
+
+    def advance(self, fi, phi, steps):
+        """
+        Performs the given number of Crank-Nicolson steps, updating fi and phi in place.
+        Fixed ends that are not zero hold up the straight line between them, which is added back at the end.
+        """
+        if steps == 0:
+            return fi, phi
+        n = self.n
+        line = fi[0] + (fi[-1] - fi[0]) * np.arange(1, n) / n
+        modes_fi = sine_transform(fi[1:-1] - line)
+        modes_phi = sine_transform(phi[1:-1])
+        fi_fi, fi_phi, phi_fi, phi_phi = self.fi_fi, self.fi_phi, self.phi_fi, self.phi_phi
+        scratch, product = self.scratch, self.product
+        multiply = np.multiply
+        # The last argument of every multiply is its output buffer, so no array is allocated inside the loop
+        for _ in range(steps):
+            # scratch holds the new modes of fi until the velocity has been updated from the old ones
+            multiply(fi_fi, modes_fi, scratch)
+            scratch += multiply(fi_phi, modes_phi, product)
+            modes_phi *= phi_phi
+            modes_phi += multiply(phi_fi, modes_fi, modes_fi)
+            modes_fi, scratch = scratch, modes_fi
+        self.scratch = scratch
+        fi[1:-1] = sine_transform(modes_fi) * (2 / n) + line
+        phi[1:-1] = sine_transform(modes_phi) * (2 / n)
+        return fi, phi
+
+
+INTEGRATORS = {'ftcs': FTCSKernel, 'leapfrog': Leapfrog, 'crank-nicolson': CrankNicolson}
+
+
+def make_integrator(name, n, h, v, a):
+    """
+    Creates the integrator with the given name for a string of n intervals of length a and time step h.
+    """
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator {name!r}, expected one of {', '.join(INTEGRATORS)}")
+    return INTEGRATORS[name](n, h, v, a)
+
+
+def energy(fi, phi, v, a):
+    """
+    Discrete energy per unit linear density: kinetic plus elastic energy of the string.
+    """
+    return a * (0.5 * np.sum(phi**2) + 0.5 * v**2 * np.sum(np.diff(fi)**2) / a**2)
+
+
+def energy_drift(duration=0.5, samples=100):
+    """
+    Grows the string of the script for duration seconds with every integrator and step in turn.
+
+    Prints the number of steps, the time taken, the largest relative deviation of the energy
+    from its initial value over the samples taken along the run, and the largest difference of
+    the displacement from that of the first run at the same samples, relative to the largest
+    displacement of that run.
+    """
+    script = load_script()
+    n, v, a = script.N, script.v, script.a
+    runs = [('ftcs', script.h), ('leapfrog', script.h), ('leapfrog', 1e-5), ('leapfrog', 2e-5),
+            ('crank-nicolson', 1e-5), ('crank-nicolson', 1e-4), ('crank-nicolson', 1e-3)]
+    print(f"{'integrator':>15} {'step (s)':>9} {'steps':>8} {'time (s)':>9} {'energy drift':>13} {'error':>9}")
+    reference = []
+    for name, h in runs:
+        integrator = make_integrator(name, n, h, v, a)
+        fi, phi = np.zeros(n + 1), script.phi0(script.x)
+        initial = energy(fi, phi, v, a)
+        steps = int(round(duration / h / samples))
+        drift = 0.0
+        snapshots = []
+        start = perf_counter()
+        for _ in range(samples):
+            integrator.advance(fi, phi, steps)
+            drift = max(drift, abs(energy(fi, phi, v, a) / initial - 1))
+            snapshots.append(fi.copy())
+        elapsed = perf_counter() - start
+        reference = reference or snapshots
+        error = np.abs(np.subtract(snapshots, reference)).max() / np.abs(reference).max()
+        print(f"{name:>15} {h:>9.2g} {steps * samples:>8} {elapsed:>9.2f} {drift:>13.2e} {error:>9.2e}")
+
+
+if __name__ == "__main__":
+    energy_drift(*map(float, sys.argv[1:2]), *map(int, sys.argv[2:3]))
@@ -0,0 +1,119 @@
+"""
+Batched parameter sweeps of the piano string of Exercise 9.5.
+
+The script holds the strike position d, the width sigma, the amplitude C and the
+wave speed v as module constants, so every other choice of them used to need a
+fresh process. Here M parameter sets are stacked into 2-D arrays of
+displacement and velocity, one string per parameter set, and the batched
+FTCSKernel (see ftcs_kernel.py) advances all of them together with a single
+stencil update per time step. The state is stored as (N+1, M), with the strings
+along the last axis, so the interior of all strings is one contiguous block;
+the (M, N+1) layout runs twice as slow because every ufunc then walks M
+separate rows. The observables are sampled at fixed intervals and returned as a
+single array with the parameter sets along its first axis. Large sweeps are
+advanced in chunks of CHUNK strings, whose state still fits in the CPU caches.
+"""
+import itertools
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from ftcs_kernel import FTCSKernel, TOLERANCE, load_script
+
+
+OBSERVABLES = ('displacement', 'velocity')
+# Number of strings advanced together
+CHUNK = 64
+
+
+def parameter_grid(**values):
+    """
+    Forms every combination of the given values of the parameters.
+
+    Arguments:
+    **values: Sequence of values for each parameter, e.g. d=(0.1, 0.2), v=(50.0, 100.0).
+
+    Returns:
+    dict: An array of length M, the number of combinations, for each parameter.
+    """
+    names = list(values)
+    rows = list(itertools.product(*values.values()))
+    return {name: np.array([row[i] for row in rows], float) for i, name in enumerate(names)}
+
+
+def sweep(parameters, duration=50e-3, every=100, probes=(0.05,), observable='displacement', chunk=CHUNK):
+    """
+    Advances a string for every parameter set together, sampling an observable along the way.
+
+    Arguments:
+    parameters (dict): Arrays of length M of any of 'd', 'sigma', 'C' and 'v'; the others keep
+        the values of the script.
+    duration (float): Simulated time in seconds, in steps of the script's h.
+    every (int): Number of time steps between two samples.
+    probes (sequence): Positions along the string, in meters, at which the observable is sampled.
+    observable (str): 'displacement' or 'velocity'.
+    chunk (int): Number of strings advanced together.
+
+    Returns:
+    array: The observable of shape (M, samples, len(probes)), sampled after every `every` steps.
+    """
+    if observable not in OBSERVABLES:
+        raise ValueError(f"Unknown observable {observable!r}, expected one of {', '.join(OBSERVABLES)}")
+    script = load_script()
+    unknown = set(parameters) - {'d', 'sigma', 'C', 'v'}
+    if unknown:
+        raise ValueError(f"Unknown parameters {', '.join(sorted(unknown))}")
+    m = len(next(iter(parameters.values())))
+    column = {name: np.broadcast_to(np.asarray(parameters.get(name, getattr(script, name)), float), (m,))
+              for name in ('d', 'sigma', 'C', 'v')}
+    v = column['v']
+    if v.max() * script.h / script.a > 1:
+        raise ValueError(f"Wave speed {v.max()} violates the CFL condition for the step {script.h}")
+
+    sites = np.rint(np.asarray(probes) / script.a).astype(int)
+    samples = int(duration / script.h) // every
+    output = np.empty((m, samples, len(sites)))
+    for first in range(0, m, chunk):
+        rows = slice(first, first + chunk)
+        kernel = FTCSKernel(script.N, script.h, v[rows], script.a)
+        fi = np.zeros((script.N + 1, len(v[rows])))
+        phi = script.phi0(script.x[:, None], column['d'][rows], column['sigma'][rows], column['C'][rows])
+        state = fi if observable == 'displacement' else phi
+        for i in range(samples):
+            kernel.advance(fi, phi, every)
+            output[rows, i] = state[sites].T
+    return output
+
+
+def compare_throughput(m=64, duration=5e-3):
+    """
+    Times a sweep of m strike positions and wave speeds against the same configurations run one after another.
+    Raises AssertionError if the two give probes that differ by more than round-off.
+    """
+    script = load_script()
+    parameters = parameter_grid(d=np.linspace(0.05, 0.5, m // 8), v=np.linspace(50, 120, 8))
+    start = perf_counter()
+    batched = sweep(parameters, duration)
+    batch = perf_counter() - start
+
+    start = perf_counter()
+    serial = []
+    for d, v in zip(parameters['d'], parameters['v']):
+        kernel = FTCSKernel(script.N, script.h, v, script.a)
+        fi, phi = np.zeros(script.N + 1), script.phi0(script.x, d)
+        probe = []
+        for _ in range(int(duration / script.h) // 100):
+            kernel.advance(fi, phi, 100)
+            probe.append(fi[round(0.05 / script.a)])
+        serial.append(probe)
+    one_by_one = perf_counter() - start
+    serial = np.array(serial)
+    difference = np.abs(batched[:, :, 0] - serial).max()
+    print(f"{m} configurations: one by one {one_by_one:.2f} s, batched {batch:.2f} s "
+          f"({one_by_one / batch:.1f}x), largest difference {difference:.3g}")
+    assert difference <= TOLERANCE * np.abs(serial).max(), f"The sweep differs from the serial runs by {difference:.3g}"
+
+
+if __name__ == "__main__":
+    compare_throughput(*map(int, sys.argv[1:2]))
@@ -0,0 +1,129 @@
+"""
+Plotting-free access to the numerical kernels of the exercises.
+
+The exercises live in directories named after the chapters of the book, with
+spaces in their names, so they cannot be imported as packages. This package
+maps the name of every kernel to the module that defines it and loads that
+module on first access, so a worker process pays only for the exercises it
+uses:
+
+    import computational_physics as cp
+    x, y = cp.trajectory(1.0)
+    kernel = cp.FTCSKernel(500, 1e-6, 100.0, 1 / 500)
+
+None of the modules behind the kernels imports matplotlib; the scripts import
+pyplot inside main() and the helper modules inside the functions that draw, so
+plotting stays with the front-ends that ask for it. check_imports.py checks this
+in a fresh interpreter.
+
+load() returns a whole module, for the scripts whose functions share module
+state, like the DLA walkers of Exercise 10.13:
+
+    walk = cp.load('10.13', 'Excercise 10.13B')
+    walk.random_walk_on_circle()
+"""
+import importlib
+import importlib.util
+import os
+import re
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The directory of every exercise, relative to the root of the repository
+EXERCISES = {
+    '5.2': os.path.join("Chapter 5 - Integrals and derivatives", "Excercise 5.2"),
+    '6.1': os.path.join("Chapter 6 - Solution of linear and nonlinear equations", "Excercise 6.1"),
+    '6.17': os.path.join("Chapter 6 - Solution of linear and nonlinear equations", "Excercise 6.17"),
+    '8.7': os.path.join("Chapter 8 - Ordinary differential equations", "Excercise 8.7"),
+    '8.17': os.path.join("Chapter 8 - Ordinary differential equations", "Excercise 8.17"),
+    '9.5': os.path.join("Chapter 9 - Partial differential equations", "Excercise 9.5"),
+    '10.13': os.path.join("Chapter 10 - Random processes and Monte Carlo methods", "Excercise 10.13"),
+}
+
+# The exercise and the module of every kernel
+KERNELS = {
+    'simpsons_rule': ('5.2', 'Excercise 5.2'),
+    'simpson': ('5.2', 'quadrature'),
+    'romberg': ('5.2', 'quadrature'),
+    'adaptive_simpson': ('5.2', 'quadrature'),
+    'batch_simpson': ('5.2', 'batch_quadrature'),
+    'batch_romberg': ('5.2', 'batch_quadrature'),
+    'gaussian_elimination': ('6.1', 'Excercise 6.1'),
+    'LUFactorization': ('6.1', 'lu_factorization'),
+    'FactorizationCache': ('6.1', 'lu_factorization'),
+    'CSRMatrix': ('6.1', 'sparse_network'),
+    'Network': ('6.1', 'sparse_network'),
+    'BandedSolver': ('6.1', 'sparse_network'),
+    'conjugate_gradient': ('6.1', 'sparse_network'),
+    'solve_sparse': ('6.1', 'sparse_network'),
+    'solve_batch': ('6.17', 'batch_newton'),
+    'DiodeNetwork': ('6.17', 'nodal_solver'),
+    'NodalSolver': ('6.17', 'nodal_solver'),
+    'trajectory': ('8.7', 'Excercise 8.7'),
+    'EnsembleRK4': ('8.7', 'ensemble_rk4'),
+    'flights': ('8.7', 'adaptive_rk'),
+    'Bulirsch_Stoer_step': ('8.17', 'Excercise 8.17'),
+    'solution': ('8.17', 'Excercise 8.17'),
+    'BulirschStoer': ('8.17', 'bulirsch_stoer'),
+    'brusselator': ('8.17', 'bulirsch_stoer'),
+    'iterate': ('9.5', 'Excercise 9.5'),
+    'FTCSKernel': ('9.5', 'ftcs_kernel'),
+    'make_integrator': ('9.5', 'wave_integrators'),
+    'sweep': ('9.5', 'wave_sweep'),
+    'record': ('9.5', 'wave_frames'),
+    'BatchDLA': ('10.13', 'dla_batch'),
+    'JumpDLA': ('10.13', 'dla_jump'),
+    'ClusterAnalytics': ('10.13', 'dla_analytics'),
+    'make_lattice': ('10.13', 'dla_lattice'),
+}
+
+__all__ = ['load', 'EXERCISES', 'KERNELS'] + list(KERNELS)
+
+
+def module_name(module):
+    """
+    The name a script is registered under, e.g. excercise_10_13b for Excercise 10.13B.
+    """
+    return re.sub(r'\W+', '_', module).lower()
+
+
+def load(exercise, module):
+    """
+    Imports a module of an exercise, a script like 'Excercise 8.7' or a helper like 'ensemble_rk4'.
+
+    The directory of the exercise goes on sys.path, as it does when its scripts are run, so the helpers
+    import each other by name; the scripts are registered in sys.modules under module_name().
+    """
+    directory = os.path.join(ROOT, EXERCISES[exercise])
+    if directory not in sys.path:
+        sys.path.append(directory)
+    if not module.startswith('Excercise'):
+        return importlib.import_module(module)
+    name = module_name(module)
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, module + '.py'))
+        script = importlib.util.module_from_spec(spec)
+        sys.modules[name] = script
+        try:
+            spec.loader.exec_module(script)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return sys.modules[name]
+
+
+def __getattr__(name):
+    """
+    Loads the module of a kernel on first access.
+    """
+    if name not in KERNELS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(load(*KERNELS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(KERNELS))
@@ -0,0 +1,373 @@
+"""
+Benchmarks of the numerical kernels of the exercises, with results tracked by commit.
+
+Every benchmark runs one kernel at a few problem sizes, from a fixed seed, and
+reports its throughput in the units of the problem: function evaluations of
+Simpson's rule, solves of Gaussian elimination and Newton's method, steps of
+RK4 and Bulirsch-Stoer, site-updates of FTCS and walker-steps of DLA. The
+functions of the scripts, trajectory(), iterate(), random_walk_on_circle() and
+so on, are timed next to the faster helpers that replace them, under the same
+name with a suffix, like rk4 and rk4.ensemble.
+
+Each case is run once untimed, to load its modules and warm the caches, and
+then `repeats` times. The throughput of every run is stored in a JSON file,
+under the commit that was checked out (with +dirty if tracked files were
+modified), so a later run can be compared with it. The file,
+benchmark_results.json at the root of the repository by default, holds timings
+of one machine and is listed in .gitignore, so it survives checkouts of other
+commits but is never committed; --results points to another file:
+
+    python -m computational_physics.benchmarks                  # run everything, compare with the last commit
+    python -m computational_physics.benchmarks -k dla -r 9      # only the DLA benchmarks, 9 repeats
+    python -m computational_physics.benchmarks --baseline 1f063b4 --compare-only
+
+A change counts only if the ratio of the medians is beyond both the relative
+threshold and `SIGMAS` standard errors of the two medians, estimated from the
+spread (MAD) of the repeats; everything else is reported as noise. The exit
+status is 1 if any case got slower.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter
+
+# Nothing below should plot, but a stray import of pyplot must not open a window either
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+
+from computational_physics import ROOT, load
+
+
+# File the results are stored in
+RESULTS = os.path.join(ROOT, 'benchmark_results.json')
+# Timed runs of every case
+REPEATS = 5
+# Relative change of the median throughput below which a difference is ignored
+THRESHOLD = 0.05
+# Standard errors of the difference of the medians a change must exceed
+SIGMAS = 3.0
+# Seed of the random inputs of every run
+SEED = 0
+
+
+@contextmanager
+def patched(module, **values):
+    """
+    Sets module-level constants of a script, the way benchmark_dla.py does, and restores them afterwards.
+    """
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield module
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def timed(function, *args, **kwargs):
+    """
+    Returns the result of a call and its duration in seconds.
+    """
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+# Every benchmark takes the size of the problem and a seed, and returns the work done and the seconds it took
+
+def simpson_script(n, seed):
+    script = load('5.2', 'Excercise 5.2')
+    _, elapsed = timed(script.simpsons_rule, 0, 2, n)
+    return n + 1, elapsed
+
+
+def simpson_vectorized(n, seed):
+    script = load('5.2', 'Excercise 5.2')
+    quadrature = load('5.2', 'quadrature')
+    _, elapsed = timed(quadrature.simpson, script.f, 0, 2, n)
+    return n + 1, elapsed
+
+
+def random_system(n, seed):
+    """
+    A diagonally dominant system of n equations, which elimination without pivoting solves stably.
+    """
+    rng = np.random.default_rng(seed)
+    A = rng.random((n, n))
+    A[np.diag_indices(n)] += n
+    return A, rng.random(n)
+
+
+def elimination_script(n, seed):
+    script = load('6.1', 'Excercise 6.1')
+    A, v = random_system(n, seed)
+    _, elapsed = timed(script.gaussian_elimination, A, v)
+    return 1, elapsed
+
+
+def elimination_lu(n, seed):
+    lu = load('6.1', 'lu_factorization')
+    A, v = random_system(n, seed)
+    _, elapsed = timed(lambda: lu.LUFactorization(A).solve(v))
+    return 1, elapsed
+
+
+def newton_circuits(m, seed):
+    """
+    Supply voltages and saturation currents of m circuits around those of the script.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.uniform(4, 6, m), 3e-9 * 10**rng.uniform(-1, 1, m)
+
+
+def newton_script(m, seed):
+    newton = load('6.17', 'batch_newton')
+    script = load('6.17', 'Excercise 6.17')
+    V_p, I0 = newton_circuits(m, seed)
+    _, elapsed = timed(lambda: [newton.solve_serial(script, *circuit) for circuit in zip(V_p, I0)])
+    return m, elapsed
+
+
+def newton_batch(m, seed):
+    newton = load('6.17', 'batch_newton')
+    V_p, I0 = newton_circuits(m, seed)
+    _, elapsed = timed(newton.solve_batch, V_p=V_p, I0=I0, max_step=0.5)
+    return m, elapsed
+
+
+def rk4_script(n, seed):
+    script = load('8.7', 'Excercise 8.7')
+    with patched(script, h=(script.t_f - script.t_0) / n):
+        x, elapsed = timed(script.trajectory, script.m)
+    return len(x[0]), elapsed
+
+
+# Time steps of every trajectory of the ensemble benchmark
+ENSEMBLE_STEPS = 1000
+
+
+def rk4_ensemble(m, seed):
+    ensemble_rk4 = load('8.7', 'ensemble_rk4')
+    script = load('8.7', 'Excercise 8.7')
+    masses = np.random.default_rng(seed).uniform(0.5, 2, m)
+    ensemble = ensemble_rk4.ensemble(script, mass=masses)
+    _, elapsed = timed(ensemble.run, script.t_0, script.t_f, ENSEMBLE_STEPS)
+    return m * ENSEMBLE_STEPS, elapsed
+
+
+def bulirsch_stoer_script(t_f, seed):
+    script = load('8.17', 'Excercise 8.17')
+    (t, _, _), elapsed = timed(script.solution, script.t_0, t_f)
+    return len(t) - 1, elapsed
+
+
+def bulirsch_stoer_iterative(t_f, seed):
+    script = load('8.17', 'Excercise 8.17')
+    driver = load('8.17', 'bulirsch_stoer').BulirschStoer(script.f, script.delta)
+    (t, _), elapsed = timed(driver.solve, [script.x_0, script.y_0], script.t_0, t_f)
+    return len(t) - 1, elapsed
+
+
+# Time steps of the FTCS benchmarks
+FTCS_STEPS = 2000
+
+
+def string(script, n):
+    """
+    The initial displacement and velocity of the string of the script on n + 1 points.
+    """
+    return np.zeros(n + 1), script.phi0(np.linspace(0, script.L, n + 1))
+
+
+def ftcs_script(n, seed):
+    script = load('9.5', 'Excercise 9.5')
+    fi, phi = string(script, n)
+    with patched(script, N=n, a=script.L / n):
+        _, elapsed = timed(script.iterate, fi, phi, dt=FTCS_STEPS * script.h)
+    return (n - 1) * FTCS_STEPS, elapsed
+
+
+def ftcs_kernel(n, seed):
+    script = load('9.5', 'Excercise 9.5')
+    kernel = load('9.5', 'ftcs_kernel').FTCSKernel(n, script.h, script.v, script.L / n)
+    fi, phi = string(script, n)
+    _, elapsed = timed(kernel.advance, fi, phi, FTCS_STEPS)
+    return (n - 1) * FTCS_STEPS, elapsed
+
+
+def dla_script(grid_size, seed):
+    script = load('10.13', 'Excercise 10.13B')
+    steps, elapsed, _ = load('10.13', 'benchmark_dla').run_serial(script, 'B', grid_size, seed)
+    return steps, elapsed
+
+
+def dla_batch(grid_size, seed):
+    steps, elapsed, _ = load('10.13', 'benchmark_dla').run_batch('B', grid_size, seed)
+    return steps, elapsed
+
+
+# The function, problem sizes, name of the size and unit of throughput of every benchmark
+BENCHMARKS = {
+    'simpson': (simpson_script, (10**3, 10**4, 10**5), 'n', 'evaluations/s'),
+    'simpson.vectorized': (simpson_vectorized, (10**4, 10**5, 10**6), 'n', 'evaluations/s'),
+    'gaussian_elimination': (elimination_script, (50, 200, 500), 'N', 'solves/s'),
+    'gaussian_elimination.lu': (elimination_lu, (50, 200, 500), 'N', 'solves/s'),
+    'newton': (newton_script, (100, 1000), 'circuits', 'solves/s'),
+    'newton.batch': (newton_batch, (10**3, 10**4, 10**5), 'circuits', 'solves/s'),
+    'rk4': (rk4_script, (10**3, 10**4), 'steps', 'steps/s'),
+    'rk4.ensemble': (rk4_ensemble, (10, 1000), 'trajectories', 'trajectory-steps/s'),
+    'bulirsch_stoer': (bulirsch_stoer_script, (5.0, 20.0), 't_f', 'steps/s'),
+    'bulirsch_stoer.iterative': (bulirsch_stoer_iterative, (5.0, 20.0), 't_f', 'steps/s'),
+    'ftcs': (ftcs_script, (100, 500, 2000), 'N', 'site-updates/s'),
+    'ftcs.kernel': (ftcs_kernel, (100, 500, 2000), 'N', 'site-updates/s'),
+    'dla': (dla_script, (31, 61), 'grid', 'walker-steps/s'),
+    'dla.batch': (dla_batch, (61, 121), 'grid', 'walker-steps/s'),
+}
+
+
+def case_name(name, size_name, size):
+    return f"{name}[{size_name}={size}]"
+
+
+def summarize(samples):
+    """
+    The median of the throughputs of the repeats and its standard error relative to the median.
+
+    The spread is the MAD scaled to a standard deviation, so a single run disturbed by
+    the rest of the machine does not inflate it, and the standard error of a median is
+    about 1.25 times that of a mean.
+    """
+    samples = np.asarray(samples, float)
+    median = np.median(samples)
+    spread = 1.4826 * np.median(np.abs(samples - median))
+    return {'median': median, 'error': 1.2533 * spread / np.sqrt(len(samples)) / median}
+
+
+def run(pattern=None, repeats=REPEATS, seed=SEED):
+    """
+    Runs the benchmarks whose name contains pattern, all of them by default.
+
+    Returns:
+    dict: For every case, its unit, the throughput of every repeat, their median and the relative error of the median.
+    """
+    results = {}
+    for name, (function, sizes, size_name, unit) in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        for size in sizes:
+            function(size, seed)
+            samples = []
+            for _ in range(repeats):
+                work, elapsed = function(size, seed)
+                samples.append(work / elapsed)
+            case = case_name(name, size_name, size)
+            results[case] = dict(unit=unit, samples=samples, **summarize(samples))
+            print(f"{case:<42} {results[case]['median']:12.4g} {unit:<20} +- {100 * results[case]['error']:4.1f}%")
+    return results
+
+
+def git(*args):
+    return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def current_commit():
+    """
+    The short hash of HEAD, with +dirty if tracked files were modified, or 'unknown' outside a git checkout.
+    """
+    try:
+        commit = git('rev-parse', '--short', 'HEAD')
+        return commit + ('+dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def read_results(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def record(results, path=RESULTS, commit=None):
+    """
+    Stores the results under the commit, merged with those of earlier runs of the same commit.
+    """
+    history = read_results(path)
+    commit = commit or current_commit()
+    entry = history.setdefault(commit, {'results': {}})
+    entry.update(date=datetime.now(timezone.utc).isoformat(timespec='seconds'), python=platform.python_version(),
+                 numpy=np.__version__, machine=f"{platform.system()} {platform.machine()} {platform.processor()}".strip())
+    entry['results'].update(results)
+    with open(path, 'w') as file:
+        json.dump(history, file, indent=1)
+    return commit
+
+
+def latest_other(history, commit):
+    """
+    The most recently recorded commit other than the given one, or None.
+    """
+    others = [key for key in history if key != commit]
+    return max(others, key=lambda key: history[key]['date']) if others else None
+
+
+def compare(results, baseline, threshold=THRESHOLD, sigmas=SIGMAS):
+    """
+    Compares results with those of a baseline, case by case.
+
+    Returns:
+    dict: The ratio of the medians of every case both have, and whether it is 'faster', 'slower' or 'noise'.
+    """
+    verdicts = {}
+    for case in results.keys() & baseline.keys():
+        new, old = results[case], baseline[case]
+        ratio = new['median'] / old['median']
+        noise = max(threshold, sigmas * np.hypot(new['error'], old['error']))
+        verdict = 'noise' if abs(np.log(ratio)) <= noise else 'faster' if ratio > 1 else 'slower'
+        verdicts[case] = {'ratio': ratio, 'noise': noise, 'verdict': verdict}
+    for case in sorted(verdicts):
+        verdict = verdicts[case]
+        print(f"{case:<42} {verdict['ratio']:6.3f}x  (noise {100 * verdict['noise']:4.1f}%)  {verdict['verdict']}")
+    return verdicts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', dest='pattern', help="run only the benchmarks whose name contains this")
+    parser.add_argument('-r', '--repeats', type=int, default=REPEATS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--results', default=RESULTS, help="JSON file of the results, by commit")
+    parser.add_argument('--commit', help="key to store the results under, the checked out commit by default")
+    parser.add_argument('--baseline', help="commit to compare with, the last other one recorded by default")
+    parser.add_argument('--compare-only', action='store_true', help="compare the stored results of --commit")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--sigmas', type=float, default=SIGMAS)
+    options = parser.parse_args(argv)
+
+    commit = options.commit or current_commit()
+    if not options.compare_only:
+        results = run(options.pattern, options.repeats, options.seed)
+        record(results, options.results, commit)
+    history = read_results(options.results)
+    if commit not in history:
+        parser.error(f"no results of {commit} in {options.results}")
+    baseline = options.baseline or latest_other(history, commit)
+    if baseline is None:
+        print(f"Stored the results of {commit}; there is no other commit to compare with yet")
+        return 0
+    if baseline not in history:
+        parser.error(f"no results of {baseline} in {options.results}")
+    print(f"\n{commit} against {baseline}")
+    verdicts = compare(history[commit]['results'], history[baseline]['results'], options.threshold, options.sigmas)
+    return int(any(verdict['verdict'] == 'slower' for verdict in verdicts.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
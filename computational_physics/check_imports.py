@@ -0,0 +1,77 @@
+"""
+Checks that the kernels of computational_physics load without matplotlib, and times their cold imports.
+
+Every exercise is imported in a fresh interpreter, so nothing is cached from a
+previous import, and the check fails if matplotlib, or any GUI toolkit, has
+been loaded by then. The import of matplotlib.pyplot is timed the same way for
+comparison.
+
+Run as python -m computational_physics.check_imports from the root of the repository.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from computational_physics import EXERCISES, KERNELS, ROOT
+
+
+# Modules that must not be loaded by importing a kernel
+FORBIDDEN = ('matplotlib', 'tkinter', 'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'gi', 'wx')
+
+PROBE = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import computational_physics as cp
+for name in {names!r}:
+    getattr(cp, name)
+elapsed = perf_counter() - start
+print(json.dumps({{'time': elapsed, 'loaded': [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+PYPLOT = """
+import json
+from time import perf_counter
+start = perf_counter()
+import matplotlib.pyplot
+print(json.dumps({'time': perf_counter() - start, 'loaded': []}))
+"""
+
+
+def cold_import(code):
+    """
+    Runs code in a fresh interpreter and returns what it printed.
+    """
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'MPLBACKEND': 'Agg'}, check=True)
+    return json.loads(result.stdout)
+
+
+def check():
+    """
+    Imports the kernels of every exercise in a fresh interpreter.
+
+    Returns:
+    dict: The cold import time in seconds of every exercise, and of 'all' of them and of 'matplotlib.pyplot'.
+    """
+    times = {}
+    failures = []
+    groups = {exercise: [name for name, (owner, _) in KERNELS.items() if owner == exercise] for exercise in EXERCISES}
+    groups['all'] = list(KERNELS)
+    for exercise, names in groups.items():
+        probe = cold_import(PROBE.format(names=names, forbidden=FORBIDDEN))
+        times[exercise] = probe['time']
+        if probe['loaded']:
+            failures.append(f"{exercise}: importing {', '.join(names)} loaded {', '.join(probe['loaded'])}")
+    times['matplotlib.pyplot'] = cold_import(PYPLOT)['time']
+    for name, elapsed in times.items():
+        print(f"{name:>18}: {elapsed * 1e3:7.1f} ms")
+    if failures:
+        raise AssertionError("\n".join(failures))
+    print(f"No kernel loads any of {', '.join(FORBIDDEN)}")
+    return times
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,562 @@
+"""
+Opt-in counters, histograms and phase timers of the exercise kernels.
+
+Nothing in the scripts or helpers is instrumented while it runs normally, so a
+disabled probe costs nothing at all. Inside instrument(), the functions and
+methods worth watching are replaced by wrappers that feed a Recorder, and put
+back on exit:
+
+    import computational_physics as cp
+    from computational_physics.instrumentation import instrument
+
+    with instrument('8.17', '10.13') as run:
+        cp.solution(0, 20)
+        cp.BatchDLA(201, 'B', seed=0).run()
+    run.save('report.json')
+
+A function wrapped in the module that defines it replaces the original wherever
+an exercise module holds it, so a script calling its own equations_of_motion(),
+or a helper imported with `from adaptive_rk import flights`, is seen as well. So
+are the scripts themselves when a helper uses them, as the load_script() of
+every helper shares its copy of the script with the package. An object a module
+only imports, like the numpy.random.randint of the DLA scripts, is replaced in
+that module alone.
+
+What each exercise records is listed in PROBES: RHS evaluations of the ODE
+solvers, halvings and extrapolation rows of Bulirsch-Stoer, Newton iterations
+and factorizations, FTCS site-updates, quadrature evaluations, and the walker
+steps, launches and walk length of every stuck DLA particle. The report is a
+dict of counters, ratios, histogram summaries and phase times, JSON ready.
+
+Run as a module, it instruments one run of every benchmark of benchmarks.py at
+its smallest size and prints the report, or only those whose name contains -k;
+with --check, it checks the counters against the solvers' own counts instead,
+and that a second instrumented run counts the same as the first.
+"""
+import argparse
+import json
+import platform
+import sys
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from time import perf_counter
+
+import numpy as np
+
+from computational_physics import ROOT, load
+
+
+# Percentiles of the histogram summaries
+PERCENTILES = (50, 90, 99)
+
+
+class Recorder:
+    """
+    Counters, histograms and wall-clock phase timers of one run.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = defaultdict(list)
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.depth = Counter()
+        self.ratios = {}
+        self.started = perf_counter()
+        self.date = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def count(self, name, amount=1):
+        self.counters[name] += int(amount)
+
+    def observe(self, name, values):
+        """
+        Adds a value, or an array of values, to a histogram.
+        """
+        self.histograms[name].append(np.asarray(values, float).ravel())
+
+    def ratio(self, name, numerator, denominator):
+        """
+        Reports counters[numerator] / counters[denominator] as name.
+        """
+        self.ratios[name] = (numerator, denominator)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a phase; a phase entered again from within itself, like a recursive step, is timed once.
+        """
+        self.calls[name] += 1
+        self.depth[name] += 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[name] -= 1
+            if not self.depth[name]:
+                self.seconds[name] += perf_counter() - start
+
+    def timed(self, name):
+        """
+        Wraps a function in a phase.
+        """
+        def wrap(function):
+            def timed_function(*args, **kwargs):
+                with self.phase(name):
+                    return function(*args, **kwargs)
+            return timed_function
+        return wrap
+
+    def counted(self, name, amount=None):
+        """
+        Wraps a function to count its calls, or amount(*args, **kwargs) per call.
+        """
+        def wrap(function):
+            def counted_function(*args, **kwargs):
+                self.counters[name] += 1 if amount is None else int(amount(*args, **kwargs))
+                return function(*args, **kwargs)
+            return counted_function
+        return wrap
+
+    def report(self):
+        """
+        Returns:
+        dict: The counters, ratios, summaries of the histograms and phase times recorded so far.
+        """
+        histograms = {}
+        for name, chunks in self.histograms.items():
+            values = np.concatenate(chunks)
+            if not len(values):
+                continue
+            # Powers-of-two bins: [1, 2), [2, 4), ..., with everything below 1 in the first
+            edges = np.floor(np.log2(np.maximum(values, 1))).astype(int)
+            bins = np.bincount(edges)
+            histograms[name] = dict(count=len(values), mean=values.mean(), min=values.min(), max=values.max(),
+                                    **{f"p{q}": np.percentile(values, q) for q in PERCENTILES},
+                                    bins={f"{2**k}-{2**(k + 1) - 1}": int(c) for k, c in enumerate(bins) if c})
+        ratios = {name: self.counters[numerator] / self.counters[denominator]
+                  for name, (numerator, denominator) in self.ratios.items() if self.counters[denominator]}
+        return to_json({
+            'meta': {'date': self.date, 'seconds': perf_counter() - self.started, 'python': platform.python_version(),
+                     'numpy': np.__version__},
+            'counters': dict(sorted(self.counters.items())),
+            'ratios': dict(sorted(ratios.items())),
+            'histograms': dict(sorted(histograms.items())),
+            'phases': {name: {'calls': self.calls[name], 'seconds': self.seconds[name]}
+                       for name in sorted(self.calls)},
+        })
+
+
+def to_json(value):
+    """
+    Converts the numpy scalars of a nested dict to Python numbers.
+    """
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class Instrumentation(Recorder):
+    """
+    A Recorder that also installs the probes and removes them again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.patches = []
+
+    def patch(self, owner, name, wrap):
+        """
+        Replaces the function owner.name by wrap(function), in owner and, if owner is the module that defines
+        it, in every exercise module that holds it.
+
+        An object owner only imported, like the numpy.random.randint that every DLA script holds, is replaced in
+        owner alone, so the probes of different modules do not stack on the same object.
+        """
+        original = vars(owner)[name]
+        replacement = wraps(original)(wrap(original))
+        holders = [owner]
+        if getattr(original, '__module__', None) == getattr(owner, '__name__', None):
+            holders += [module for module in list(sys.modules.values())
+                        if (getattr(module, '__file__', None) or '').startswith(ROOT) and module is not owner
+                        and any(value is original for value in vars(module).values())]
+        for holder in holders:
+            for key, value in list(vars(holder).items()):
+                if value is original:
+                    self.patches.append((holder, key, value))
+                    setattr(holder, key, replacement)
+
+    def restore(self):
+        while self.patches:
+            holder, key, value = self.patches.pop()
+            setattr(holder, key, value)
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=1)
+
+
+# Probes of every exercise; each loads the modules it watches and patches them on the run
+
+def probe_quadrature(run):
+    script = load('5.2', 'Excercise 5.2')
+    quadrature = load('5.2', 'quadrature')
+    batch = load('5.2', 'batch_quadrature')
+    run.patch(script, 'f', run.counted('5.2/evaluations', lambda x: np.size(x)))
+    run.patch(script, 'simpsons_rule', run.timed('5.2/simpsons_rule'))
+    for name in ('simpson', 'romberg', 'adaptive_simpson'):
+        run.patch(quadrature, name, run.timed(f"5.2/{name}"))
+    for name in ('batch_simpson', 'batch_romberg'):
+        run.patch(batch, name, run.timed(f"5.2/{name}"))
+
+
+def probe_linear(run):
+    script = load('6.1', 'Excercise 6.1')
+    lu = load('6.1', 'lu_factorization')
+    sparse = load('6.1', 'sparse_network')
+    run.patch(script, 'gaussian_elimination', run.timed('6.1/gaussian_elimination'))
+    run.patch(lu.LUFactorization, '__init__', run.timed('6.1/lu_factor'))
+    run.patch(lu.LUFactorization, 'solve', run.timed('6.1/lu_solve'))
+    run.patch(sparse.BandedSolver, '__init__', run.timed('6.1/banded_factor'))
+    run.patch(sparse.BandedSolver, 'solve', run.timed('6.1/banded_solve'))
+    run.patch(sparse.CSRMatrix, 'dot', run.counted('6.1/matvecs'))
+
+    def cache_lookups(factorization):
+        def counted_factorization(self, A):
+            misses = self.misses
+            result = factorization(self, A)
+            run.count('6.1/cache_misses' if self.misses > misses else '6.1/cache_hits')
+            return result
+        return counted_factorization
+    run.patch(lu.FactorizationCache, 'factorization', cache_lookups)
+
+    def cg_iterations(conjugate_gradient):
+        def observed(*args, **kwargs):
+            with run.phase('6.1/conjugate_gradient'):
+                x, iterations = conjugate_gradient(*args, **kwargs)
+            run.observe('6.1/cg_iterations', iterations)
+            return x, iterations
+        return observed
+    run.patch(sparse, 'conjugate_gradient', cg_iterations)
+
+
+def probe_newton(run):
+    script = load('6.17', 'Excercise 6.17')
+    newton = load('6.17', 'batch_newton')
+    nodal = load('6.17', 'nodal_solver')
+    run.patch(script, 'f', run.counted('6.17/residuals'))
+    run.patch(script, 'grad_f', run.counted('6.17/jacobians'))
+    run.patch(nodal.NodalSolver, 'factor', run.counted('6.17/factorizations'))
+    run.patch(nodal.NodalSolver, 'residual', run.counted('6.17/residuals'))
+
+    def batch_iterations(solve_batch):
+        def observed(*args, **kwargs):
+            with run.phase('6.17/solve_batch'):
+                results = solve_batch(*args, **kwargs)
+            run.observe('6.17/iterations', results['iterations'])
+            run.count('6.17/iterations', results['iterations'].sum())
+            run.count('6.17/solves', len(results['converged']))
+            run.count('6.17/failures', np.count_nonzero(~results['converged']))
+            return results
+        return observed
+    run.patch(newton, 'solve_batch', batch_iterations)
+
+    def nodal_iterations(solve):
+        def observed(self, guess):
+            iterations = self.iterations
+            with run.phase('6.17/nodal_solve'):
+                V, converged = solve(self, guess)
+            run.observe('6.17/iterations', self.iterations - iterations)
+            run.count('6.17/iterations', self.iterations - iterations)
+            run.count('6.17/solves')
+            run.count('6.17/failures', not converged)
+            return V, converged
+        return observed
+    run.patch(nodal.NodalSolver, 'solve', nodal_iterations)
+    run.ratio('6.17/iterations_per_solve', '6.17/iterations', '6.17/solves')
+
+
+def columns(r, *args, **kwargs):
+    """
+    The number of states in r, the columns of a (4, M) batch or 1.
+    """
+    return np.shape(r)[-1] if np.ndim(r) > 1 else 1
+
+
+def probe_projectile(run):
+    script = load('8.7', 'Excercise 8.7')
+    ensemble = load('8.7', 'ensemble_rk4')
+    adaptive = load('8.7', 'adaptive_rk')
+    run.patch(script, 'equations_of_motion', run.counted('8.7/rhs_evaluations'))
+    run.patch(script, 'trajectory', run.timed('8.7/trajectory'))
+    run.patch(ensemble.EnsembleRK4, 'derivatives', lambda derivatives: run.counted(
+        '8.7/rhs_evaluations', lambda self, r, out, h: columns(r))(derivatives))
+    run.patch(ensemble.EnsembleRK4, 'run', run.timed('8.7/ensemble'))
+    run.patch(adaptive, 'derivatives', run.counted('8.7/rhs_evaluations', columns))
+    run.patch(adaptive, 'flights', run.timed('8.7/flights'))
+
+
+def probe_bulirsch_stoer(run):
+    script = load('8.17', 'Excercise 8.17')
+    driver = load('8.17', 'bulirsch_stoer')
+    # f itself is not wrapped: the driver is often built with the script's f and counts its own evaluations
+    run.patch(script, 'modified_midpoint_step', run.counted('8.17/rhs_evaluations', lambda r, H, n: 2 * n + 1))
+    run.patch(script, 'solution', run.timed('8.17/solution'))
+
+    # A row that neither halves (n > 8) nor goes on to the next row is where the step was accepted
+    recursed = []
+
+    def rows(calculate_row_n):
+        def observed(r, t, H, R1, n, *args):
+            if recursed:
+                recursed[-1] = True
+            recursed.append(False)
+            try:
+                result = calculate_row_n(r, t, H, R1, n, *args)
+            finally:
+                deeper = recursed.pop()
+            if n > 8:
+                run.count('8.17/halvings')
+            elif not deeper:
+                run.observe('8.17/rows_per_step', n)
+                run.count('8.17/steps')
+            return result
+        return observed
+    run.patch(script, 'calculate_row_n', rows)
+
+    def step_rows(step):
+        def observed(self, r, H):
+            state, n = step(self, r, H)
+            if state is None:
+                run.count('8.17/halvings')
+            else:
+                run.observe('8.17/rows_per_step', n)
+                run.count('8.17/steps')
+            return state, n
+        return observed
+    run.patch(driver.BulirschStoer, 'step', step_rows)
+
+    def evaluations(solve):
+        def observed(self, *args, **kwargs):
+            before = self.evaluations
+            with run.phase('8.17/solve'):
+                result = solve(self, *args, **kwargs)
+            run.count('8.17/rhs_evaluations', self.evaluations - before)
+            return result
+        return observed
+    run.patch(driver.BulirschStoer, 'solve', evaluations)
+    run.ratio('8.17/rhs_evaluations_per_step', '8.17/rhs_evaluations', '8.17/steps')
+
+
+def probe_wave(run):
+    script = load('9.5', 'Excercise 9.5')
+    kernel = load('9.5', 'ftcs_kernel')
+    integrators = load('9.5', 'wave_integrators')
+
+    def site_updates(advance):
+        def observed(self, fi, phi, steps):
+            run.count('9.5/steps', steps)
+            run.count('9.5/site_updates', steps * (self.n - 1) * int(np.prod(np.shape(fi)[1:])))
+            return advance(self, fi, phi, steps)
+        return observed
+    for integrator in (kernel.FTCSKernel, integrators.Leapfrog, integrators.CrankNicolson):
+        run.patch(integrator, 'advance', site_updates)
+
+    def iterations(iterate):
+        def observed(fi, phi, dt=50e-3, kernel=None):
+            # With a kernel the steps are counted by its advance()
+            if kernel is None:
+                steps = int(dt / script.h)
+                run.count('9.5/steps', steps)
+                run.count('9.5/site_updates', steps * (script.N - 1))
+            with run.phase('9.5/iterate'):
+                return iterate(fi, phi, dt, kernel)
+        return observed
+    run.patch(script, 'iterate', iterations)
+
+
+def probe_walkers(run, script, walk):
+    """
+    Probes a serial DLA script: every randint() is a walker step, and a walk ends at add_particle().
+    Walkers of Excercise 10.13B and C start at generate_random_position() and may be discarded,
+    those of A start at the centre as soon as the previous one stuck.
+    """
+    launched = hasattr(script, 'generate_random_position')
+    # Steps of the walk in progress, None before the first launch
+    current = [None if launched else 0]
+
+    def steps(randint):
+        def observed(*args):
+            current[0] += 1
+            run.count('10.13/walker_steps')
+            return randint(*args)
+        return observed
+    run.patch(script, 'randint', steps)
+
+    def launch(generate_random_position):
+        def observed(*args):
+            current[0] = 0
+            run.count('10.13/launches')
+            return generate_random_position(*args)
+        return observed
+    if launched:
+        run.patch(script, 'generate_random_position', launch)
+
+    def stuck(add_particle):
+        def observed(*args, **kwargs):
+            # The seed of the cluster is added before any walk
+            if current[0] is not None:
+                run.observe('10.13/walk_length', current[0])
+                run.count('10.13/stuck')
+                if not launched:
+                    run.count('10.13/launches')
+                current[0] = None if launched else 0
+            return add_particle(*args, **kwargs)
+        return observed
+    run.patch(script, 'add_particle', stuck)
+    run.patch(script, walk, run.timed(f"10.13/{walk}"))
+
+
+def probe_dla(run):
+    for variant, walk in (('A', 'random_walk'), ('B', 'random_walk_on_circle'), ('C', 'random_walk_on_circle')):
+        probe_walkers(run, load('10.13', f"Excercise 10.13{variant}"), walk)
+    batch = load('10.13', 'dla_batch')
+    jump = load('10.13', 'dla_jump')
+
+    def stuck(update_radius):
+        def observed(self, site, steps):
+            run.observe('10.13/walk_length', steps)
+            run.count('10.13/stuck')
+            return update_radius(self, site, steps)
+        return observed
+    run.patch(batch.DLACluster, 'update_radius', stuck)
+
+    def engine_steps(grow):
+        def observed(self, *args, **kwargs):
+            walker_steps, time = self.walker_steps, self.time
+            with run.phase(f"10.13/{type(self).__name__}"):
+                result = grow(self, *args, **kwargs)
+            run.count('10.13/walker_steps', self.walker_steps - walker_steps)
+            run.count('10.13/launches', self.time - time)
+            return result
+        return observed
+    run.patch(batch.DLACluster, 'run', engine_steps)
+    run.patch(batch.BatchDLA, 'run_round', run.counted('10.13/rounds'))
+    run.patch(jump.JumpDLA, 'run_round', run.counted('10.13/rounds'))
+    run.ratio('10.13/walker_steps_per_particle', '10.13/walker_steps', '10.13/stuck')
+    run.ratio('10.13/launches_per_particle', '10.13/launches', '10.13/stuck')
+
+
+# The probes of every exercise
+PROBES = {
+    '5.2': probe_quadrature,
+    '6.1': probe_linear,
+    '6.17': probe_newton,
+    '8.7': probe_projectile,
+    '8.17': probe_bulirsch_stoer,
+    '9.5': probe_wave,
+    '10.13': probe_dla,
+}
+
+
+@contextmanager
+def instrument(*exercises):
+    """
+    Installs the probes of the given exercises, all of them by default, for the duration of the block.
+
+    Returns:
+    Instrumentation: The recorder of the run, whose report() stays available after the block.
+    """
+    run = Instrumentation()
+    try:
+        for exercise in exercises or PROBES:
+            PROBES[exercise](run)
+        yield run
+    finally:
+        run.restore()
+
+
+def print_report(report):
+    for name, value in report['counters'].items():
+        print(f"{name:<40} {value:>14,}")
+    for name, value in report['ratios'].items():
+        print(f"{name:<40} {value:>14.4g}")
+    for name, summary in report['histograms'].items():
+        print(f"{name:<40} {summary['count']:>14,} values, mean {summary['mean']:.4g}, "
+              f"p50 {summary['p50']:.4g}, p99 {summary['p99']:.4g}, max {summary['max']:.4g}")
+    for name, phase in report['phases'].items():
+        print(f"{name:<40} {phase['seconds']:>12.4f} s in {phase['calls']:,} calls")
+
+
+def check_counts(t_f=5.0):
+    """
+    Checks that the RHS evaluations of Bulirsch-Stoer are counted once, by the script and by the driver.
+    """
+    script = load('8.17', 'Excercise 8.17')
+    calls = [0]
+
+    def counting_f(r):
+        calls[0] += 1
+        return f(r)
+    f = script.f
+    driver = load('8.17', 'bulirsch_stoer').BulirschStoer(counting_f, script.delta)
+    with instrument('8.17') as run:
+        driver.solve([script.x_0, script.y_0], script.t_0, t_f)
+    counted = run.report()['counters']['8.17/rhs_evaluations']
+    assert counted == driver.evaluations == calls[0], (counted, driver.evaluations, calls[0])
+
+    script.f = counting_f
+    try:
+        calls[0] = 0
+        with instrument('8.17') as run:
+            script.solution(script.t_0, t_f)
+    finally:
+        script.f = f
+    counted = run.report()['counters']['8.17/rhs_evaluations']
+    assert counted == calls[0], (counted, calls[0])
+    print(f"8.17: {driver.evaluations} RHS evaluations of the driver and {calls[0]} of the script, counted once")
+
+
+def check_repeated(grid_size=31, seed=0):
+    """
+    Checks that instrumenting the DLA scripts a second time, once they are loaded, gives the same counts.
+    """
+    from computational_physics import benchmarks
+    counters = []
+    for _ in range(2):
+        with instrument('10.13') as run:
+            benchmarks.dla_script(grid_size, seed)
+        counters.append(run.report()['counters'])
+    assert counters[0] == counters[1], counters
+    print(f"10.13: {counters[0]['10.13/walker_steps']:,} walker steps counted in both of two instrumented runs")
+
+
+def main(argv=None):
+    # Imported here, as benchmarks.py sets MPLBACKEND, which only the command line should do
+    from computational_physics import benchmarks
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', dest='pattern', help="run only the benchmarks whose name contains this")
+    parser.add_argument('-o', '--output', help="JSON file to write the report to")
+    parser.add_argument('--check', action='store_true', help="check the counters against the solvers' own counts")
+    options = parser.parse_args(argv)
+
+    if options.check:
+        check_counts()
+        check_repeated()
+        return
+    with instrument() as run:
+        for name, (function, sizes, _, _) in benchmarks.BENCHMARKS.items():
+            if not options.pattern or options.pattern in name:
+                with run.phase(f"benchmark/{name}"):
+                    function(sizes[0], benchmarks.SEED)
+    report = run.report()
+    report['meta']['commit'] = benchmarks.current_commit()
+    print_report(report)
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()